@@ -1,30 +1,153 @@
-from sentence_transformers import SentenceTransformer, util
+import os
+import threading
+from typing import Sequence, Tuple
 
-# Load a pre-trained model. This will be downloaded on the first run.
-model = SentenceTransformer('all-MiniLM-L6-v2')
+import numpy as np
 
-def calculate_similarity(text1: str, text2: str) -> float:
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# The model (and torch) is loaded on first use or by start_warm_up(), never at
+# import time, so the API can start and answer health checks immediately.
+_model = None
+_model_lock = threading.Lock()
+_model_ready = threading.Event()
+
+# Number of texts the model encodes per forward pass.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# Embeddings are stored alongside responses as float16, which halves their
+# size and is far more precision than cosine scores need.
+EMBEDDING_STORAGE_DTYPE = np.float16
+
+def get_model():
+    """Returns the sentence-transformer model, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+
+                # Downloaded on the first run.
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                _model_ready.set()
+    return _model
+
+def is_model_ready() -> bool:
+    """Whether the model has finished loading."""
+    return _model_ready.is_set()
+
+def start_warm_up() -> threading.Thread:
+    """Loads the model on a background thread so the first run doesn't pay for it."""
+    def warm_up():
+        try:
+            get_model()
+            print("Embedding model loaded.")
+        except Exception as e:
+            print(f"Error loading embedding model: {e}")
+
+    thread = threading.Thread(target=warm_up, name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def encode_texts(texts: Sequence[str], batch_size: int = None) -> np.ndarray:
     """
-    Calculates the semantic similarity between two texts using a sentence-transformer model.
+    Encodes texts into unit-length embeddings with a single model call.
 
     Args:
-        text1: The first text string.
-        text2: The second text string.
+        texts: The texts to encode.
+        batch_size: Texts per forward pass; defaults to EMBEDDING_BATCH_SIZE.
 
     Returns:
-        A float between -1 and 1 representing the cosine similarity.
+        A float32 array of shape (len(texts), dim) with L2-normalised rows.
+    """
+    return get_model().encode(
+        list(texts),
+        batch_size=batch_size or EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    ).astype(np.float32, copy=False)
+
+def embedding_to_bytes(embedding: np.ndarray) -> bytes:
+    """Serialises an embedding into compact bytes for storage."""
+    return np.asarray(embedding, dtype=EMBEDDING_STORAGE_DTYPE).tobytes()
+
+def embedding_from_bytes(data: bytes) -> np.ndarray:
+    """Restores a stored embedding as a float32 vector."""
+    return np.frombuffer(data, dtype=EMBEDDING_STORAGE_DTYPE).astype(np.float32)
+
+def sample_statistics(embeddings: np.ndarray, group_sizes: Sequence[int],
+                      previous_centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    if not text1 or not text2:
-        return 0.0
-
-    try:
-        # Generate embeddings for both texts
-        embedding1 = model.encode(text1, convert_to_tensor=True)
-        embedding2 = model.encode(text2, convert_to_tensor=True)
-
-        # Calculate cosine similarity
-        cosine_scores = util.pytorch_cos_sim(embedding1, embedding2)
-        return cosine_scores.item()
-    except Exception as e:
-        print(f"Error calculating similarity: {e}")
-        return 0.0
+    Summarises groups of sampled answers in a few whole-array operations.
+
+    Uses the identity sum_ij(e_i . e_j) = |sum_i e_i|^2 for unit vectors, so
+    the mean pairwise similarity of every group comes from its summed
+    embedding without building any n x n similarity matrix.
+
+    Args:
+        embeddings: Unit-length embeddings of shape (total, dim), ordered so
+            each group's samples are contiguous.
+        group_sizes: Number of samples in each group, in order.
+        previous_centroids: Unit-length centroid of each group's previous run,
+            shape (groups, dim); rows of NaN where there is none.
+
+    Returns:
+        (centroids, dispersion, centroid_similarity): unit-length centroids of
+        shape (groups, dim); dispersion, one minus the mean pairwise cosine
+        similarity (NaN for single-sample groups); and the cosine similarity
+        of each centroid to the previous one (NaN where there is none).
+    """
+    sizes = np.asarray(group_sizes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    sums = np.add.reduceat(embeddings, starts, axis=0)
+
+    squared = np.einsum("ij,ij->i", sums, sums)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_pairwise = (squared - sizes) / (sizes * (sizes - 1))
+        dispersion = np.where(sizes > 1, 1.0 - mean_pairwise, np.nan)
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    centroid_similarity = np.clip(np.einsum("ij,ij->i", centroids, previous_centroids), -1.0, 1.0)
+    return centroids, dispersion, centroid_similarity
+
+def agreement_matrices(embeddings: np.ndarray, question_rows: Sequence[int], model_columns: Sequence[int],
+                       question_count: int, model_count: int) -> np.ndarray:
+    """
+    Computes every question's model-by-model similarity matrix in one batched matmul.
+
+    Embeddings are scattered into a (questions, models, dim) tensor, summing
+    and renormalising when a model answered a question more than once, and
+    multiplied by its own transpose.
+
+    Args:
+        embeddings: Unit-length embeddings of shape (n, dim).
+        question_rows: The question index of each embedding.
+        model_columns: The model index of each embedding.
+        question_count: Number of questions.
+        model_count: Number of models.
+
+    Returns:
+        An array of shape (questions, models, models) of cosine similarities,
+        with NaN in the rows and columns of models that did not answer a question.
+    """
+    answers = np.zeros((question_count, model_count, embeddings.shape[1]), dtype=np.float32)
+    np.add.at(answers, (np.asarray(question_rows), np.asarray(model_columns)), embeddings)
+    norms = np.linalg.norm(answers, axis=2, keepdims=True)
+    answered = norms[..., 0] > 0
+    answers /= np.where(norms > 0, norms, 1.0)
+
+    matrices = np.clip(answers @ answers.transpose(0, 2, 1), -1.0, 1.0)
+    matrices[~(answered[:, :, None] & answered[:, None, :])] = np.nan
+    return matrices
+
+def matrix_to_bytes(matrix: np.ndarray) -> bytes:
+    """Serialises a symmetric matrix with a unit diagonal as its upper triangle, in float16."""
+    upper = np.triu_indices(len(matrix), k=1)
+    return np.asarray(matrix[upper], dtype=EMBEDDING_STORAGE_DTYPE).tobytes()
+
+def matrix_from_bytes(data: bytes, size: int) -> np.ndarray:
+    """Restores a matrix stored by `matrix_to_bytes` as a full float32 array."""
+    matrix = np.eye(size, dtype=np.float32)
+    upper = np.triu_indices(size, k=1)
+    matrix[upper] = np.frombuffer(data, dtype=EMBEDDING_STORAGE_DTYPE)
+    matrix.T[upper] = matrix[upper]
+    return matrix
@@ -0,0 +1,62 @@
+"""
+Backfill stored embeddings for responses saved before embeddings were persisted.
+
+Usage:
+    python -m backend.backfill_embeddings [--chunk-size N]
+"""
+import argparse
+
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+
+from . import models, vector_index
+from .analysis import EMBEDDING_MODEL_NAME, embedding_to_bytes, encode_texts
+from .database import SessionLocal, engine, upgrade_schema
+
+def backfill_embeddings(chunk_size: int = 256) -> int:
+    """Encodes responses without a current embedding in chunks and returns how many were updated."""
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(models.Response).options(joinedload(models.Response.blob)).filter(
+                models.Response.id > last_id,
+                or_(
+                    models.Response.embedding.is_(None),
+                    models.Response.embedding_model != EMBEDDING_MODEL_NAME,
+                    models.Response.embedding_model.is_(None),
+                )
+            ).order_by(models.Response.id).limit(chunk_size).all()
+            if not rows:
+                break
+
+            embeddings = encode_texts([row.response or "" for row in rows])
+            for row, embedding in zip(rows, embeddings):
+                row.embedding = embedding_to_bytes(embedding)
+                row.embedding_model = EMBEDDING_MODEL_NAME
+            db.commit()
+
+            updated += len(rows)
+            last_id = rows[-1].id
+            print(f"Backfilled {updated} embeddings...")
+
+        if updated:
+            added = vector_index.get_index().sync(db)
+            print(f"Added {added} responses to the vector index.")
+    finally:
+        db.close()
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=256, help="Responses encoded and committed per batch.")
+    args = parser.parse_args()
+
+    updated = backfill_embeddings(chunk_size=args.chunk_size)
+    print(f"Done. {updated} responses now have {EMBEDDING_MODEL_NAME} embeddings.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Weight of each new response in a pair's running baseline. A pair's first
+# 1 / BASELINE_ALPHA responses are averaged equally (Welford), after which the
+# baseline becomes an exponentially weighted mean that forgets old answers.
+BASELINE_ALPHA = float(os.getenv("BASELINE_ALPHA", "0.1"))
+
+
+def update_weight(count: int) -> float:
+    """Returns the weight of a pair's `count`-th response in its baseline."""
+    return max(BASELINE_ALPHA, 1.0 / count)
+
+
+def score_and_update(state: models.DriftBaseline, embedding: np.ndarray, embedding_model: str) -> Optional[float]:
+    """
+    Scores one response against its pair's baseline, then folds it into the baseline.
+
+    Returns None for a pair's first response, or the first after the
+    embedding model changed, since there is nothing to compare it with yet.
+    """
+    if state.count and state.embedding_model == embedding_model:
+        mean = np.frombuffer(state.mean, dtype=np.float32)
+        norm = float(np.linalg.norm(mean))
+        similarity = float(np.clip(np.dot(mean, embedding) / norm, -1.0, 1.0)) if norm else 0.0
+    else:
+        # Embeddings from another model live in another space; start over.
+        state.count = 0
+        state.similarity_mean = None
+        state.similarity_variance = None
+        mean = np.zeros_like(embedding, dtype=np.float32)
+        similarity = None
+
+    state.count += 1
+    weight = update_weight(state.count)
+    state.mean = (mean + weight * (embedding - mean)).astype(np.float32).tobytes()
+    state.embedding_model = embedding_model
+
+    if similarity is not None:
+        if state.similarity_mean is None:
+            state.similarity_mean, state.similarity_variance = similarity, 0.0
+        else:
+            # Exponentially weighted mean and variance of the baseline similarity.
+            weight = update_weight(state.count - 1)
+            difference = similarity - state.similarity_mean
+            state.similarity_mean += weight * difference
+            state.similarity_variance = (1 - weight) * (state.similarity_variance + weight * difference ** 2)
+    return similarity
+
+
+def score_against_baselines(db: Session, items: Sequence[Tuple[str, str, np.ndarray]],
+                            embedding_model: str) -> List[Optional[float]]:
+    """
+    Scores a run's responses against each pair's running baseline and updates it.
+
+    Each response costs one dot product against O(1) stored state, whatever
+    the pair's history. Responses to the same pair within a run are folded in
+    one after another. Changes are left uncommitted, to be written in the same
+    transaction as the responses they score.
+
+    Args:
+        db: The database session.
+        items: (llm_name, question, unit embedding) tuples, in the order they were collected.
+        embedding_model: Name of the model the embeddings came from.
+
+    Returns:
+        The cosine similarity of each response to its pair's baseline before
+        the update, or None where the pair had no baseline yet.
+    """
+    if not items:
+        return []
+    pairs = {(llm_name, question) for llm_name, question, _ in items}
+    states = {
+        (state.llm_name, state.question): state
+        for state in db.query(models.DriftBaseline).filter(
+            models.DriftBaseline.llm_name.in_({llm_name for llm_name, _ in pairs}),
+            models.DriftBaseline.question.in_({question for _, question in pairs})
+        )
+    }
+    similarities = []
+    for llm_name, question, embedding in items:
+        state = states.get((llm_name, question))
+        if state is None:
+            state = states[(llm_name, question)] = models.DriftBaseline(
+                llm_name=llm_name, question=question, count=0
+            )
+            db.add(state)
+        similarities.append(score_and_update(state, np.asarray(embedding, dtype=np.float32), embedding_model))
+    return similarities
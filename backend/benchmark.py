@@ -0,0 +1,240 @@
+"""
+Throughput benchmark for the collection pipeline.
+
+Starts a local mock of the OpenAI, Anthropic and Grok APIs, points the real
+provider clients at it and runs the scheduler (threaded or async) or the
+legacy collector end to end. Reports runs per minute, p50/p99 job latency and
+peak memory, and appends the result to a JSON-lines file so runs can be
+compared across versions.
+
+Usage:
+    python -m backend.benchmark --path async --runs 5 --questions 20 --latency 0.3 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .mock_llm_server import MockLLMServer
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported.
+    resource = None
+
+PATHS = ("scheduler", "async", "collector")
+
+# Providers the mock server can stand in for.
+MOCKED_PROVIDERS = ("chatgpt", "claude", "grok")
+MOCKED_COLLECTOR_PROVIDERS = ("openai", "anthropic")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def configure_environment(server_url: str, workdir: str):
+    """Points every mocked provider at the mock server and the database at a scratch file."""
+    os.environ.update({
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"{server_url}/v1",
+        "OPENAI_API_BASE": f"{server_url}/v1",  # pre-1.0 openai SDK, used by the legacy collector
+        "CLAUDE_API_KEY": "mock",
+        "ANTHROPIC_API_KEY": "mock",
+        "ANTHROPIC_BASE_URL": server_url,
+        "GROK_API_KEY": "mock",
+        "GROK_API_URL": f"{server_url}/v1/chat/completions",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        # Every run should query every pair, not just the ones that are due.
+        "ADAPTIVE_SAMPLING": "0",
+        # Empty rather than unset, so load_dotenv() can't bring real keys back.
+        "MISTRAL_API_KEY": "",
+        "GEMINI_API_KEY": "",
+        "DEEPSEEK_API_KEY": "",
+        "COHERE_API_KEY": "",
+    })
+
+
+def make_questions(count: int) -> List[str]:
+    topics = ["AI safety", "climate policy", "monetary policy", "vaccines", "nuclear energy",
+              "social media", "space exploration", "education", "privacy", "automation"]
+    return [f"Question {i}: what are the main arguments for and against {topics[i % len(topics)]}?"
+            for i in range(count)]
+
+
+def time_runs(run: Callable[[], None], runs: int) -> List[float]:
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_scheduler(questions: List[str], runs: int, use_async: bool) -> List[float]:
+    """Times the API scheduler's job, threaded or on an event loop."""
+    from . import analysis, llm_client, scheduler
+    from .database import engine, upgrade_schema
+
+    upgrade_schema(engine)
+    llm_client.LLM_PROVIDERS = {name: llm_client.LLM_PROVIDERS[name] for name in MOCKED_PROVIDERS}
+    llm_client.ASYNC_LLM_PROVIDERS = {name: llm_client.ASYNC_LLM_PROVIDERS[name] for name in MOCKED_PROVIDERS}
+    with open("questions.yaml", "w") as f:
+        json.dump({"questions": questions}, f)  # JSON is valid YAML
+    # Load the embedding model up front so the first run isn't charged for it.
+    analysis.get_model()
+
+    if not use_async:
+        return time_runs(scheduler.fetch_and_store_responses, runs)
+
+    async def run_all():
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await scheduler.fetch_and_store_responses_async()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+    return asyncio.run(run_all())
+
+
+def bench_collector(questions: List[str], runs: int) -> List[float]:
+    """Times the legacy collector against its own SQLite database."""
+    sys.path.insert(0, BACKEND_DIR)
+    import init_db
+    from collect_responses import LLMCollector
+    from config import Config
+
+    init_db.init_database()
+    Config.LLM_CONFIGS = {
+        name: config for name, config in Config.LLM_CONFIGS.items()
+        if config["provider"] in MOCKED_COLLECTOR_PROVIDERS
+    }
+    collector = LLMCollector()
+    try:
+        return time_runs(lambda: collector.collect_responses(questions), runs)
+    finally:
+        collector.close()
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    total = sum(latencies)
+    return {
+        "runs": len(latencies),
+        "total_seconds": round(total, 3),
+        "runs_per_minute": round(60 * len(latencies) / total, 3) if total else None,
+        "p50_seconds": round(float(np.percentile(latencies, 50)), 3),
+        "p99_seconds": round(float(np.percentile(latencies, 99)), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource is not None else None,
+    }
+
+
+def previous_result(output: str, path: str, params: dict) -> Optional[dict]:
+    """Returns the most recent saved result for the same path and parameters."""
+    if not os.path.exists(output):
+        return None
+    previous = None
+    with open(output) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["path"] == path and record["params"] == params:
+                previous = record
+    return previous
+
+
+def save_result(output: str, record: dict):
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", choices=PATHS, default="async", help="Pipeline to benchmark.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="Median mock latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429.")
+    parser.add_argument("--response-words", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results.jsonl", help="JSON-lines file to append to.")
+    args = parser.parse_args()
+
+    params = {
+        "runs": args.runs,
+        "questions": args.questions,
+        "latency": args.latency,
+        "latency_sigma": args.latency_sigma,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "response_words": args.response_words,
+    }
+    output = os.path.abspath(args.output)
+    questions = make_questions(args.questions)
+    workdir = tempfile.mkdtemp(prefix="llm-drift-bench-")
+
+    with MockLLMServer(args.latency, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                       args.response_words, seed=args.seed) as server:
+        configure_environment(server.url, workdir)
+        os.chdir(workdir)
+        if args.path == "collector":
+            latencies = bench_collector(questions, args.runs)
+        else:
+            latencies = bench_scheduler(questions, args.runs, use_async=args.path == "async")
+        stats = dict(server.stats)
+
+    results = summarize(latencies)
+    results["requests"] = sum(stats.values())
+    results["server_errors"] = stats.get(500, 0)
+    results["rate_limited"] = stats.get(429, 0)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "path": args.path,
+        "params": params,
+        "results": results,
+    }
+    previous = previous_result(output, args.path, params)
+    save_result(output, record)
+
+    print(f"\n=== {args.path} benchmark ({args.runs} runs x {args.questions} questions) ===")
+    for key, value in results.items():
+        line = f"{key:>16}: {value}"
+        before = previous["results"].get(key) if previous else None
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            line += f"  ({100 * (value - before) / before:+.1f}% vs {previous['commit'] or previous['timestamp']})"
+        print(line)
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
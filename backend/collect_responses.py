@@ -1,15 +1,38 @@
-import sqlite3
+import threading
 import openai
 import anthropic
 import cohere
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from config import Config
+from compression import compress, content_hash
+from rate_limit import RateLimiter, estimate_tokens
+from retry import CircuitBreaker, call_with_retry
+from sqlite_pool import SQLitePool
+from tracing import RunTrace
+
+INSERT_LLM_MODEL = 'INSERT OR IGNORE INTO llm_models (name, provider, version) VALUES (?, ?, ?)'
+SELECT_LLM_MODEL = 'SELECT id FROM llm_models WHERE name = ?'
+INSERT_QUESTION = 'INSERT OR IGNORE INTO questions (question_text, category) VALUES (?, ?)'
+SELECT_QUESTION = 'SELECT id FROM questions WHERE question_text = ?'
+SELECT_BLOB = 'SELECT 1 FROM response_blobs WHERE content_hash = ?'
+INSERT_BLOB = 'INSERT OR IGNORE INTO response_blobs (content_hash, codec, data, size) VALUES (?, ?, ?, ?)'
+INSERT_RESPONSE = '''
+    INSERT INTO responses 
+    (llm_id, question_id, response_text, content_hash, prompt_tokens, completion_tokens, total_tokens, temperature)
+    VALUES (?, ?, '', ?, ?, ?, ?, ?)
+'''
 
 class LLMCollector:
     def __init__(self):
         self.config = Config
+        self.rate_limiter = RateLimiter(self.config.LLM_CONFIGS)
+        self.db_pool = SQLitePool(self.config.DATABASE_URL)
+        # Model and question IDs never change during a run, so look each up once.
+        self._llm_ids = {}
+        self._question_ids = {}
+        self._id_lock = threading.Lock()
         self._setup_clients()
         
     def _setup_clients(self):
@@ -29,54 +52,57 @@ class LLMCollector:
             self.cohere_client = cohere.Client(self.config.COHERE_API_KEY)
     
     def get_db_connection(self):
-        """Create a database connection."""
-        return sqlite3.connect(self.config.DATABASE_URL)
+        """Borrow a pooled database connection."""
+        return self.db_pool.connection()
+    
+    def close(self):
+        """Close pooled database connections."""
+        self.db_pool.close()
+    
+    def _ensure_id(self, cache: Dict[str, int], key: str, insert_sql: str, insert_params: tuple,
+                   select_sql: str) -> int:
+        """Return a cached row ID, inserting the row first if it doesn't exist yet."""
+        with self._id_lock:
+            if key in cache:
+                return cache[key]
+        with self.get_db_connection() as conn:
+            cursor = conn.execute(insert_sql, insert_params)
+            if cursor.rowcount == 1:
+                row_id = cursor.lastrowid
+            else:
+                row_id = conn.execute(select_sql, (key,)).fetchone()[0]
+        with self._id_lock:
+            cache[key] = row_id
+        return row_id
     
     def ensure_llm_model(self, model_name: str, provider: str, version: str = None) -> int:
         """Ensure the LLM model exists in the database and return its ID."""
-        with self.get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT OR IGNORE INTO llm_models (name, provider, version) VALUES (?, ?, ?)',
-                (model_name, provider, version)
-            )
-            if cursor.lastrowid == 0:
-                cursor.execute(
-                    'SELECT id FROM llm_models WHERE name = ?',
-                    (model_name,)
-                )
-                return cursor.fetchone()[0]
-            return cursor.lastrowid
+        return self._ensure_id(
+            self._llm_ids, model_name,
+            INSERT_LLM_MODEL, (model_name, provider, version),
+            SELECT_LLM_MODEL
+        )
     
     def ensure_question(self, question_text: str, category: str = None) -> int:
         """Ensure the question exists in the database and return its ID."""
-        with self.get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT OR IGNORE INTO questions (question_text, category) VALUES (?, ?)',
-                (question_text, category)
-            )
-            if cursor.lastrowid == 0:
-                cursor.execute(
-                    'SELECT id FROM questions WHERE question_text = ?',
-                    (question_text,)
-                )
-                return cursor.fetchone()[0]
-            return cursor.lastrowid
+        return self._ensure_id(
+            self._question_ids, question_text,
+            INSERT_QUESTION, (question_text, category),
+            SELECT_QUESTION
+        )
     
     def save_response(self, llm_id: int, question_id: int, response_text: str, 
                      prompt_tokens: int = None, completion_tokens: int = None, 
                      total_tokens: int = None, temperature: float = 0.7) -> None:
-        """Save the LLM response to the database."""
+        """Save the LLM response to the database, storing its text compressed and deduplicated."""
+        text_hash = content_hash(response_text)
         with self.get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                INSERT INTO responses 
-                (llm_id, question_id, response_text, prompt_tokens, completion_tokens, total_tokens, temperature)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''',
-                (llm_id, question_id, response_text, prompt_tokens, 
+            if conn.execute(SELECT_BLOB, (text_hash,)).fetchone() is None:
+                codec, data = compress(response_text)
+                conn.execute(INSERT_BLOB, (text_hash, codec, data, len(response_text)))
+            conn.execute(
+                INSERT_RESPONSE,
+                (llm_id, question_id, text_hash, prompt_tokens, 
                  completion_tokens, total_tokens, temperature)
             )
     
@@ -136,49 +162,87 @@ class LLMCollector:
     def collect_responses(self, questions: List[str] = None):
         """Collect responses for all configured questions from all LLMs."""
         questions = questions or self.config.QUESTIONS
+        question_ids = {question: self.ensure_question(question) for question in questions}
+        trace = RunTrace("collector")
+        breaker = CircuitBreaker()
+        
+        # Each model works through the questions on its own thread; the rate
+        # limiter only makes a thread wait when its own provider is out of budget.
+        with ThreadPoolExecutor(max_workers=max(1, len(self.config.LLM_CONFIGS))) as executor:
+            futures = [
+                executor.submit(self._collect_for_model, model_name, model_config, question_ids, trace, breaker)
+                for model_name, model_config in self.config.LLM_CONFIGS.items()
+            ]
+            for future in futures:
+                future.result()
         
-        for question in questions:
-            question_id = self.ensure_question(question)
+        trace_path = trace.finish()
+        if trace_path:
+            print(f"Run trace written to {trace_path}")
+    
+    def _collect_for_model(self, model_name: str, model_config: Dict[str, Any],
+                           question_ids: Dict[str, int], trace: RunTrace, breaker: CircuitBreaker) -> None:
+        """Collect responses to every question from a single configured LLM."""
+        provider = model_config['provider']
+        model = model_config['model']
+        temperature = model_config.get('temperature', 0.7)
+        max_tokens = model_config.get('max_tokens', 1000)
+        
+        for question, question_id in question_ids.items():
+            if breaker.is_open(model_name):
+                print(f"Skipping the remaining questions for {model_name} after {breaker.threshold} failures in a row")
+                return
+            print(f"Querying {model_name} for: {question[:50]}...")
             
-            for model_name, model_config in self.config.LLM_CONFIGS.items():
-                provider = model_config['provider']
-                model = model_config['model']
-                temperature = model_config.get('temperature', 0.7)
-                max_tokens = model_config.get('max_tokens', 1000)
+            try:
+                # Get LLM model ID
+                llm_id = self.ensure_llm_model(model_name, provider, model)
                 
-                print(f"Querying {model_name} for: {question[:50]}...")
+                estimated_tokens = estimate_tokens(question, max_tokens)
+                with trace.span("rate_limit", question, model_name):
+                    self.rate_limiter.acquire(model_name, estimated_tokens)
                 
-                try:
-                    # Get LLM model ID
-                    llm_id = self.ensure_llm_model(model_name, provider, model)
-                    
-                    # Query the appropriate API
+                # Query the appropriate API
+                if provider not in ('openai', 'anthropic', 'cohere'):
+                    print(f"Unsupported provider: {provider}")
+                    return
+                def query():
                     if provider == 'openai':
-                        response = self.query_openai(
+                        return self.query_openai(
                             model=model,
                             prompt=question,
                             temperature=temperature,
                             max_tokens=max_tokens
                         )
                     elif provider == 'anthropic':
-                        response = self.query_anthropic(
+                        return self.query_anthropic(
                             model=model,
                             prompt=question,
                             temperature=temperature,
                             max_tokens_to_sample=max_tokens
                         )
-                    elif provider == 'cohere':
-                        response = self.query_cohere(
-                            model=model,
-                            prompt=question,
-                            temperature=temperature,
-                            max_tokens=max_tokens
-                        )
-                    else:
-                        print(f"Unsupported provider: {provider}")
-                        continue
-                    
-                    # Save the response
+                    return self.query_cohere(
+                        model=model,
+                        prompt=question,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    )
+                
+                # Rate limits, 5xx and connection errors are retried with backoff
+                with trace.span("provider_call", question, model_name):
+                    try:
+                        response = call_with_retry(query)
+                    except Exception:
+                        breaker.record(model_name, ok=False)
+                        raise
+                breaker.record(model_name, ok=True)
+                
+                self.rate_limiter.record_usage(
+                    model_name, estimated_tokens, response['usage'].get('total_tokens')
+                )
+                
+                # Save the response
+                with trace.span("db_write", question, model_name):
                     self.save_response(
                         llm_id=llm_id,
                         question_id=question_id,
@@ -188,14 +252,11 @@ class LLMCollector:
                         total_tokens=response['usage'].get('total_tokens'),
                         temperature=temperature
                     )
-                    
-                    print(f"Successfully collected response from {model_name}")
-                    
-                except Exception as e:
-                    print(f"Error querying {model_name}: {str(e)}")
                 
-                # Be nice to the APIs
-                time.sleep(1)
+                print(f"Successfully collected response from {model_name}")
+                
+            except Exception as e:
+                print(f"Error querying {model_name}: {str(e)}")
 
 def main():
     # Initialize the database if it doesn't exist
@@ -207,7 +268,10 @@ def main():
     collector = LLMCollector()
     
     # Collect responses
-    collector.collect_responses()
+    try:
+        collector.collect_responses()
+    finally:
+        collector.close()
     
     print("Response collection complete!")
 
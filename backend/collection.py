@@ -0,0 +1,199 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .llm_client import ProviderResult, empty_response
+from .retry import CircuitBreaker, RetryError, error_kind
+
+# Default number of in-flight requests allowed per provider. Override for a
+# single provider with PROVIDER_CONCURRENCY_<NAME>, e.g. PROVIDER_CONCURRENCY_GROK=1.
+DEFAULT_PROVIDER_CONCURRENCY = int(os.getenv("PROVIDER_CONCURRENCY", "4"))
+
+# Upper bound on a single provider call, counted from when the call starts
+# rather than from when it was queued behind the provider's other calls.
+PROVIDER_TIMEOUT_SECONDS = float(os.getenv("PROVIDER_TIMEOUT_SECONDS", "120"))
+
+Task = Tuple[str, str]  # (question, llm_name)
+
+
+def provider_concurrency(llm_name: str) -> int:
+    """Returns the concurrency limit configured for a provider."""
+    value = os.getenv(f"PROVIDER_CONCURRENCY_{llm_name.upper()}")
+    limit = int(value) if value else DEFAULT_PROVIDER_CONCURRENCY
+    return max(1, limit)
+
+
+def build_tasks(questions: List[str], providers: Dict[str, Callable], samples: int = 1) -> List[Task]:
+    """Expands questions and providers into (question, llm_name) tasks in a stable order, `samples` per pair."""
+    return [(question, llm_name) for question in questions for llm_name in providers for _ in range(samples)]
+
+
+def _circuit_open(breaker: CircuitBreaker) -> ProviderResult:
+    return ProviderResult(
+        error=f"Skipped: provider failed {breaker.threshold} calls in a row this run", error_kind="circuit_open"
+    )
+
+
+def _timed_out(timeout: float) -> ProviderResult:
+    return ProviderResult(
+        error=f"Timed out after {timeout:g}s", error_kind="timeout", latency=timeout, timed_out=True
+    )
+
+
+def _query(query_func: Callable[[str], str], question: str, outcome: Dict[str, ProviderResult]):
+    try:
+        text = query_func(question)
+        outcome["result"] = ProviderResult(text=text) if (text or "").strip() else empty_response()
+    except RetryError as e:
+        outcome["result"] = ProviderResult(error=str(e), error_kind=e.kind, attempts=e.attempts)
+    except Exception as e:
+        outcome["result"] = ProviderResult(error=f"{type(e).__name__}: {e}", error_kind=error_kind(e))
+
+
+def _call_sync(llm_name: str, query_func: Callable[[str], str], question: str,
+               breaker: CircuitBreaker, timeout: float) -> ProviderResult:
+    metrics.PROVIDER_QUEUE_DEPTH.labels(llm_name).dec()
+    if breaker.is_open(llm_name):
+        return _circuit_open(breaker)
+    with metrics.PROVIDER_IN_FLIGHT.labels(llm_name).track_inprogress():
+        started = time.perf_counter()
+        # Synchronous SDK calls can't be cancelled, so run the call on a
+        # daemon thread and give up on it after the timeout. The pool worker
+        # is then free for the provider's next call and the hung call finishes
+        # in the background.
+        outcome = {}
+        call = threading.Thread(
+            target=_query, args=(query_func, question, outcome), name=f"llm-{llm_name}-call", daemon=True
+        )
+        call.start()
+        call.join(timeout)
+        if call.is_alive():
+            result = _timed_out(timeout)
+        else:
+            result = outcome["result"]
+            result.latency = time.perf_counter() - started
+    breaker.record(llm_name, result.ok)
+    return result
+
+
+def fan_out(
+    tasks: List[Task],
+    providers: Dict[str, Callable[[str], str]],
+    timeout: Optional[float] = None,
+) -> List[Tuple[str, str, ProviderResult]]:
+    """
+    Queries synchronous providers concurrently and returns the results in task order.
+
+    Every provider gets its own bounded thread pool, so a slow or hung provider
+    only exhausts its own workers and never delays calls to the others. A
+    provider that fails repeatedly is skipped for the rest of the run.
+
+    Args:
+        tasks: (question, llm_name) pairs to query.
+        providers: Mapping of provider name to query function.
+        timeout: Seconds each call may take once started; defaults to PROVIDER_TIMEOUT_SECONDS.
+
+    Returns:
+        A list of (question, llm_name, result) tuples in the same order as `tasks`.
+    """
+    timeout = PROVIDER_TIMEOUT_SECONDS if timeout is None else timeout
+    breaker = CircuitBreaker()
+    pools = {
+        llm_name: ThreadPoolExecutor(
+            max_workers=provider_concurrency(llm_name),
+            thread_name_prefix=f"llm-{llm_name}",
+        )
+        for llm_name in {llm_name for _, llm_name in tasks}
+    }
+
+    try:
+        futures = []
+        for question, llm_name in tasks:
+            metrics.PROVIDER_QUEUE_DEPTH.labels(llm_name).inc()
+            futures.append(pools[llm_name].submit(
+                _call_sync, llm_name, providers[llm_name], question, breaker, timeout
+            ))
+        # Every call gives up after its own timeout, so this always returns.
+        wait(futures)
+
+        results = []
+        for (question, llm_name), future in zip(tasks, futures):
+            if future.exception() is not None:
+                result = ProviderResult(error=str(future.exception()), error_kind="error")
+            else:
+                result = future.result()
+            metrics.record_provider_result(llm_name, result)
+            results.append((question, llm_name, result))
+        return results
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def fan_out_async(
+    tasks: List[Task],
+    providers: Dict[str, Callable[[str], Awaitable[ProviderResult]]],
+    timeout: Optional[float] = None,
+) -> List[Tuple[str, str, ProviderResult]]:
+    """
+    Queries async providers concurrently on the running event loop.
+
+    Each provider is limited to its configured concurrency by a semaphore and
+    each call is cancelled once it has run for `timeout` seconds, so one slow
+    provider never delays the others and nothing is left running once this
+    returns. Time spent waiting for the semaphore doesn't count against a
+    call's timeout. A provider that fails repeatedly is skipped for the rest
+    of the run.
+
+    Args:
+        tasks: (question, llm_name) pairs to query.
+        providers: Mapping of provider name to query coroutine function.
+        timeout: Seconds each call may take once started; defaults to PROVIDER_TIMEOUT_SECONDS.
+
+    Returns:
+        A list of (question, llm_name, result) tuples in the same order as `tasks`.
+    """
+    timeout = PROVIDER_TIMEOUT_SECONDS if timeout is None else timeout
+    breaker = CircuitBreaker()
+    semaphores = {
+        llm_name: asyncio.Semaphore(provider_concurrency(llm_name))
+        for llm_name in {llm_name for _, llm_name in tasks}
+    }
+
+    async def call(question: str, llm_name: str) -> ProviderResult:
+        queued = metrics.PROVIDER_QUEUE_DEPTH.labels(llm_name)
+        queued.inc()
+        try:
+            await semaphores[llm_name].acquire()
+        finally:
+            queued.dec()
+        try:
+            if breaker.is_open(llm_name):
+                return _circuit_open(breaker)
+            with metrics.PROVIDER_IN_FLIGHT.labels(llm_name).track_inprogress():
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(providers[llm_name](question), timeout)
+                    result.latency = result.latency or time.perf_counter() - started
+                except asyncio.TimeoutError:
+                    result = _timed_out(timeout)
+            breaker.record(llm_name, result.ok)
+            return result
+        finally:
+            semaphores[llm_name].release()
+
+    async def run(question: str, llm_name: str) -> ProviderResult:
+        started = time.perf_counter()
+        try:
+            return await call(question, llm_name)
+        except Exception as e:
+            return ProviderResult(error=str(e), error_kind=error_kind(e), latency=time.perf_counter() - started)
+
+    results = await asyncio.gather(*(run(question, llm_name) for question, llm_name in tasks))
+    for (_, llm_name), result in zip(tasks, results):
+        metrics.record_provider_result(llm_name, result)
+    return [(question, llm_name, result) for (question, llm_name), result in zip(tasks, results)]
@@ -0,0 +1,101 @@
+"""
+Compress and deduplicate stored response texts.
+
+Moves plain-text responses written before compression into deduplicated
+blobs. With --train-dictionary, first trains a zstd dictionary on a sample
+of stored responses and recompresses every blob with it; new responses are
+then compressed with that dictionary too.
+
+Usage:
+    python -m backend.compact_responses [--train-dictionary] [--vacuum]
+"""
+import argparse
+
+from sqlalchemy import func, or_, text
+
+from . import compression, crud, models
+from .database import SessionLocal, engine, upgrade_schema
+
+def migrate_plain_responses(db, chunk_size: int = 500) -> int:
+    """Moves plain-text responses into compressed blobs and returns how many were moved."""
+    moved = 0
+    while True:
+        rows = db.query(models.Response).filter(
+            models.Response.response_text.isnot(None)
+        ).order_by(models.Response.id).limit(chunk_size).all()
+        if not rows:
+            break
+        crud.store_response_texts(db, rows)
+        db.commit()
+        moved += len(rows)
+        print(f"Compressed {moved} responses...")
+    return moved
+
+def train_dictionary(db, sample_size: int = 2000, dict_size: int = 112 * 1024) -> int:
+    """Trains and stores a dictionary on a random sample of distinct responses; returns its id."""
+    blobs = db.query(models.ResponseBlob).order_by(func.random()).limit(sample_size).all()
+    samples = [blob.text for blob in blobs]
+    if len(samples) < 10:
+        raise RuntimeError("Need at least 10 stored responses to train a dictionary.")
+    dictionary = models.CompressionDictionary(data=compression.train_dictionary(samples, size=dict_size))
+    db.add(dictionary)
+    db.commit()
+    compression.register_dictionary(dictionary.id, dictionary.data)
+    print(f"Trained dictionary {dictionary.id} on {len(samples)} responses.")
+    return dictionary.id
+
+def recompress_blobs(db, dictionary_id: int, chunk_size: int = 500) -> int:
+    """Recompresses every blob not yet using `dictionary_id`; returns how many changed."""
+    recompressed = 0
+    last_hash = ""
+    while True:
+        blobs = db.query(models.ResponseBlob).filter(
+            models.ResponseBlob.content_hash > last_hash,
+            or_(models.ResponseBlob.dictionary_id.is_(None), models.ResponseBlob.dictionary_id != dictionary_id)
+        ).order_by(models.ResponseBlob.content_hash).limit(chunk_size).all()
+        if not blobs:
+            break
+        for blob in blobs:
+            blob.codec, blob.data = compression.compress(blob.text, dictionary_id)
+            blob.dictionary_id = dictionary_id
+        last_hash = blobs[-1].content_hash
+        db.commit()
+        recompressed += len(blobs)
+        print(f"Recompressed {recompressed} blobs...")
+    return recompressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-dictionary", action="store_true", help="Train a zstd dictionary and recompress with it.")
+    parser.add_argument("--sample-size", type=int, default=2000, help="Responses sampled to train the dictionary.")
+    parser.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards to return freed space to the OS.")
+    args = parser.parse_args()
+
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        migrate_plain_responses(db)
+        if args.train_dictionary:
+            if not compression.zstd_available():
+                raise SystemExit("Training a dictionary requires the zstandard package.")
+            dictionary_id = train_dictionary(db, sample_size=args.sample_size)
+            recompress_blobs(db, dictionary_id)
+
+        responses = db.query(func.count(models.Response.id)).scalar()
+        blobs, plain_size, compressed_size = db.query(
+            func.count(models.ResponseBlob.content_hash),
+            func.coalesce(func.sum(models.ResponseBlob.size), 0),
+            func.coalesce(func.sum(func.length(models.ResponseBlob.data)), 0),
+        ).one()
+        print(f"{responses} responses share {blobs} distinct texts: "
+              f"{plain_size} characters stored in {compressed_size} bytes.")
+    finally:
+        db.close()
+
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        print("Vacuumed database.")
+
+if __name__ == "__main__":
+    main()
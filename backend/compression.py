@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; fall back to zlib.
+    zstandard = None
+
+ZSTD_LEVEL = 10
+
+# Trained dictionaries by id, shared by every compressor in the process.
+_dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+_local = threading.local()
+
+
+def content_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest used to deduplicate response texts."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def zstd_available() -> bool:
+    return zstandard is not None
+
+
+def has_dictionary(dictionary_id: int) -> bool:
+    return dictionary_id in _dictionaries
+
+
+def register_dictionary(dictionary_id: int, data: bytes) -> None:
+    """Makes a stored dictionary available for compression and decompression."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to use compression dictionaries.")
+    _dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(data)
+
+
+def train_dictionary(samples: List[str], size: int = 112 * 1024) -> bytes:
+    """Trains a zstd dictionary on sample response texts."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to train a compression dictionary.")
+    return zstandard.train_dictionary(size, [sample.encode("utf-8") for sample in samples]).as_bytes()
+
+
+def _codecs(dictionary_id: Optional[int]):
+    # zstd (de)compressor objects are not thread-safe, so keep one pair per
+    # thread and dictionary.
+    cache = getattr(_local, "codecs", None)
+    if cache is None:
+        cache = _local.codecs = {}
+    if dictionary_id not in cache:
+        dictionary = _dictionaries[dictionary_id] if dictionary_id is not None else None
+        cache[dictionary_id] = (
+            zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary),
+            zstandard.ZstdDecompressor(dict_data=dictionary),
+        )
+    return cache[dictionary_id]
+
+
+def compress(text: str, dictionary_id: Optional[int] = None) -> Tuple[str, bytes]:
+    """
+    Compresses a response text.
+
+    Args:
+        text: The text to compress.
+        dictionary_id: A registered dictionary to compress with, if any.
+
+    Returns:
+        A (codec, data) tuple; the codec is "zstd" or "zlib".
+    """
+    raw = text.encode("utf-8")
+    if zstandard is None:
+        return "zlib", zlib.compress(raw, 9)
+    compressor, _ = _codecs(dictionary_id)
+    return "zstd", compressor.compress(raw)
+
+
+def decompress(codec: str, data: bytes, dictionary_id: Optional[int] = None) -> str:
+    """Restores a text produced by `compress`."""
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed responses.")
+        _, decompressor = _codecs(dictionary_id)
+        return decompressor.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown compression codec: {codec}")
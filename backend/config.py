@@ -13,25 +13,32 @@ class Config:
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
     COHERE_API_KEY = os.getenv('COHERE_API_KEY')
     
-    # LLM configurations
+    # LLM configurations. requests_per_minute / tokens_per_minute are the
+    # provider budgets enforced by the collector's rate limiter.
     LLM_CONFIGS = {
         'gpt-4': {
             'provider': 'openai',
             'model': 'gpt-4',
             'temperature': 0.7,
-            'max_tokens': 1000
+            'max_tokens': 1000,
+            'requests_per_minute': 500,
+            'tokens_per_minute': 40000
         },
         'claude-2': {
             'provider': 'anthropic',
             'model': 'claude-2',
             'temperature': 0.7,
-            'max_tokens': 1000
+            'max_tokens': 1000,
+            'requests_per_minute': 50,
+            'tokens_per_minute': 40000
         },
         'command': {
             'provider': 'cohere',
             'model': 'command',
             'temperature': 0.7,
-            'max_tokens': 1000
+            'max_tokens': 1000,
+            'requests_per_minute': 100,
+            'tokens_per_minute': 100000
         }
     }
     
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Modules that touch the default engine at import (main runs upgrade_schema)
+# must not create or migrate a real database file.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.database import upgrade_schema  # noqa: E402
+
+
+@pytest.fixture
+def session_factory():
+    """A session factory bound to a fresh in-memory database with the current schema."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    upgrade_schema(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(session_factory):
+    """An API test client whose requests use the in-memory database."""
+    # The API imports every provider SDK through the scheduler.
+    for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+        pytest.importorskip(sdk)
+    from fastapi.testclient import TestClient
+    from backend import main
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
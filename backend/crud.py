@@ -1,19 +1,486 @@
-from sqlalchemy.orm import Session
-from . import models
+import base64
+import datetime
+import json
 
-from typing import Optional
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query, Session, defer, joinedload
+from . import compression, models, schemas
+from .analysis import matrix_from_bytes, matrix_to_bytes
 
-def create_response(db: Session, llm_name: str, question: str, response: str, similarity_score: Optional[float]):
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+def create_response(db: Session, llm_name: str, question: str, response: str, similarity_score: Optional[float],
+                    embedding: Optional[bytes] = None, embedding_model: Optional[str] = None):
     db_response = models.Response(
         llm_name=llm_name, 
         question=question, 
         response=response,
-        similarity_score=similarity_score
+        similarity_score=similarity_score,
+        embedding=embedding,
+        embedding_model=embedding_model
     )
+    store_response_texts(db, [db_response])
     db.add(db_response)
+    db.flush()
+    set_latest_responses(db, [db_response])
+    update_drift_rollups(db, [{"llm_name": llm_name, "question": question, "response": response,
+                               "similarity_score": similarity_score}])
     db.commit()
     db.refresh(db_response)
     return db_response
 
-def get_responses(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Response).offset(skip).limit(limit).all()
+def encode_cursor(db_response: models.Response) -> str:
+    """Encodes the (timestamp, id) position of a row as an opaque page cursor."""
+    position = f"{db_response.timestamp.isoformat()}|{db_response.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Decodes a page cursor. Raises ValueError if it is malformed."""
+    try:
+        timestamp, response_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(response_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def apply_response_filters(query: Query, filters: Optional[schemas.ResponseFilters]) -> Query:
+    """Restricts a responses query to the given filters."""
+    if filters is None:
+        return query
+    if filters.llm_name is not None:
+        query = query.filter(models.Response.llm_name == filters.llm_name)
+    if filters.question is not None:
+        query = query.filter(models.Response.question == filters.question)
+    if filters.since is not None:
+        query = query.filter(models.Response.timestamp >= filters.since)
+    if filters.until is not None:
+        query = query.filter(models.Response.timestamp < filters.until)
+    if filters.min_similarity is not None:
+        query = query.filter(models.Response.similarity_score >= filters.min_similarity)
+    if filters.max_similarity is not None:
+        query = query.filter(models.Response.similarity_score <= filters.max_similarity)
+    return query
+
+def get_responses(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  filters: Optional[schemas.ResponseFilters] = None) -> List[models.Response]:
+    """
+    Returns a page of responses, newest first.
+
+    Pages are addressed by `cursor`, the value of `encode_cursor` for the last
+    row of the previous page, so fetching a deep page costs the same as the
+    first one. `skip` is still honoured for older callers but scans every
+    skipped row.
+    """
+    query = apply_response_filters(
+        db.query(models.Response).options(joinedload(models.Response.blob)), filters
+    )
+    if cursor is not None:
+        timestamp, response_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Response.timestamp < timestamp,
+            and_(models.Response.timestamp == timestamp, models.Response.id < response_id)
+        ))
+    query = query.order_by(models.Response.timestamp.desc(), models.Response.id.desc())
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def create_responses(db: Session, responses: List[Dict[str, Any]], chunk_size: Optional[int] = None,
+                     on_chunk: Optional[Callable[[List[Dict[str, Any]], List[models.Response]], None]] = None):
+    """
+    Inserts many responses without refreshing each row.
+
+    All rows are written in a single transaction, or in one transaction per
+    `chunk_size` rows when given, together with their drift rollups. A
+    failure rolls back the chunk being written.
+
+    Args:
+        db: The database session.
+        responses: Dicts with the same fields as `create_response` takes.
+        chunk_size: Rows per commit; None writes everything in one transaction.
+        on_chunk: Called with each chunk's dicts and flushed rows (which have
+            their ids) before the chunk is committed, to write records that
+            must share its transaction.
+
+    Returns:
+        The inserted `models.Response` objects, in order.
+    """
+    db_responses = [models.Response(**response) for response in responses]
+    chunk_size = chunk_size or len(db_responses) or 1
+    try:
+        for start in range(0, len(db_responses), chunk_size):
+            chunk = db_responses[start:start + chunk_size]
+            store_response_texts(db, chunk)
+            db.add_all(chunk)
+            db.flush()
+            set_latest_responses(db, chunk)
+            update_drift_rollups(db, responses[start:start + chunk_size])
+            if on_chunk is not None:
+                on_chunk(responses[start:start + chunk_size], chunk)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return db_responses
+
+def get_active_dictionary_id(db: Session) -> Optional[int]:
+    """Returns the newest trained compression dictionary, registering it for use."""
+    if not compression.zstd_available():
+        return None
+    dictionary = db.query(models.CompressionDictionary).order_by(
+        models.CompressionDictionary.id.desc()
+    ).first()
+    if dictionary is None:
+        return None
+    if not compression.has_dictionary(dictionary.id):
+        compression.register_dictionary(dictionary.id, dictionary.data)
+    return dictionary.id
+
+def store_response_texts(db: Session, db_responses: List[models.Response], dictionary_id: Optional[int] = None):
+    """
+    Moves the plain text of pending responses into compressed blobs.
+
+    Texts are deduplicated by content hash: a text that is already stored,
+    or that appears several times in the batch, is compressed and written once.
+    """
+    texts = {}
+    for db_response in db_responses:
+        if db_response.response_text is not None:
+            db_response.content_hash = compression.content_hash(db_response.response_text)
+            texts[db_response.content_hash] = db_response.response_text
+            db_response.response_text = None
+    if not texts:
+        return
+
+    stored = {
+        content_hash for (content_hash,) in db.query(models.ResponseBlob.content_hash).filter(
+            models.ResponseBlob.content_hash.in_(texts)
+        )
+    }
+    if dictionary_id is None:
+        dictionary_id = get_active_dictionary_id(db)
+    for content_hash, text in texts.items():
+        if content_hash in stored:
+            continue
+        codec, data = compression.compress(text, dictionary_id)
+        db.add(models.ResponseBlob(
+            content_hash=content_hash,
+            codec=codec,
+            dictionary_id=dictionary_id if codec == "zstd" else None,
+            data=data,
+            size=len(text)
+        ))
+
+def set_latest_responses(db: Session, db_responses: List[models.Response]):
+    """Points the latest-response index for each row's (llm_name, question) at it."""
+    newest = {}
+    for db_response in db_responses:
+        newest[(db_response.llm_name, db_response.question)] = db_response.id
+
+    existing = {
+        (row.llm_name, row.question): row
+        for row in db.query(models.LatestResponse).filter(
+            models.LatestResponse.llm_name.in_({llm_name for llm_name, _ in newest}),
+            models.LatestResponse.question.in_({question for _, question in newest})
+        )
+    }
+    for (llm_name, question), response_id in newest.items():
+        if (llm_name, question) in existing:
+            existing[(llm_name, question)].response_id = response_id
+        else:
+            db.add(models.LatestResponse(llm_name=llm_name, question=question, response_id=response_id))
+
+def get_latest_responses(db: Session, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], models.Response]:
+    """Returns the most recent response for each (llm_name, question) pair with a single query."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    rows = db.query(models.Response).options(joinedload(models.Response.blob)).join(
+        models.LatestResponse, models.LatestResponse.response_id == models.Response.id
+    ).filter(
+        models.LatestResponse.llm_name.in_({llm_name for llm_name, _ in pairs}),
+        models.LatestResponse.question.in_({question for _, question in pairs})
+    ).all()
+    return {
+        (row.llm_name, row.question): row
+        for row in rows
+        if (row.llm_name, row.question) in pairs
+    }
+
+def latest_responses_missing(db: Session) -> bool:
+    """Whether responses exist that the latest-response index doesn't know about yet."""
+    return (
+        db.query(models.LatestResponse).first() is None
+        and db.query(models.Response).first() is not None
+    )
+
+def rebuild_latest_responses(db: Session):
+    """Rebuilds the latest-response index from the full responses table."""
+    latest_ids = db.query(
+        models.Response.llm_name,
+        models.Response.question,
+        func.max(models.Response.id)
+    ).group_by(models.Response.llm_name, models.Response.question)
+
+    db.query(models.LatestResponse).delete()
+    db.add_all(
+        models.LatestResponse(llm_name=llm_name, question=question, response_id=response_id)
+        for llm_name, question, response_id in latest_ids
+    )
+    db.commit()
+
+ROLLUP_PERIODS = ("day", "week")
+
+def _period_start(period: str, timestamp: datetime.datetime) -> datetime.date:
+    day = timestamp.date()
+    return day if period == "day" else day - datetime.timedelta(days=day.weekday())
+
+def update_drift_rollups(db: Session, responses: Iterable[Dict[str, Any]]):
+    """
+    Folds new responses into the daily and weekly drift rollups.
+
+    Each dict needs llm_name, question, response and similarity_score, plus an
+    optional timestamp (defaults to now, UTC). Only the buckets the responses
+    fall into are read and updated. Changes are left uncommitted so they land
+    in the same transaction as the responses themselves.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    grouped: Dict[Tuple[str, str, str, datetime.date], List[Dict[str, Any]]] = {}
+    for response in responses:
+        timestamp = response.get("timestamp") or now
+        for period in ROLLUP_PERIODS:
+            key = (period, response["llm_name"], response["question"], _period_start(period, timestamp))
+            grouped.setdefault(key, []).append(response)
+    if not grouped:
+        return
+
+    existing = {
+        (row.period, row.llm_name, row.question, row.period_start): row
+        for row in db.query(models.DriftRollup).filter(
+            models.DriftRollup.llm_name.in_({key[1] for key in grouped}),
+            models.DriftRollup.question.in_({key[2] for key in grouped}),
+            models.DriftRollup.period_start.in_({key[3] for key in grouped})
+        )
+    }
+    for key, bucket_responses in grouped.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            period, llm_name, question, period_start = key
+            rollup = models.DriftRollup(
+                period=period, llm_name=llm_name, question=question, period_start=period_start,
+                response_count=0, scored_count=0, similarity_sum=0.0,
+                response_length_sum=0, similarity_values=b""
+            )
+            db.add(rollup)
+
+        scores = [r["similarity_score"] for r in bucket_responses if r["similarity_score"] is not None]
+        rollup.response_count += len(bucket_responses)
+        rollup.response_length_sum += sum(len(r["response"] or "") for r in bucket_responses)
+        if scores:
+            values = np.concatenate([
+                np.frombuffer(rollup.similarity_values, dtype=np.float32),
+                np.asarray(scores, dtype=np.float32)
+            ])
+            rollup.similarity_values = values.tobytes()
+            rollup.scored_count += len(scores)
+            rollup.similarity_sum += float(sum(scores))
+            rollup.similarity_min = float(values.min())
+            rollup.similarity_p10 = float(np.percentile(values, 10))
+    # Flushed so a later call in the same transaction finds the buckets created here.
+    db.flush()
+
+def rebuild_drift_rollups(db: Session, chunk_size: int = 1000):
+    """Recomputes every rollup from the responses table, reading it in chunks."""
+    db.query(models.DriftRollup).delete()
+    db.commit()
+    last_id = 0
+    while True:
+        rows = db.query(models.Response).options(joinedload(models.Response.blob)).filter(
+            models.Response.id > last_id
+        ).order_by(models.Response.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        update_drift_rollups(db, [
+            {"timestamp": row.timestamp, "llm_name": row.llm_name, "question": row.question,
+             "response": row.response, "similarity_score": row.similarity_score}
+            for row in rows
+        ])
+        db.commit()
+
+def drift_rollups_missing(db: Session) -> bool:
+    """
+    Whether the daily rollups don't account for every stored response.
+
+    True before rollups were first computed, and for databases where
+    responses were written without their rollups by an older version.
+    """
+    counted = db.query(func.coalesce(func.sum(models.DriftRollup.response_count), 0)).filter(
+        models.DriftRollup.period == "day"
+    ).scalar()
+    return counted != db.query(func.count(models.Response.id)).scalar()
+
+def get_drift_timeseries(db: Session, period: str = "day", llm_name: Optional[str] = None,
+                         question: Optional[str] = None, since: Optional[datetime.date] = None,
+                         until: Optional[datetime.date] = None) -> List[schemas.DriftPoint]:
+    """Returns rollup points for the given period, oldest first."""
+    query = db.query(models.DriftRollup).filter(models.DriftRollup.period == period)
+    if llm_name is not None:
+        query = query.filter(models.DriftRollup.llm_name == llm_name)
+    if question is not None:
+        query = query.filter(models.DriftRollup.question == question)
+    if since is not None:
+        query = query.filter(models.DriftRollup.period_start >= since)
+    if until is not None:
+        query = query.filter(models.DriftRollup.period_start < until)
+    rows = query.order_by(
+        models.DriftRollup.period_start, models.DriftRollup.llm_name, models.DriftRollup.question
+    ).all()
+    return [
+        schemas.DriftPoint(
+            period_start=row.period_start,
+            llm_name=row.llm_name,
+            question=row.question,
+            response_count=row.response_count,
+            mean_similarity=row.similarity_sum / row.scored_count if row.scored_count else None,
+            min_similarity=row.similarity_min,
+            p10_similarity=row.similarity_p10,
+            mean_response_length=row.response_length_sum / row.response_count if row.response_count else 0.0,
+        )
+        for row in rows
+    ]
+
+def create_failures(db: Session, failures: List[Dict[str, Any]]):
+    """Records provider calls that failed, in one transaction."""
+    if not failures:
+        return
+    db.add_all([models.ProviderFailure(**failure) for failure in failures])
+    db.commit()
+
+def get_failures(db: Session, llm_name: Optional[str] = None, error_kind: Optional[str] = None,
+                 since: Optional[datetime.datetime] = None, skip: int = 0, limit: int = 100):
+    """Lists recorded provider failures, newest first."""
+    query = db.query(models.ProviderFailure)
+    if llm_name is not None:
+        query = query.filter(models.ProviderFailure.llm_name == llm_name)
+    if error_kind is not None:
+        query = query.filter(models.ProviderFailure.error_kind == error_kind)
+    if since is not None:
+        query = query.filter(models.ProviderFailure.timestamp >= since)
+    return query.order_by(
+        models.ProviderFailure.timestamp.desc(), models.ProviderFailure.id.desc()
+    ).offset(skip).limit(limit).all()
+
+def get_drift_events(db: Session, llm_name: Optional[str] = None, question: Optional[str] = None,
+                     since: Optional[datetime.datetime] = None, skip: int = 0, limit: int = 100):
+    """Lists detected drift events, newest first."""
+    query = db.query(models.DriftEvent)
+    if llm_name is not None:
+        query = query.filter(models.DriftEvent.llm_name == llm_name)
+    if question is not None:
+        query = query.filter(models.DriftEvent.question == question)
+    if since is not None:
+        query = query.filter(models.DriftEvent.timestamp >= since)
+    return query.order_by(models.DriftEvent.id.desc()).offset(skip).limit(limit).all()
+
+def get_latest_sample_sets(db: Session, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], models.SampleSet]:
+    """Returns the most recent sample set for each (llm_name, question) pair that has one."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    latest_ids = db.query(func.max(models.SampleSet.id)).filter(
+        models.SampleSet.llm_name.in_({llm_name for llm_name, _ in pairs}),
+        models.SampleSet.question.in_({question for _, question in pairs})
+    ).group_by(models.SampleSet.llm_name, models.SampleSet.question)
+    return {
+        (row.llm_name, row.question): row
+        for row in db.query(models.SampleSet).filter(models.SampleSet.id.in_(latest_ids.scalar_subquery()))
+        if (row.llm_name, row.question) in pairs
+    }
+
+def create_sample_sets(db: Session, sample_sets: List[Dict[str, Any]]) -> List[models.SampleSet]:
+    """
+    Adds sample sets and returns them with their ids.
+
+    They are flushed, not committed, so they are written in the same
+    transaction as the responses that point at them.
+    """
+    db_sample_sets = [models.SampleSet(**sample_set) for sample_set in sample_sets]
+    db.add_all(db_sample_sets)
+    db.flush()
+    return db_sample_sets
+
+def get_sample_sets(db: Session, llm_name: Optional[str] = None, question: Optional[str] = None,
+                    since: Optional[datetime.datetime] = None, skip: int = 0, limit: int = 100):
+    """Lists sample sets, newest first."""
+    query = db.query(models.SampleSet)
+    if llm_name is not None:
+        query = query.filter(models.SampleSet.llm_name == llm_name)
+    if question is not None:
+        query = query.filter(models.SampleSet.question == question)
+    if since is not None:
+        query = query.filter(models.SampleSet.timestamp >= since)
+    return query.order_by(models.SampleSet.id.desc()).offset(skip).limit(limit).all()
+
+def get_responses_by_ids(db: Session, ids: Iterable[int]) -> List[models.Response]:
+    """Loads responses by id in one query, with their text but without their embeddings."""
+    ids = list(ids)
+    if not ids:
+        return []
+    return db.query(models.Response).options(
+        joinedload(models.Response.blob), defer(models.Response.embedding)
+    ).filter(models.Response.id.in_(ids)).all()
+
+def create_agreement_matrices(db: Session, matrices: List[Dict[str, Any]]):
+    """
+    Adds a run's agreement matrices.
+
+    Each dict holds the question, the ordered `llm_names` and the full
+    `matrix` as an array; only its upper triangle is kept. They are flushed,
+    not committed, so they are written in the same transaction as the run's
+    responses.
+    """
+    if not matrices:
+        return
+    db.add_all([
+        models.AgreementMatrix(
+            question=matrix["question"],
+            llm_names=json.dumps(matrix["llm_names"]),
+            matrix=matrix_to_bytes(matrix["matrix"]),
+        )
+        for matrix in matrices
+    ])
+    db.flush()
+
+def get_agreement_matrices(db: Session, question: Optional[str] = None, llm_name: Optional[str] = None,
+                           since: Optional[datetime.datetime] = None, skip: int = 0,
+                           limit: int = 100) -> List[schemas.AgreementMatrix]:
+    """Lists agreement matrices newest first, optionally only those that include `llm_name`."""
+    query = db.query(models.AgreementMatrix)
+    if question is not None:
+        query = query.filter(models.AgreementMatrix.question == question)
+    if llm_name is not None:
+        # Names are stored JSON-quoted, so this only matches whole names.
+        query = query.filter(models.AgreementMatrix.llm_names.contains(json.dumps(llm_name)))
+    if since is not None:
+        query = query.filter(models.AgreementMatrix.timestamp >= since)
+    rows = query.order_by(models.AgreementMatrix.id.desc()).offset(skip).limit(limit).all()
+
+    results = []
+    for row in rows:
+        llm_names = json.loads(row.llm_names)
+        matrix = matrix_from_bytes(row.matrix, len(llm_names))
+        # Each model's mean similarity to the others; a model drifting away from its peers drops here first.
+        peer_sums = matrix.sum(axis=1) - 1.0
+        results.append(schemas.AgreementMatrix(
+            id=row.id,
+            timestamp=row.timestamp,
+            question=row.question,
+            llm_names=llm_names,
+            matrix=[[round(float(value), 4) for value in values] for values in matrix],
+            mean_agreement={
+                name: round(float(total) / (len(llm_names) - 1), 4)
+                for name, total in zip(llm_names, peer_sums)
+            },
+        ))
+    return results
@@ -0,0 +1,177 @@
+"""
+Stream stored responses out as NDJSON, CSV or Parquet.
+
+Rows are read through a server-side cursor and written as they arrive, so
+memory stays flat however many rows match.
+
+Usage:
+    python -m backend.export --format ndjson --output responses.ndjson [filters]
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import sys
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from . import compression, crud, models, schemas
+from .database import SessionLocal
+
+EXPORT_FIELDS = ["id", "timestamp", "llm_name", "question", "response", "similarity_score"]
+
+# Rows fetched from the database per round trip.
+FETCH_SIZE = 1000
+
+def _load_dictionary(db: Session, dictionary_id: Optional[int]) -> None:
+    if dictionary_id is not None and not compression.has_dictionary(dictionary_id):
+        dictionary = db.get(models.CompressionDictionary, dictionary_id)
+        compression.register_dictionary(dictionary.id, dictionary.data)
+
+def iter_rows(db: Session, filters: Optional[schemas.ResponseFilters] = None,
+              fetch_size: int = FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yields matching responses oldest first as plain dicts, without loading them all."""
+    # Select plain columns rather than entities: eager-loading the blob
+    # relationship can't be combined with yield_per, and the compressed
+    # columns are all that's needed to restore the text row by row.
+    columns = [getattr(models.Response, field) for field in EXPORT_FIELDS if field != "response"]
+    query = db.query(
+        *columns,
+        models.Response.response_text,
+        models.ResponseBlob.codec,
+        models.ResponseBlob.dictionary_id,
+        models.ResponseBlob.data,
+    ).outerjoin(models.ResponseBlob, models.Response.content_hash == models.ResponseBlob.content_hash)
+    query = crud.apply_response_filters(query, filters).order_by(
+        models.Response.timestamp, models.Response.id
+    ).execution_options(stream_results=True, yield_per=fetch_size)
+    for row in query:
+        text = row.response_text
+        if row.codec is not None:
+            _load_dictionary(db, row.dictionary_id)
+            text = compression.decompress(row.codec, row.data, row.dictionary_id)
+        yield {field: text if field == "response" else getattr(row, field) for field in EXPORT_FIELDS}
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+def iter_ndjson(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serialises rows as newline-delimited JSON."""
+    for row in rows:
+        yield (json.dumps(row, default=_json_default) + "\n").encode()
+
+def iter_csv(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serialises rows as CSV with a header line."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands written bytes back to the caller in chunks."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_parquet(rows: Iterator[Dict[str, Any]], row_group_size: int = FETCH_SIZE) -> Iterator[bytes]:
+    """Serialises rows as Parquet, one row group at a time. Requires pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("llm_name", pa.string()),
+        ("question", pa.string()),
+        ("response", pa.string()),
+        ("similarity_score", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write_group(batch):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        return sink.drain()
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            yield write_group(batch)
+            batch = []
+    if batch:
+        yield write_group(batch)
+    writer.close()
+    yield sink.drain()
+
+FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet"),
+}
+
+def stream_export(export_format: str, filters: Optional[schemas.ResponseFilters] = None) -> Iterator[bytes]:
+    """Streams an export in the given format from its own database session."""
+    serialise, _ = FORMATS[export_format]
+    db = SessionLocal()
+    try:
+        yield from serialise(iter_rows(db, filters))
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--output", help="File to write; defaults to stdout.")
+    parser.add_argument("--llm-name")
+    parser.add_argument("--question")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--min-similarity", type=float)
+    parser.add_argument("--max-similarity", type=float)
+    args = parser.parse_args()
+
+    filters = schemas.ResponseFilters(
+        llm_name=args.llm_name,
+        question=args.question,
+        since=args.since,
+        until=args.until,
+        min_similarity=args.min_similarity,
+        max_similarity=args.max_similarity,
+    )
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.format, filters):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == "__main__":
+    main()
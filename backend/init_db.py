@@ -37,6 +37,7 @@ def init_database():
             llm_id INTEGER NOT NULL,
             question_id INTEGER NOT NULL,
             response_text TEXT NOT NULL,
+            content_hash TEXT REFERENCES response_blobs (content_hash),
             prompt_tokens INTEGER,
             completion_tokens INTEGER,
             total_tokens INTEGER,
@@ -48,6 +49,22 @@ def init_database():
         )
         ''')
         
+        # Compressed response texts, stored once per distinct content. Rows
+        # that reference a blob keep an empty response_text.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS response_blobs (
+            content_hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        )
+        ''')
+        
+        # Databases created before compression need the content_hash column
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(responses)')]
+        if 'content_hash' not in columns:
+            cursor.execute('ALTER TABLE responses ADD COLUMN content_hash TEXT REFERENCES response_blobs (content_hash)')
+        
         # Create an index for faster lookups
         cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_responses_llm_question 
@@ -0,0 +1,44 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+# Words per shingle when fingerprinting a text.
+SHINGLE_SIZE = int(os.getenv("SIMHASH_SHINGLE_SIZE", "3"))
+
+FINGERPRINT_BITS = 64
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = None) -> list:
+    """Splits a text into overlapping, lower-cased word n-grams."""
+    size = size or SHINGLE_SIZE
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """
+    Returns the 64-bit SimHash fingerprint of a text's word shingles.
+
+    Texts that share most of their shingles get fingerprints that differ in
+    few bits. The value is a signed integer so SQLite can store it as is.
+    """
+    grams = shingles(text)
+    if not grams:
+        return 0
+    digests = b"".join(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest() for gram in grams)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(grams), 8), axis=1)
+    # Each shingle votes on every bit; the fingerprint keeps the majority.
+    fingerprint = np.packbits(2 * bits.sum(axis=0, dtype=np.int64) > len(grams))
+    return int.from_bytes(fingerprint.tobytes(), "big", signed=True)
+
+
+def lexical_similarity(fingerprint1: int, fingerprint2: int) -> float:
+    """Returns the share of fingerprint bits two texts agree on, from 0.0 to 1.0."""
+    differing = (fingerprint1 ^ fingerprint2) & ((1 << FINGERPRINT_BITS) - 1)
+    return 1.0 - bin(differing).count("1") / FINGERPRINT_BITS
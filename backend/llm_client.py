@@ -1,10 +1,15 @@
 import os
-import requests
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
-from anthropic import Anthropic
+from openai import AsyncOpenAI, OpenAI
+from anthropic import Anthropic, AsyncAnthropic
+from mistralai.async_client import MistralAsyncClient
 from mistralai.client import MistralClient
 import google.generativeai as genai
+from . import transport
+from .retry import ProviderNotConfigured, RetryError, call_with_retry, call_with_retry_async
 
 load_dotenv()
 
@@ -17,40 +22,60 @@ GROK_API_KEY = os.getenv("GROK_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
 # --- API Endpoints ---
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1/chat/completions")
+
+# --- Models ---
+CHATGPT_MODEL = "gpt-3.5-turbo"
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+MISTRAL_MODEL = "mistral-large-latest"
+GEMINI_MODEL = "gemini-1.5-flash"
+GROK_MODEL = "grok-1"
+DEEPSEEK_MODEL = "deepseek-chat"
 
 # --- LLM Client Initialization ---
+# SDKs that accept an httpx client share the pooled transport; the others get
+# the same timeouts. SDK-level retries are off because calls are retried with
+# backoff in one place, see retry.py.
 try:
     if OPENAI_API_KEY:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
+        openai_client = OpenAI(api_key=OPENAI_API_KEY, http_client=transport.http_client, max_retries=0)
+        async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=transport.async_http_client, max_retries=0)
     else:
         openai_client = None
+        async_openai_client = None
 except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
     openai_client = None
+    async_openai_client = None
 
 try:
     if CLAUDE_API_KEY:
-        anthropic_client = Anthropic(api_key=CLAUDE_API_KEY)
+        anthropic_client = Anthropic(api_key=CLAUDE_API_KEY, http_client=transport.http_client, max_retries=0)
+        async_anthropic_client = AsyncAnthropic(api_key=CLAUDE_API_KEY, http_client=transport.async_http_client, max_retries=0)
     else:
         anthropic_client = None
+        async_anthropic_client = None
 except Exception as e:
     print(f"Error initializing Anthropic client: {e}")
     anthropic_client = None
+    async_anthropic_client = None
 
 try:
     if MISTRAL_API_KEY:
-        mistral_client = MistralClient(api_key=MISTRAL_API_KEY)
+        mistral_client = MistralClient(api_key=MISTRAL_API_KEY, timeout=transport.HTTP_READ_TIMEOUT, max_retries=0)
+        async_mistral_client = MistralAsyncClient(api_key=MISTRAL_API_KEY, timeout=transport.HTTP_READ_TIMEOUT, max_retries=0)
     else:
         mistral_client = None
+        async_mistral_client = None
 except Exception as e:
     print(f"Error initializing Mistral client: {e}")
     mistral_client = None
+    async_mistral_client = None
 
 try:
     if GEMINI_API_KEY:
         genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+        gemini_model = genai.GenerativeModel(GEMINI_MODEL)
     else:
         gemini_model = None
 except Exception as e:
@@ -59,81 +84,83 @@ except Exception as e:
 
 try:
     if DEEPSEEK_API_KEY:
-        deepseek_client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+        deepseek_client = OpenAI(
+            api_key=DEEPSEEK_API_KEY,
+            base_url="https://api.deepseek.com",
+            http_client=transport.http_client,
+            max_retries=0
+        )
+        async_deepseek_client = AsyncOpenAI(
+            api_key=DEEPSEEK_API_KEY,
+            base_url="https://api.deepseek.com",
+            http_client=transport.async_http_client,
+            max_retries=0
+        )
     else:
         deepseek_client = None
+        async_deepseek_client = None
 except Exception as e:
     print(f"Error initializing Deepseek client: {e}")
     deepseek_client = None
+    async_deepseek_client = None
 
 # --- LLM Query Functions ---
+# Each function returns the response text, or raises if the provider isn't
+# configured or the call still fails after retrying transient errors.
 
 def get_chatgpt_response(question: str) -> str:
     """Queries the ChatGPT API."""
     if not openai_client:
-        return "OpenAI API key not configured or client initialization failed."
-    try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant providing concise and neutral answers."},
-                {"role": "user", "content": question}
-            ]
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        print(f"Error querying ChatGPT: {e}")
-        return f"Error: Could not get response from ChatGPT."
+        raise ProviderNotConfigured("OpenAI API key not configured or client initialization failed.")
+    completion = call_with_retry(lambda: openai_client.chat.completions.create(
+        model=CHATGPT_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant providing concise and neutral answers."},
+            {"role": "user", "content": question}
+        ]
+    ))
+    return completion.choices[0].message.content
 
 def get_claude_response(question: str) -> str:
     """Queries the Claude API."""
     if not anthropic_client:
-        return "Claude API key not configured or client initialization failed."
-    try:
-        message = anthropic_client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1024,
-            messages=[
-                {"role": "user", "content": question}
-            ]
-        )
-        return message.content[0].text
-    except Exception as e:
-        print(f"Error querying Claude: {e}")
-        return "Error: Could not get response from Claude."
+        raise ProviderNotConfigured("Claude API key not configured or client initialization failed.")
+    message = call_with_retry(lambda: anthropic_client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=1024,
+        messages=[
+            {"role": "user", "content": question}
+        ]
+    ))
+    return message.content[0].text
 
 def get_mistral_response(question: str) -> str:
     """Queries the Mistral API."""
     if not mistral_client:
-        return "Mistral API key not configured or client initialization failed."
-    try:
-        messages = [
-            {"role": "user", "content": question}
-        ]
-        chat_response = mistral_client.chat(
-            model="mistral-large-latest",
-            messages=messages,
-        )
-        return chat_response.choices[0].message.content
-    except Exception as e:
-        print(f"Error querying Mistral: {e}")
-        return "Error: Could not get response from Mistral."
+        raise ProviderNotConfigured("Mistral API key not configured or client initialization failed.")
+    messages = [
+        {"role": "user", "content": question}
+    ]
+    chat_response = call_with_retry(lambda: mistral_client.chat(
+        model=MISTRAL_MODEL,
+        messages=messages,
+    ))
+    return chat_response.choices[0].message.content
 
 def get_gemini_response(question: str) -> str:
     """Queries the Gemini API."""
     if not gemini_model:
-        return "Gemini API key not configured or client initialization failed."
-    try:
-        response = gemini_model.generate_content(question)
-        return response.text
-    except Exception as e:
-        print(f"Error querying Gemini: {e}")
-        return "Error: Could not get response from Gemini."
+        raise ProviderNotConfigured("Gemini API key not configured or client initialization failed.")
+    response = call_with_retry(lambda: gemini_model.generate_content(
+        question,
+        request_options={"timeout": transport.HTTP_READ_TIMEOUT}
+    ))
+    return response.text
 
 def get_grok_response(question: str) -> str:
     """Queries the Grok API using a direct REST call."""
     if not GROK_API_KEY:
-        return "Grok API key not configured."
+        raise ProviderNotConfigured("Grok API key not configured.")
 
     headers = {
         "Authorization": f"Bearer {GROK_API_KEY}",
@@ -141,39 +168,31 @@ def get_grok_response(question: str) -> str:
     }
 
     payload = {
-        "model": "grok-1",
+        "model": GROK_MODEL,
         "messages": [
             {"role": "user", "content": question}
         ],
     }
 
-    try:
-        response = requests.post(GROK_API_URL, headers=headers, json=payload)
+    def post():
+        response = transport.http_client.post(GROK_API_URL, headers=headers, json=payload)
         response.raise_for_status()  # Raise an exception for bad status codes
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        print(f"Error querying Grok: {e}")
-        return "Error: Could not get response from Grok."
-    except (KeyError, IndexError) as e:
-        print(f"Error parsing Grok response: {e}")
-        return "Error: Invalid response format from Grok."
+        return response.json()
+
+    return call_with_retry(post)["choices"][0]["message"]["content"]
 
 def get_deepseek_response(question: str) -> str:
     """Queries the Deepseek API."""
     if not deepseek_client:
-        return "Deepseek API key not configured or client initialization failed."
-    try:
-        completion = deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": question}
-            ]
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        print(f"Error querying Deepseek: {e}")
-        return f"Error: Could not get response from Deepseek."
+        raise ProviderNotConfigured("Deepseek API key not configured or client initialization failed.")
+    completion = call_with_retry(lambda: deepseek_client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": question}
+        ]
+    ))
+    return completion.choices[0].message.content
 
 
 LLM_PROVIDERS = {
@@ -184,3 +203,203 @@ LLM_PROVIDERS = {
     "grok": get_grok_response,
     "deepseek": get_deepseek_response,
 }
+
+
+
+# --- Async Provider Interface ---
+
+@dataclass
+class ProviderResult:
+    """The outcome of one provider call. Exactly one of `text` and `error` is set."""
+    text: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    latency: float = 0.0
+    model: Optional[str] = None
+    error: Optional[str] = None
+    # not_configured, rate_limited, server_error, client_error, connection,
+    # timeout, circuit_open, empty_response or error; see retry.error_kind.
+    error_kind: Optional[str] = None
+    attempts: int = 1
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def empty_response(model: Optional[str] = None, **fields) -> ProviderResult:
+    """The result of a call that succeeded but came back without any text."""
+    return ProviderResult(
+        model=model, error=f"{model or 'Provider'} returned an empty response.", error_kind="empty_response", **fields
+    )
+
+async def _timed(model: str, call: Callable[[], Awaitable[ProviderResult]]) -> ProviderResult:
+    """Runs a provider call with retries, recording its latency and turning exceptions and empty answers into errors."""
+    started = time.perf_counter()
+    try:
+        result = await call_with_retry_async(call)
+    except RetryError as e:
+        return ProviderResult(
+            model=model, error=str(e), error_kind=e.kind, attempts=e.attempts, latency=time.perf_counter() - started
+        )
+    result.latency = time.perf_counter() - started
+    if not (result.text or "").strip():
+        return empty_response(
+            result.model or model, prompt_tokens=result.prompt_tokens,
+            completion_tokens=result.completion_tokens, latency=result.latency
+        )
+    return result
+
+def _not_configured(name: str, model: str) -> ProviderResult:
+    return ProviderResult(
+        model=model, error=f"{name} API key not configured or client initialization failed.", error_kind="not_configured"
+    )
+
+async def get_chatgpt_response_async(question: str) -> ProviderResult:
+    """Queries the ChatGPT API."""
+    if not async_openai_client:
+        return _not_configured("OpenAI", CHATGPT_MODEL)
+
+    async def call():
+        completion = await async_openai_client.chat.completions.create(
+            model=CHATGPT_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant providing concise and neutral answers."},
+                {"role": "user", "content": question}
+            ]
+        )
+        return ProviderResult(
+            text=completion.choices[0].message.content if completion.choices else None,
+            prompt_tokens=completion.usage.prompt_tokens if completion.usage else None,
+            completion_tokens=completion.usage.completion_tokens if completion.usage else None,
+            model=completion.model
+        )
+    return await _timed(CHATGPT_MODEL, call)
+
+async def get_claude_response_async(question: str) -> ProviderResult:
+    """Queries the Claude API."""
+    if not async_anthropic_client:
+        return _not_configured("Claude", CLAUDE_MODEL)
+
+    async def call():
+        message = await async_anthropic_client.messages.create(
+            model=CLAUDE_MODEL,
+            max_tokens=1024,
+            messages=[
+                {"role": "user", "content": question}
+            ]
+        )
+        return ProviderResult(
+            text=message.content[0].text if message.content else None,
+            prompt_tokens=message.usage.input_tokens,
+            completion_tokens=message.usage.output_tokens,
+            model=message.model
+        )
+    return await _timed(CLAUDE_MODEL, call)
+
+async def get_mistral_response_async(question: str) -> ProviderResult:
+    """Queries the Mistral API."""
+    if not async_mistral_client:
+        return _not_configured("Mistral", MISTRAL_MODEL)
+
+    async def call():
+        chat_response = await async_mistral_client.chat(
+            model=MISTRAL_MODEL,
+            messages=[{"role": "user", "content": question}],
+        )
+        return ProviderResult(
+            text=chat_response.choices[0].message.content if chat_response.choices else None,
+            prompt_tokens=chat_response.usage.prompt_tokens,
+            completion_tokens=chat_response.usage.completion_tokens,
+            model=chat_response.model
+        )
+    return await _timed(MISTRAL_MODEL, call)
+
+def _gemini_text(response) -> Optional[str]:
+    # .text raises rather than returning nothing when a reply has no parts,
+    # e.g. when it was blocked by a safety filter.
+    try:
+        return response.text
+    except ValueError:
+        return None
+
+async def get_gemini_response_async(question: str) -> ProviderResult:
+    """Queries the Gemini API."""
+    if not gemini_model:
+        return _not_configured("Gemini", GEMINI_MODEL)
+
+    async def call():
+        response = await gemini_model.generate_content_async(
+            question,
+            request_options={"timeout": transport.HTTP_READ_TIMEOUT}
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return ProviderResult(
+            text=_gemini_text(response),
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None),
+            model=GEMINI_MODEL
+        )
+    return await _timed(GEMINI_MODEL, call)
+
+async def get_grok_response_async(question: str) -> ProviderResult:
+    """Queries the Grok API using a direct REST call."""
+    if not GROK_API_KEY:
+        return ProviderResult(model=GROK_MODEL, error="Grok API key not configured.", error_kind="not_configured")
+
+    async def call():
+        response = await transport.async_http_client.post(
+            GROK_API_URL,
+            headers={
+                "Authorization": f"Bearer {GROK_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": GROK_MODEL,
+                "messages": [
+                    {"role": "user", "content": question}
+                ],
+            }
+        )
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        choices = body.get("choices") or [{}]
+        return ProviderResult(
+            text=(choices[0].get("message") or {}).get("content"),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            model=body.get("model", GROK_MODEL)
+        )
+    return await _timed(GROK_MODEL, call)
+
+async def get_deepseek_response_async(question: str) -> ProviderResult:
+    """Queries the Deepseek API."""
+    if not async_deepseek_client:
+        return _not_configured("Deepseek", DEEPSEEK_MODEL)
+
+    async def call():
+        completion = await async_deepseek_client.chat.completions.create(
+            model=DEEPSEEK_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": question}
+            ]
+        )
+        return ProviderResult(
+            text=completion.choices[0].message.content if completion.choices else None,
+            prompt_tokens=completion.usage.prompt_tokens if completion.usage else None,
+            completion_tokens=completion.usage.completion_tokens if completion.usage else None,
+            model=completion.model
+        )
+    return await _timed(DEEPSEEK_MODEL, call)
+
+
+ASYNC_LLM_PROVIDERS: Dict[str, Callable[[str], Awaitable[ProviderResult]]] = {
+    "chatgpt": get_chatgpt_response_async,
+    "claude": get_claude_response_async,
+    "mistral": get_mistral_response_async,
+    "gemini": get_gemini_response_async,
+    "grok": get_grok_response_async,
+    "deepseek": get_deepseek_response_async,
+}
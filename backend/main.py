@@ -1,14 +1,18 @@
-from fastapi import FastAPI, Depends
+import datetime
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine
-from .scheduler import scheduler
+from . import crud, export, metrics, models, schemas, transport, vector_index
+from .analysis import embedding_from_bytes, encode_texts, is_model_ready, start_warm_up
+from .database import SessionLocal, engine, upgrade_schema
+from .scheduler import scheduler, start_table_rebuild, tables_ready
 
-models.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI()
 
@@ -19,11 +23,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "model_ready": is_model_ready()}
+
+
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus metrics for the collection pipeline."""
+    content, media_type = metrics.render()
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Reports 503 until the embedding model has loaded and the derived tables are rebuilt."""
+    model_ready = is_model_ready()
+    derived_ready = tables_ready()
+    ready = model_ready and derived_ready
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "warming_up", "model_ready": model_ready, "tables_ready": derived_ready}
 
 
 
@@ -39,18 +62,184 @@ def get_db():
 
 @app.on_event("startup")
 def startup_event():
+    start_warm_up()
+    start_table_rebuild()
+    vector_index.start_sync()
     scheduler.start()
     print("Scheduler started.")
 
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     scheduler.shutdown()
+    transport.close()
+    await transport.aclose()
     print("Scheduler shut down.")
 
 
 
+def response_filters(
+    llm_name: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    min_similarity: Optional[float] = None,
+    max_similarity: Optional[float] = None,
+) -> schemas.ResponseFilters:
+    return schemas.ResponseFilters(
+        llm_name=llm_name,
+        question=question,
+        since=since,
+        until=until,
+        min_similarity=min_similarity,
+        max_similarity=max_similarity,
+    )
+
+
 @app.get("/api/responses/", response_model=List[schemas.Response])
-def read_responses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    responses = crud.get_responses(db, skip=skip, limit=limit)
+def read_responses(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    filters: schemas.ResponseFilters = Depends(response_filters),
+    db: Session = Depends(get_db),
+):
+    """
+    Lists responses newest first. Pass the X-Next-Cursor header of a page as
+    `cursor` to fetch the next one.
+    """
+    try:
+        responses = crud.get_responses(db, skip=skip, limit=limit, cursor=cursor, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(responses) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(responses[-1])
     return responses
+
+
+@app.get("/api/responses/export")
+def export_responses(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    filters: schemas.ResponseFilters = Depends(response_filters),
+):
+    """Streams every matching response, oldest first, in the requested format."""
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed.")
+    _, media_type = export.FORMATS[format]
+    return StreamingResponse(
+        export.stream_export(format, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="responses.{format}"'},
+    )
+
+
+@app.get("/api/responses/similar", response_model=List[schemas.SimilarResponse])
+def read_similar_responses(
+    response_id: Optional[int] = None,
+    text: Optional[str] = None,
+    k: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """
+    Finds the stored responses, across all models and dates, whose meaning is
+    closest to a stored response (`response_id`) or to free `text`.
+    """
+    if (response_id is None) == (text is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of response_id or text.")
+    if response_id is not None:
+        source = db.get(models.Response, response_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Response not found.")
+        query = (
+            embedding_from_bytes(source.embedding) if source.embedding is not None
+            else encode_texts([source.response])[0]
+        )
+    else:
+        query = encode_texts([text])[0]
+
+    matches = vector_index.get_index().search(query, k=k, exclude_ids=[response_id] if response_id else [])
+    found = {row.id: row for row in crud.get_responses_by_ids(db, [match_id for match_id, _ in matches])}
+    return [
+        {"score": score, "response": found[match_id]}
+        for match_id, score in matches if match_id in found
+    ]
+
+
+@app.get("/api/drift/timeseries", response_model=List[schemas.DriftPoint])
+def read_drift_timeseries(
+    period: Literal["day", "week"] = "day",
+    llm_name: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[datetime.date] = None,
+    until: Optional[datetime.date] = None,
+    db: Session = Depends(get_db),
+):
+    """Daily or weekly similarity trends, read from precomputed rollups."""
+    return crud.get_drift_timeseries(
+        db, period=period, llm_name=llm_name, question=question, since=since, until=until
+    )
+
+
+@app.get("/api/drift/events", response_model=List[schemas.DriftEvent])
+def read_drift_events(
+    llm_name: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Lists drops in similarity found by the per-pair change detectors, newest first."""
+    return crud.get_drift_events(db, llm_name=llm_name, question=question, since=since, skip=skip, limit=limit)
+
+
+@app.get("/api/failures/", response_model=List[schemas.ProviderFailure])
+def read_failures(
+    llm_name: Optional[str] = None,
+    error_kind: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Lists provider calls that failed after retries, newest first. Skipped calls (no API key, open circuit) are not stored."""
+    return crud.get_failures(db, llm_name=llm_name, error_kind=error_kind, since=since, skip=skip, limit=limit)
+
+
+@app.get("/api/samples/", response_model=List[schemas.SampleSet])
+def read_sample_sets(
+    llm_name: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Lists per-run sample statistics newest first: how much the samples of a run
+    disagree with each other (dispersion) and how similar their centroid is to
+    the previous run's.
+    """
+    return crud.get_sample_sets(db, llm_name=llm_name, question=question, since=since, skip=skip, limit=limit)
+
+
+@app.get("/api/agreement/", response_model=List[schemas.AgreementMatrix])
+def read_agreement_matrices(
+    question: Optional[str] = None,
+    llm_name: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Lists per-run, per-question similarity matrices between the models'
+    answers newest first, with each model's mean agreement with its peers.
+    """
+    return crud.get_agreement_matrices(
+        db, question=question, llm_name=llm_name, since=since, skip=skip, limit=limit
+    )
@@ -0,0 +1,67 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+PROVIDER_LATENCY = Histogram(
+    "llm_provider_request_seconds",
+    "Latency of provider calls, including failed ones.",
+    ["provider"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+PROVIDER_ERRORS = Counter(
+    "llm_provider_errors_total",
+    "Provider calls that failed, by kind (rate_limited, server_error, timeout, circuit_open, ...).",
+    ["provider", "kind"],
+)
+PROVIDER_TOKENS = Counter(
+    "llm_provider_tokens_total",
+    "Tokens reported by providers, by direction (prompt or completion).",
+    ["provider", "direction"],
+)
+PROVIDER_TOKENS_PER_SECOND = Histogram(
+    "llm_provider_completion_tokens_per_second",
+    "Completion tokens generated per second of request latency.",
+    ["provider"],
+    buckets=(5, 10, 20, 40, 80, 160, 320),
+)
+PROVIDER_QUEUE_DEPTH = Gauge(
+    "llm_provider_queue_depth",
+    "Provider calls waiting for a concurrency slot.",
+    ["provider"],
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "llm_provider_in_flight",
+    "Provider calls currently running.",
+    ["provider"],
+)
+DRIFT_EVENTS = Counter(
+    "llm_drift_events_total",
+    "Drops in a (model, question) pair's similarity found by its change detector.",
+    ["provider"],
+)
+STAGE_SECONDS = Histogram(
+    "llm_pipeline_stage_seconds",
+    "Time spent in each post-collection stage of a run (lookup, embedding, db_write).",
+    ["stage"],
+)
+JOB_SECONDS = Histogram(
+    "llm_collection_job_seconds",
+    "Wall-clock duration of a whole collection job.",
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+
+def record_provider_result(llm_name: str, result) -> None:
+    """Records latency, errors and token throughput for one provider call."""
+    if result.error_kind != "circuit_open":  # Skipped calls never reached the provider.
+        PROVIDER_LATENCY.labels(llm_name).observe(result.latency)
+    if not result.ok:
+        PROVIDER_ERRORS.labels(llm_name, result.error_kind or "error").inc()
+        return
+    if result.prompt_tokens:
+        PROVIDER_TOKENS.labels(llm_name, "prompt").inc(result.prompt_tokens)
+    if result.completion_tokens:
+        PROVIDER_TOKENS.labels(llm_name, "completion").inc(result.completion_tokens)
+        if result.latency > 0:
+            PROVIDER_TOKENS_PER_SECOND.labels(llm_name).observe(result.completion_tokens / result.latency)
+
+def render():
+    """Returns the current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
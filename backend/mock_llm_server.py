@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+A local HTTP server imitating the OpenAI, Anthropic and Grok chat APIs.
+
+Each request waits a sampled latency and then answers, fails with a 500 or is
+rate limited with a 429, so the real provider clients can be exercised
+without the network. Used by backend/benchmark.py; it can also be run on its own:
+
+    python backend/mock_llm_server.py --port 8089 --latency 0.3 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMServer:
+    """
+    Serves mock provider endpoints on a background thread.
+
+    Routes:
+        POST /v1/chat/completions  OpenAI and Grok chat completions
+        POST /v1/messages          Anthropic messages
+        POST /v1/complete          Anthropic legacy text completions
+
+    Args:
+        latency: Median response latency in seconds.
+        latency_sigma: Spread of the log-normal latency distribution; 0 makes it constant.
+        error_rate: Fraction of requests answered with a 500.
+        rate_limit_rate: Fraction of requests answered with a 429.
+        response_words: Approximate length of each answer in words.
+        port: Port to listen on; 0 picks a free one.
+        seed: Seed for the latency, error and answer sampling.
+    """
+
+    def __init__(self, latency: float = 0.2, latency_sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, response_words: int = 150, port: int = 0, seed: int = None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.response_words = response_words
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self):
+        """Picks the outcome and latency of one request."""
+        with self._lock:
+            roll = self._random.random()
+            if self.latency_sigma > 0 and self.latency > 0:
+                delay = self._random.lognormvariate(math.log(self.latency), self.latency_sigma)
+            else:
+                delay = self.latency
+            variant = self._random.randrange(3)
+        if roll < self.rate_limit_rate:
+            outcome = 429
+        elif roll < self.rate_limit_rate + self.error_rate:
+            outcome = 500
+        else:
+            outcome = 200
+        return outcome, delay, variant
+
+    def _answer(self, prompt: str, variant: int) -> str:
+        filler = " ".join(["Considering the question carefully, the short answer depends on context."] * 16)
+        words = f"Answer variant {variant} to: {prompt}. {filler}".split()
+        return " ".join(words[:self.response_words])
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path not in ("/v1/chat/completions", "/v1/messages", "/v1/complete"):
+                    self._send(404, {"error": {"message": f"Unknown route {self.path}"}})
+                    return
+
+                outcome, delay, variant = server._sample()
+                time.sleep(delay)
+                with server._lock:
+                    server.stats[outcome] += 1
+                if outcome == 429:
+                    self._send(429, {"error": {"type": "rate_limit_error", "message": "Rate limit exceeded"}},
+                               {"Retry-After": "1"})
+                    return
+                if outcome == 500:
+                    self._send(500, {"error": {"type": "api_error", "message": "Internal server error"}})
+                    return
+
+                model = request.get("model", "mock-model")
+                if self.path == "/v1/complete":
+                    prompt = request.get("prompt", "")
+                else:
+                    messages = request.get("messages") or [{}]
+                    prompt = messages[-1].get("content", "")
+                text = server._answer(prompt, variant)
+                prompt_tokens = max(1, len(prompt) // 4)
+                completion_tokens = max(1, len(text) // 4)
+
+                if self.path == "/v1/chat/completions":
+                    self._send(200, {
+                        "id": f"chatcmpl-mock-{variant}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    })
+                elif self.path == "/v1/messages":
+                    self._send(200, {
+                        "id": f"msg_mock_{variant}",
+                        "type": "message",
+                        "role": "assistant",
+                        "model": model,
+                        "content": [{"type": "text", "text": text}],
+                        "stop_reason": "end_turn",
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+                    })
+                else:
+                    self._send(200, {
+                        "id": f"compl_mock_{variant}",
+                        "type": "completion",
+                        "model": model,
+                        "completion": text,
+                        "stop_reason": "stop_sequence",
+                        "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+                    })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Median latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with 429.")
+    parser.add_argument("--response-words", type=int, default=150)
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.latency, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                           args.response_words, args.port)
+    print(f"Mock LLM server listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
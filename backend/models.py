@@ -1,13 +1,214 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, LargeBinary, ForeignKey, Index
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.sql import func
+from . import compression
 from .database import Base
 
+# SQLite's CURRENT_TIMESTAMP has no fractional seconds. Binding datetimes in
+# the same format keeps range and cursor comparisons on the stored text exact.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
+
 class Response(Base):
     __tablename__ = "responses"
+    __table_args__ = (
+        Index("ix_responses_llm_question_timestamp", "llm_name", "question", "timestamp"),
+        Index("ix_responses_timestamp_id", "timestamp", "id"),
+        Index("ix_responses_llm_timestamp_id", "llm_name", "timestamp", "id"),
+        Index("ix_responses_question_timestamp_id", "question", "timestamp", "id"),
+        Index("ix_responses_similarity_score", "similarity_score"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(Timestamp, server_default=func.now())
     llm_name = Column(String, index=True)
     question = Column(Text)
-    response = Column(Text)
+    # Plain text is only kept for rows written before compression; newer rows
+    # point at a deduplicated, compressed blob instead. Use `response` to read.
+    response_text = Column("response", Text, nullable=True)
+    content_hash = Column(String, ForeignKey("response_blobs.content_hash"), nullable=True, index=True)
     similarity_score = Column(Float, nullable=True)
+    # Similarity to the pair's running baseline of past responses; see baseline.py.
+    baseline_similarity = Column(Float, nullable=True)
+    # SimHash of the text's word shingles, and the share of its bits matching the previous response's.
+    simhash = Column(Integer, nullable=True)
+    lexical_similarity = Column(Float, nullable=True)
+    embedding = Column(LargeBinary, nullable=True)
+    embedding_model = Column(String, nullable=True)
+    # Set when the response is one of several samples taken in the same run.
+    sample_set_id = Column(Integer, ForeignKey("sample_sets.id"), nullable=True, index=True)
+
+    blob = relationship("ResponseBlob")
+
+    @property
+    def response(self):
+        if self.content_hash is not None:
+            return self.blob.text
+        return self.response_text
+
+    @response.setter
+    def response(self, text):
+        # crud moves the text into a blob before the row is flushed.
+        self.response_text = text
+        self.content_hash = None
+
+class CompressionDictionary(Base):
+    """A zstd dictionary trained on stored responses."""
+    __tablename__ = "compression_dictionaries"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(Timestamp, server_default=func.now())
+    data = Column(LargeBinary, nullable=False)
+
+class ResponseBlob(Base):
+    """A compressed response text, stored once per distinct content."""
+    __tablename__ = "response_blobs"
+
+    content_hash = Column(String, primary_key=True)  # SHA-256 of the plain text
+    codec = Column(String, nullable=False)
+    dictionary_id = Column(Integer, ForeignKey("compression_dictionaries.id"), nullable=True)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # Length of the plain text
+
+    @property
+    def text(self) -> str:
+        if self.dictionary_id is not None and not compression.has_dictionary(self.dictionary_id):
+            dictionary = object_session(self).get(CompressionDictionary, self.dictionary_id)
+            compression.register_dictionary(dictionary.id, dictionary.data)
+        return compression.decompress(self.codec, self.data, self.dictionary_id)
+
+class LatestResponse(Base):
+    """Points at the most recent response for each (llm_name, question) pair."""
+    __tablename__ = "latest_responses"
+
+    llm_name = Column(String, primary_key=True)
+    question = Column(Text, primary_key=True)
+    response_id = Column(Integer, ForeignKey("responses.id"), nullable=False)
+
+    response = relationship("Response")
+
+class DriftRollup(Base):
+    """Similarity and length aggregates per (llm_name, question) for one day or week."""
+    __tablename__ = "drift_rollups"
+
+    period = Column(String, primary_key=True)  # "day" or "week" (weeks start on Monday)
+    llm_name = Column(String, primary_key=True)
+    question = Column(Text, primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    response_count = Column(Integer, nullable=False, default=0)
+    scored_count = Column(Integer, nullable=False, default=0)
+    similarity_sum = Column(Float, nullable=False, default=0.0)
+    similarity_min = Column(Float, nullable=True)
+    similarity_p10 = Column(Float, nullable=True)
+    response_length_sum = Column(Integer, nullable=False, default=0)
+    # Packed float32 scores seen in the period, kept so p10 stays exact as rows arrive.
+    similarity_values = Column(LargeBinary, nullable=False, default=b"")
+
+class ProviderFailure(Base):
+    """A provider call that produced no response, kept apart from real responses."""
+    __tablename__ = "provider_failures"
+    __table_args__ = (
+        Index("ix_provider_failures_llm_timestamp", "llm_name", "timestamp"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Timestamp, server_default=func.now(), index=True)
+    llm_name = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    error_kind = Column(String, nullable=False)  # See retry.error_kind
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=1)
+    latency = Column(Float, nullable=True)
+
+class SamplingState(Base):
+    """The adaptive sampling interval and next due time of one (llm_name, question) pair."""
+    __tablename__ = "sampling_states"
+
+    llm_name = Column(String, primary_key=True)
+    question = Column(Text, primary_key=True)
+    interval_seconds = Column(Float, nullable=False)
+    next_due = Column(Timestamp, nullable=False, index=True)
+    last_sampled_at = Column(Timestamp, nullable=True)
+    last_similarity = Column(Float, nullable=True)
+    model_version = Column(String, nullable=True)  # As reported by the provider, e.g. gpt-3.5-turbo-0125
+
+class DriftBaseline(Base):
+    """Running mean of the embeddings of one (llm_name, question) pair's responses."""
+    __tablename__ = "drift_baselines"
+
+    llm_name = Column(String, primary_key=True)
+    question = Column(Text, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)  # Responses folded in so far
+    mean = Column(LargeBinary, nullable=True)  # Weighted mean embedding, float32, not renormalised
+    embedding_model = Column(String, nullable=True)
+    # Weighted mean and variance of responses' similarity to the baseline.
+    similarity_mean = Column(Float, nullable=True)
+    similarity_variance = Column(Float, nullable=True)
+
+class DetectorState(Base):
+    """Page-Hinkley change detector state for one (llm_name, question) pair's similarity series; see changepoint.py."""
+    __tablename__ = "detector_states"
+
+    llm_name = Column(String, primary_key=True)
+    question = Column(Text, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)  # Similarities seen since the last restart
+    mean = Column(Float, nullable=False, default=0.0)
+    sum_squares = Column(Float, nullable=True, default=0.0)  # Welford's sum of squared deviations
+    scale = Column(Float, nullable=True)  # Standard deviation the statistic is measured in
+    cumulative = Column(Float, nullable=False, default=0.0)
+    peak = Column(Float, nullable=False, default=0.0)  # Highest `cumulative` since the last restart
+    peak_mean = Column(Float, nullable=True)  # Running mean when `peak` was reached
+    since_peak_sum = Column(Float, nullable=False, default=0.0)
+    since_peak_count = Column(Integer, nullable=False, default=0)
+
+class DriftEvent(Base):
+    """A drop in one (llm_name, question) pair's similarity found by its change detector."""
+    __tablename__ = "drift_events"
+    __table_args__ = (
+        Index("ix_drift_events_llm_question_id", "llm_name", "question", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Timestamp, server_default=func.now(), index=True)
+    llm_name = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    response_id = Column(Integer, ForeignKey("responses.id"), nullable=True)  # The response that triggered it
+    magnitude = Column(Float, nullable=False)  # Drop in mean similarity since the change began
+    statistic = Column(Float, nullable=False)  # Page-Hinkley value at detection, in standard deviations
+
+class SampleSet(Base):
+    """Statistics over the answers sampled from one (llm_name, question) pair in one run."""
+    __tablename__ = "sample_sets"
+    __table_args__ = (
+        Index("ix_sample_sets_llm_question_id", "llm_name", "question", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Timestamp, server_default=func.now(), index=True)
+    llm_name = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    # One minus the mean pairwise cosine similarity of the samples; NULL for a single sample.
+    dispersion = Column(Float, nullable=True)
+    # Cosine similarity of this run's centroid to the previous run's; NULL on the first run.
+    centroid_similarity = Column(Float, nullable=True)
+    centroid = Column(LargeBinary, nullable=False)  # Unit-length, float16
+
+class AgreementMatrix(Base):
+    """How similar every model's answer to one question was to every other model's, in one run."""
+    __tablename__ = "agreement_matrices"
+    __table_args__ = (
+        Index("ix_agreement_matrices_question_id", "question", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Timestamp, server_default=func.now(), index=True)
+    question = Column(Text, nullable=False)
+    llm_names = Column(Text, nullable=False)  # JSON list giving the matrix's row and column order
+    # Upper triangle of the cosine similarity matrix, row by row, as float16.
+    matrix = Column(LargeBinary, nullable=False)
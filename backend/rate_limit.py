@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """A thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` tokens from the bucket, going into debt if needed.
+
+        Returns:
+            The number of seconds the caller must wait before the reservation is covered.
+        """
+        # Never ask for more than a full bucket, or the call could never proceed.
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Charges (positive) or refunds (negative) tokens after the fact."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """
+    Per-provider request and token budgets.
+
+    Budgets are read from the `requests_per_minute` and `tokens_per_minute`
+    keys of each entry in `Config.LLM_CONFIGS`. Entries without a budget are
+    not limited.
+    """
+
+    def __init__(self, llm_configs: Dict[str, Dict]):
+        self.request_buckets = {}
+        self.token_buckets = {}
+        for model_name, model_config in llm_configs.items():
+            if model_config.get('requests_per_minute'):
+                self.request_buckets[model_name] = TokenBucket(model_config['requests_per_minute'])
+            if model_config.get('tokens_per_minute'):
+                self.token_buckets[model_name] = TokenBucket(model_config['tokens_per_minute'])
+
+    def acquire(self, model_name: str, estimated_tokens: int = 0) -> float:
+        """
+        Blocks until `model_name` has budget for one request of `estimated_tokens`.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        delay = 0.0
+        if model_name in self.request_buckets:
+            delay = max(delay, self.request_buckets[model_name].reserve(1))
+        if estimated_tokens and model_name in self.token_buckets:
+            delay = max(delay, self.token_buckets[model_name].reserve(estimated_tokens))
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def record_usage(self, model_name: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Reconciles the token budget once the real usage of a request is known."""
+        if actual_tokens is None or model_name not in self.token_buckets:
+            return
+        self.token_buckets[model_name].adjust(actual_tokens - estimated_tokens)
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough upper bound on the tokens a request can use (about 4 characters per token)."""
+    return len(prompt) // 4 + 1 + max_tokens
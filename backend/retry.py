@@ -0,0 +1,142 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Attempts per provider call, including the first one.
+RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("RETRY_MAX_ATTEMPTS", "3")))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+
+# Consecutive failed calls after which a provider is skipped for the rest of a run.
+CIRCUIT_BREAKER_THRESHOLD = max(1, int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "3")))
+
+# Exception classes, matched by name so the SDKs needn't be imported here,
+# that mean the request never got a usable answer and is worth retrying.
+TRANSIENT_ERROR_NAMES = {
+    "TransportError",  # httpx: connect, read and timeout errors
+    "APIConnectionError",  # openai / anthropic, including APITimeoutError
+    "ServiceUnavailable",  # google.api_core
+    "DeadlineExceeded",  # google.api_core
+}
+
+
+class ProviderNotConfigured(RuntimeError):
+    """Raised by a provider whose API key or client is missing. Never retried."""
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """Extracts the HTTP status from the error types raised by the provider SDKs."""
+    for attribute in ("status_code", "http_status", "code"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed call is worth retrying: rate limits, 5xx and connection errors."""
+    status = status_code(exc)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+def error_kind(exc: BaseException) -> str:
+    """Classifies a failure for the failures table and metrics."""
+    if isinstance(exc, ProviderNotConfigured):
+        return "not_configured"
+    status = status_code(exc)
+    if status == 429:
+        return "rate_limited"
+    if status is not None:
+        return "server_error" if status >= 500 else "client_error"
+    if is_retryable(exc):
+        return "connection"
+    return "error"
+
+
+def backoff_delay(attempt: int, exc: BaseException = None) -> float:
+    """
+    Returns how long to wait before retry number `attempt` (starting at 1).
+
+    Uses full jitter, a random delay up to an exponentially growing cap, so
+    concurrent callers that failed together don't retry in lockstep. A
+    Retry-After header on a 429 is honoured as a lower bound.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(delay, min(RETRY_MAX_DELAY, float(retry_after))) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+class RetryError(Exception):
+    """The last error of a call that failed on every attempt, with the attempt count."""
+
+    def __init__(self, cause: BaseException, attempts: int):
+        super().__init__(f"{type(cause).__name__}: {cause}")
+        self.cause = cause
+        self.attempts = attempts
+        self.kind = error_kind(cause)
+
+
+def call_with_retry(func: Callable[[], T], max_attempts: int = None) -> T:
+    """Calls `func`, retrying transient failures with jittered exponential backoff."""
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                raise RetryError(e, attempt) from e
+            time.sleep(backoff_delay(attempt, e))
+
+
+async def call_with_retry_async(func: Callable[[], Awaitable[T]], max_attempts: int = None) -> T:
+    """Awaits `func()`, retrying transient failures with jittered exponential backoff."""
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                raise RetryError(e, attempt) from e
+            await asyncio.sleep(backoff_delay(attempt, e))
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures per provider during one run.
+
+    Once a provider has failed `threshold` calls in a row its circuit opens and
+    the rest of its calls in the run are skipped rather than each waiting out
+    retries and timeouts. A new breaker is created for every run, so the
+    provider is tried again next time.
+    """
+
+    def __init__(self, threshold: int = None):
+        self.threshold = threshold or CIRCUIT_BREAKER_THRESHOLD
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def is_open(self, provider: str) -> bool:
+        with self._lock:
+            return self._failures.get(provider, 0) >= self.threshold
+
+    def record(self, provider: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._failures[provider] = 0
+            else:
+                self._failures[provider] = self._failures.get(provider, 0) + 1
@@ -26,7 +26,10 @@ def run_collection():
     try:
         logger.info("Starting LLM response collection...")
         collector = LLMCollector()
-        collector.collect_responses()
+        try:
+            collector.collect_responses()
+        finally:
+            collector.close()
         logger.info("LLM response collection completed successfully.")
         return True
     except Exception as e:
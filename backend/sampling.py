@@ -0,0 +1,162 @@
+import datetime
+import math
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .collection import Task, build_tasks
+
+# When on, each (model, question) pair is sampled on its own adaptive interval
+# and the scheduler ticks every SAMPLING_TICK_MINUTES to query the pairs that
+# are due. When off, every pair is queried on every 6-hourly run.
+ADAPTIVE_SAMPLING = os.getenv("ADAPTIVE_SAMPLING", "1").lower() not in ("0", "false", "no")
+SAMPLING_TICK_MINUTES = float(os.getenv("SAMPLING_TICK_MINUTES", "60"))
+
+MIN_INTERVAL_SECONDS = float(os.getenv("SAMPLING_MIN_INTERVAL_HOURS", "6")) * 3600
+MAX_INTERVAL_SECONDS = float(os.getenv("SAMPLING_MAX_INTERVAL_HOURS", "168")) * 3600
+# Factor the interval grows by after each stable sample.
+SAMPLING_BACKOFF = float(os.getenv("SAMPLING_BACKOFF", "2"))
+# Similarity at or above which a pair counts as stable, and below which it counts as drifting.
+STABLE_SIMILARITY = float(os.getenv("SAMPLING_STABLE_SIMILARITY", "0.95"))
+DRIFT_SIMILARITY = float(os.getenv("SAMPLING_DRIFT_SIMILARITY", "0.85"))
+
+# Provider calls allowed per rolling 24 hours across all pairs; 0 means unlimited.
+DAILY_CALL_BUDGET = int(os.getenv("DAILY_CALL_BUDGET", "0"))
+
+# Failures that never reached the provider and so cost nothing against the budget.
+FREE_FAILURE_KINDS = ("not_configured", "circuit_open")
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def next_interval(interval: float, similarity: Optional[float], version_changed: bool) -> float:
+    """
+    Returns a pair's next sampling interval in seconds.
+
+    The interval drops straight to the minimum when the model version changes
+    or similarity falls below DRIFT_SIMILARITY, grows by SAMPLING_BACKOFF (up
+    to the maximum) while similarity stays at or above STABLE_SIMILARITY, and
+    is kept as is in between.
+    """
+    if version_changed or (similarity is not None and similarity < DRIFT_SIMILARITY):
+        return MIN_INTERVAL_SECONDS
+    if similarity is not None and similarity >= STABLE_SIMILARITY:
+        return min(MAX_INTERVAL_SECONDS, interval * SAMPLING_BACKOFF)
+    return max(MIN_INTERVAL_SECONDS, min(MAX_INTERVAL_SECONDS, interval))
+
+
+def calls_since(db: Session, since: datetime.datetime) -> int:
+    """Counts provider calls made since a point in time, successful or not."""
+    responses = db.query(models.Response).filter(models.Response.timestamp >= since).count()
+    failures = db.query(models.ProviderFailure).filter(
+        models.ProviderFailure.timestamp >= since,
+        models.ProviderFailure.error_kind.notin_(FREE_FAILURE_KINDS)
+    ).count()
+    return responses + failures
+
+
+def call_allowance(db: Session, now: datetime.datetime) -> Optional[int]:
+    """
+    Returns how many calls this tick may make, or None when there is no budget.
+
+    Calls are paced evenly over the day, so a burst of due pairs can't spend
+    the whole budget in one tick, and capped by what is left of the budget
+    over the last 24 hours.
+    """
+    if not DAILY_CALL_BUDGET:
+        return None
+    remaining = DAILY_CALL_BUDGET - calls_since(db, now - datetime.timedelta(days=1))
+    per_tick = math.ceil(DAILY_CALL_BUDGET * SAMPLING_TICK_MINUTES / (24 * 60))
+    return max(0, min(remaining, per_tick))
+
+
+def select_due_tasks(db: Session, questions: List[str], providers: Dict[str, Callable],
+                     now: Optional[datetime.datetime] = None, calls_per_pair: int = 1) -> List[Task]:
+    """
+    Picks the (question, llm_name) pairs to query this tick.
+
+    Pairs never sampled before are always due. Otherwise a pair is due once
+    its next_due time has passed. When the budget can't cover every due pair,
+    the ones furthest overdue relative to their own interval go first; each
+    pair costs `calls_per_pair` calls.
+    """
+    now = now or _utcnow()
+    states = {(state.llm_name, state.question): state for state in db.query(models.SamplingState)}
+
+    due: List[Tuple[float, Task]] = []
+    for question, llm_name in build_tasks(questions, providers):
+        state = states.get((llm_name, question))
+        if state is None:
+            lateness = math.inf
+        elif state.next_due <= now:
+            lateness = (now - state.next_due).total_seconds() / state.interval_seconds
+        else:
+            continue
+        due.append((lateness, (question, llm_name)))
+
+    allowance = call_allowance(db, now)
+    if allowance is not None:
+        allowance //= calls_per_pair
+    if allowance is not None and allowance < len(due):
+        chosen = {task for _, task in sorted(due, key=lambda item: -item[0])[:allowance]}
+        # Keep the usual question-by-provider order for the tasks that made the cut.
+        return [task for _, task in due if task in chosen]
+    return [task for _, task in due]
+
+
+def record_results(db: Session, results: list, similarities: Dict[Tuple[str, str], Optional[float]],
+                   now: Optional[datetime.datetime] = None):
+    """
+    Reschedules every pair queried in a run.
+
+    Args:
+        db: The database session.
+        results: (question, llm_name, ProviderResult) tuples from the run, possibly several per pair.
+        similarities: Similarity by (llm_name, question) for the pairs that succeeded.
+        now: The time the run finished; defaults to now, UTC.
+    """
+    if not results:
+        return
+    now = now or _utcnow()
+    # A pair sampled several times counts once, as a success if any sample succeeded.
+    outcomes = {}
+    for question, llm_name, result in results:
+        outcome = outcomes.get((llm_name, question))
+        if outcome is None or (result.ok and not outcome.ok):
+            outcomes[(llm_name, question)] = result
+
+    states = {
+        (state.llm_name, state.question): state
+        for state in db.query(models.SamplingState).filter(
+            models.SamplingState.llm_name.in_({llm_name for llm_name, _ in outcomes}),
+            models.SamplingState.question.in_({question for _, question in outcomes})
+        )
+    }
+    for (llm_name, question), result in outcomes.items():
+        state = states.get((llm_name, question))
+        if state is None:
+            state = states[(llm_name, question)] = models.SamplingState(
+                llm_name=llm_name, question=question, interval_seconds=MIN_INTERVAL_SECONDS
+            )
+            db.add(state)
+        elif result.ok:
+            version_changed = bool(
+                result.model and state.model_version and result.model != state.model_version
+            )
+            state.interval_seconds = next_interval(
+                state.interval_seconds, similarities.get((llm_name, question)), version_changed
+            )
+
+        if not result.ok:
+            # Try a failed pair again after the minimum interval rather than on every tick.
+            state.next_due = now + datetime.timedelta(seconds=min(state.interval_seconds, MIN_INTERVAL_SECONDS))
+            continue
+        state.next_due = now + datetime.timedelta(seconds=state.interval_seconds)
+        state.last_sampled_at = now
+        state.last_similarity = similarities.get((llm_name, question))
+        state.model_version = result.model or state.model_version
+    db.commit()
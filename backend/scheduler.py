@@ -1,10 +1,79 @@
+import asyncio
+import os
+import threading
 import yaml
-from apscheduler.schedulers.background import BackgroundScheduler
+import numpy as np
+from sqlalchemy import inspect
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from .database import SessionLocal
+from . import baseline
+from . import changepoint
+from . import compression
 from . import crud
 from . import llm_client
+from . import metrics
 from . import models
-from .analysis import calculate_similarity
+from . import sampling
+from . import vector_index
+from .collection import build_tasks, fan_out, fan_out_async
+from .lexical import lexical_similarity, simhash
+from .tracing import RunTrace
+from .analysis import (
+    EMBEDDING_MODEL_NAME,
+    agreement_matrices,
+    embedding_from_bytes,
+    embedding_to_bytes,
+    encode_texts,
+    sample_statistics,
+)
+
+# Rows committed per transaction when storing a run; unset writes the whole run at once.
+# Baseline updates and detector state go in with the chunk holding their
+# response; sample sets and agreement matrices with the chunk completing them.
+DB_WRITE_CHUNK_SIZE = int(os.getenv("DB_WRITE_CHUNK_SIZE", "0")) or None
+
+# Answers collected per (model, question) pair per run. Above 1, each run also
+# stores the samples' dispersion and their centroid's similarity to the last run's.
+SAMPLES_PER_RUN = max(1, int(os.getenv("SAMPLES_PER_RUN", "1")))
+
+# Set once the latest-response index and drift rollups account for every
+# stored response. Rebuilding them scans the whole responses table, so it runs
+# off the startup path and runs hold off writing until it's done.
+_tables_lock = threading.Lock()
+_tables_ready = threading.Event()
+
+def tables_ready() -> bool:
+    """Whether the latest-response index and drift rollups are up to date."""
+    return _tables_ready.is_set()
+
+def ensure_tables():
+    """Rebuilds the latest-response index and drift rollups if they are behind the responses table."""
+    with _tables_lock:
+        if _tables_ready.is_set():
+            return
+        db = SessionLocal()
+        try:
+            if crud.latest_responses_missing(db):
+                crud.rebuild_latest_responses(db)
+                print("Rebuilt latest response index.")
+            if crud.drift_rollups_missing(db):
+                crud.rebuild_drift_rollups(db)
+                print("Rebuilt drift rollups.")
+        finally:
+            db.close()
+        _tables_ready.set()
+
+def start_table_rebuild() -> threading.Thread:
+    """Runs `ensure_tables` on a background thread so startup doesn't wait for it."""
+    def rebuild():
+        try:
+            ensure_tables()
+        except Exception as e:
+            print(f"Error rebuilding latest responses and drift rollups: {e}")
+
+    thread = threading.Thread(target=rebuild, name="table-rebuild", daemon=True)
+    thread.start()
+    return thread
 
 def load_questions() -> list:
     """Loads questions from the questions.yaml file."""
@@ -16,49 +85,436 @@ def load_questions() -> list:
         print("Warning: questions.yaml not found. Using a default question.")
         return ["How did the war in Ukraine and Russia start?"]
 
-def fetch_and_store_responses():
-    """Fetches responses from all LLMs for all questions and stores them."""
+def has_current_embedding(response: models.Response) -> bool:
+    """Whether a stored response carries an embedding from the current model."""
+    return response.embedding is not None and response.embedding_model == EMBEDDING_MODEL_NAME
+
+EMPTY_CONTENT_HASH = compression.content_hash("")
+
+def has_text(response: models.Response) -> bool:
+    """Whether a stored response has non-empty text, judged without decompressing it."""
+    if response.content_hash is not None:
+        return response.content_hash != EMPTY_CONTENT_HASH
+    return bool(response.response_text)
+
+def is_unchanged(text: str, last: models.Response) -> bool:
+    """Whether a new text is identical to the previous response, compared by content hash where one is stored."""
+    if last is None or not text:
+        return False
+    if last.content_hash is not None:
+        return compression.content_hash(text) == last.content_hash
+    return text == last.response_text
+
+def embed_and_score(collected: list, trace: RunTrace = None) -> list:
+    """
+    Embeds a run's new responses and scores each against its predecessor.
+
+    A text identical to the previous response scores 1.0 and reuses its
+    stored embedding without running the model. The remaining distinct
+    texts, plus any previous response without a usable stored embedding, are
+    encoded in one batch. Previous responses that had to be encoded get
+    their embedding stored so they are never encoded again.
+
+    Args:
+        collected: (question, llm_name, response_text, last_response) tuples.
+        trace: Optional run trace to record the embedding and similarity stages in.
+
+    Returns:
+        One (embedding, similarity_score) tuple per collected item.
+    """
+    if not collected:
+        return []
+    trace = trace or RunTrace("scores", enabled=False)
+
+    unchanged = [is_unchanged(text, last) for _, _, text, last in collected]
+    reused = [same and has_current_embedding(last) for same, (_, _, _, last) in zip(unchanged, collected)]
+    stale = list({
+        id(last): last for (_, _, _, last), same in zip(collected, unchanged)
+        if last is not None and not same and not has_current_embedding(last)
+    }.values())
+    texts = list(dict.fromkeys(
+        [text for (_, _, text, _), reuse in zip(collected, reused) if not reuse]
+        + [last.response for last in stale]
+    ))
+    encoded = {}
+    with trace.span("embedding", count=len(texts), reused=sum(reused)):
+        if texts:
+            encoded = dict(zip(texts, encode_texts(texts)))
+
+    for last in stale:
+        last.embedding = embedding_to_bytes(encoded[last.response])
+        last.embedding_model = EMBEDDING_MODEL_NAME
+
+    scored = []
+    for (question, llm_name, text, last), same, reuse in zip(collected, unchanged, reused):
+        similarity_score = None
+        with trace.span("similarity", question, llm_name):
+            if reuse:
+                embedding = embedding_from_bytes(last.embedding)
+            else:
+                embedding = encoded[text]
+            if same:
+                similarity_score = 1.0
+                if not reuse:
+                    # The previous response has the same text, so it gets the same embedding.
+                    last.embedding = embedding_to_bytes(embedding)
+                    last.embedding_model = EMBEDDING_MODEL_NAME
+            elif last is not None:
+                if text and has_text(last):
+                    score = np.dot(embedding_from_bytes(last.embedding), embedding)
+                    similarity_score = float(np.clip(score, -1.0, 1.0))
+                else:
+                    similarity_score = 0.0
+        scored.append((embedding, similarity_score))
+    return scored
+
+def lexical_scores(collected: list) -> list:
+    """
+    Fingerprints a run's new responses and compares each with its predecessor's fingerprint.
+
+    Previous responses stored without a fingerprint get one.
+
+    Args:
+        collected: (question, llm_name, response_text, last_response) tuples.
+
+    Returns:
+        One (simhash, lexical_similarity) tuple per collected item; the
+        similarity is None when there is no previous response.
+    """
+    scores = []
+    for _, _, text, last in collected:
+        fingerprint = simhash(text)
+        similarity = None
+        if last is not None:
+            if last.simhash is None:
+                last.simhash = simhash(last.response)
+            similarity = lexical_similarity(fingerprint, last.simhash)
+        scores.append((fingerprint, similarity))
+    return scores
+
+def summarize_samples(db, collected: list, scored: list, latest: dict) -> dict:
+    """
+    Computes the sample statistics of every pair collected in a run.
+
+    The previous centroid is the pair's last sample set, or its last single
+    response for pairs that have never been sampled more than once.
+
+    Args:
+        db: The database session.
+        collected: (question, llm_name, response_text, last_response) tuples.
+        scored: The (embedding, similarity_score) tuples from `embed_and_score`.
+        latest: The last stored response by (llm_name, question).
+
+    Returns:
+        Sample set dicts, ready for `crud.create_sample_sets`, by (llm_name, question).
+    """
+    groups = {}
+    for position, (question, llm_name, _, _) in enumerate(collected):
+        groups.setdefault((llm_name, question), []).append(position)
+    if not groups:
+        return {}
+
+    previous_sets = crud.get_latest_sample_sets(db, groups)
+    dim = len(scored[0][0])
+    previous = np.full((len(groups), dim), np.nan, dtype=np.float32)
+    for row, pair in enumerate(groups):
+        if pair in previous_sets:
+            previous[row] = embedding_from_bytes(previous_sets[pair].centroid)
+        elif pair in latest and has_current_embedding(latest[pair]):
+            previous[row] = embedding_from_bytes(latest[pair].embedding)
+
+    embeddings = np.stack([scored[position][0] for positions in groups.values() for position in positions])
+    centroids, dispersion, centroid_similarity = sample_statistics(
+        embeddings, [len(positions) for positions in groups.values()], previous
+    )
+    return {
+        pair: {
+            "llm_name": pair[0],
+            "question": pair[1],
+            "sample_count": len(positions),
+            "dispersion": None if np.isnan(dispersion[row]) else float(dispersion[row]),
+            "centroid_similarity": None if np.isnan(centroid_similarity[row]) else float(centroid_similarity[row]),
+            "centroid": embedding_to_bytes(centroids[row]),
+        }
+        for row, (pair, positions) in enumerate(groups.items())
+    }
+
+def summarize_agreement(collected: list, scored: list) -> list:
+    """
+    Compares every model's answer to each question with every other model's.
+
+    Models appear in the order they were queried. A model sampled several
+    times is represented by the centroid of its samples. Questions answered
+    by fewer than two models get no matrix.
+
+    Args:
+        collected: (question, llm_name, response_text, last_response) tuples.
+        scored: The (embedding, similarity_score) tuples from `embed_and_score`.
+
+    Returns:
+        Dicts with the question, ordered `llm_names` and `matrix`, ready for `crud.create_agreement_matrices`.
+    """
+    questions = list(dict.fromkeys(question for question, _, _, _ in collected))
+    llm_names = list(dict.fromkeys(llm_name for _, llm_name, _, _ in collected))
+    if len(llm_names) < 2:
+        return []
+    question_rows = {question: row for row, question in enumerate(questions)}
+    model_columns = {llm_name: column for column, llm_name in enumerate(llm_names)}
+
+    matrices = agreement_matrices(
+        np.stack([embedding for embedding, _ in scored]),
+        [question_rows[question] for question, _, _, _ in collected],
+        [model_columns[llm_name] for _, llm_name, _, _ in collected],
+        len(questions), len(llm_names),
+    )
+    summaries = []
+    for question, matrix in zip(questions, matrices):
+        answered = ~np.isnan(matrix.diagonal())
+        if answered.sum() < 2:
+            continue
+        summaries.append({
+            "question": question,
+            "llm_names": [llm_name for llm_name, present in zip(llm_names, answered) if present],
+            "matrix": matrix[np.ix_(answered, answered)],
+        })
+    return summaries
+
+def trace_provider_calls(trace: RunTrace, results: list):
+    """Records one provider_call span per (question, provider) result."""
+    for question, llm_name, result in results:
+        trace.add_span("provider_call", result.latency or 0.0, question, llm_name,
+                       ok=result.ok, timed_out=result.timed_out)
+
+def store_results(results: list, trace: RunTrace = None):
+    """Scores a run's successful provider results against their previous responses and stores them; failures are recorded separately."""
+    trace = trace or RunTrace("store", enabled=False)
+    db = SessionLocal()
+    try:
+        # Results come back in task order, so rows are written deterministically.
+        collected = []
+        failures = []
+        skipped = {}
+        for question, llm_name, result in results:
+            if not result.ok and result.error_kind in sampling.FREE_FAILURE_KINDS:
+                # Calls that never reached the provider are logged once per provider, not stored per question.
+                skipped.setdefault((llm_name, result.error), []).append(question)
+                continue
+            if not result.ok:
+                print(f"  {llm_name} failed for '{question}': {result.error}")
+                failures.append({
+                    "llm_name": llm_name,
+                    "question": question,
+                    "error_kind": result.error_kind or "error",
+                    "error": result.error,
+                    "attempts": result.attempts,
+                    "latency": result.latency,
+                })
+                continue
+            collected.append((question, llm_name, result.text))
+        for (llm_name, error), questions in skipped.items():
+            print(f"  {llm_name} skipped for {len(questions)} questions: {error}")
+        # Failures are kept out of the responses table so they never count as drift.
+        crud.create_failures(db, failures)
+
+        # Find the last response for every pair in one read to calculate similarity
+        with metrics.STAGE_SECONDS.labels("lookup").time(), trace.span("lookup", count=len(collected)):
+            latest = crud.get_latest_responses(db, [(llm_name, question) for question, llm_name, _ in collected])
+        collected = [
+            (question, llm_name, response_text, latest.get((llm_name, question)))
+            for question, llm_name, response_text in collected
+        ]
+
+        print(f"Embedding and scoring {len(collected)} responses...")
+        with metrics.STAGE_SECONDS.labels("embedding").time():
+            scored = embed_and_score(collected, trace)
+        with trace.span("lexical", count=len(collected)):
+            lexical = lexical_scores(collected)
+
+        sample_summaries = {}
+        if SAMPLES_PER_RUN > 1 and collected:
+            with trace.span("sample_stats", count=len(collected)):
+                sample_summaries = summarize_samples(db, collected, scored, latest)
+
+        agreement = []
+        if collected:
+            with trace.span("agreement", count=len(collected)):
+                agreement = summarize_agreement(collected, scored)
+
+        # Where each pair's and each question's rows fall in the run, so records
+        # that span several rows are written with the chunk holding the last one.
+        pair_positions = {}
+        last_of_question = {}
+        for position, (question, llm_name, _, _) in enumerate(collected):
+            pair_positions.setdefault((llm_name, question), []).append(position)
+            last_of_question[question] = position
+
+        rows = [
+            {
+                "llm_name": llm_name,
+                "question": question,
+                "response": response_text,
+                "similarity_score": similarity_score,
+                "simhash": fingerprint,
+                "lexical_similarity": lexical_score,
+                "embedding": embedding_to_bytes(embedding),
+                "embedding_model": EMBEDDING_MODEL_NAME,
+            }
+            for (question, llm_name, response_text, _), (embedding, similarity_score),
+                (fingerprint, lexical_score) in zip(collected, scored, lexical)
+        ]
+        # Previous responses may have been embedded in this run; the index skips any it already holds.
+        previous = [(last.id, last.embedding) for last in latest.values() if has_current_embedding(last)]
+        written = []
+        events = []
+
+        def write_derived(chunk_rows, chunk_responses):
+            # Baselines, sample sets, agreement matrices and detector state are
+            # written in the same transaction as the responses they describe, so
+            # a chunk that fails leaves none of them behind.
+            positions = range(len(written), len(written) + len(chunk_responses))
+            written.extend(chunk_responses)
+
+            with trace.span("baseline", count=len(chunk_rows)):
+                baseline_similarities = baseline.score_against_baselines(
+                    db, [(collected[position][1], collected[position][0], scored[position][0])
+                         for position in positions],
+                    EMBEDDING_MODEL_NAME
+                )
+                for db_response, baseline_similarity in zip(chunk_responses, baseline_similarities):
+                    db_response.baseline_similarity = baseline_similarity
+
+            completed_pairs = []
+            completed_questions = set()
+            for position in positions:
+                question, llm_name = collected[position][:2]
+                if pair_positions[(llm_name, question)][-1] == position:
+                    completed_pairs.append((llm_name, question))
+                if last_of_question[question] == position:
+                    completed_questions.add(question)
+            if sample_summaries and completed_pairs:
+                sample_sets = crud.create_sample_sets(db, [sample_summaries[pair] for pair in completed_pairs])
+                for pair, sample_set in zip(completed_pairs, sample_sets):
+                    # Samples in earlier chunks are already stored and are linked now.
+                    for position in pair_positions[pair]:
+                        written[position].sample_set_id = sample_set.id
+            crud.create_agreement_matrices(
+                db, [matrix for matrix in agreement if matrix["question"] in completed_questions]
+            )
+
+            with trace.span("change_detection", count=len(chunk_rows)):
+                events.extend(changepoint.detect_changes(db, [
+                    (row["llm_name"], row["question"], row["similarity_score"], db_response.id)
+                    for row, db_response in zip(chunk_rows, chunk_responses)
+                ]))
+
+        with metrics.STAGE_SECONDS.labels("db_write").time(), trace.span("db_write", count=len(rows)):
+            db_responses = crud.create_responses(
+                db, rows, chunk_size=DB_WRITE_CHUNK_SIZE, on_chunk=write_derived
+            )
+        print(f"Stored {len(collected)} responses.")
+
+        if db_responses:
+            with trace.span("vector_index", count=len(db_responses)):
+                try:
+                    # The identity key is still known after commit, so this doesn't reload each row.
+                    vector_index.get_index().add(
+                        [inspect(db_response).identity[0] for db_response in db_responses]
+                        + [response_id for response_id, _ in previous],
+                        np.stack([embedding for embedding, _ in scored]
+                                 + [embedding_from_bytes(embedding) for _, embedding in previous])
+                    )
+                except Exception as e:
+                    print(f"Error updating vector index: {e}")
+
+        for event in events:
+            metrics.DRIFT_EVENTS.labels(event["llm_name"]).inc()
+            print(f"  Drift detected for {event['llm_name']} on '{event['question']}': "
+                  f"similarity down {event['magnitude']:.3f}")
+
+        # A sampled pair is judged by its centroid rather than by its last sample.
+        similarities = {(row["llm_name"], row["question"]): row["similarity_score"] for row in rows}
+        for pair, summary in sample_summaries.items():
+            if summary["centroid_similarity"] is not None:
+                similarities[pair] = summary["centroid_similarity"]
+        sampling.record_results(db, results, similarities)
+    finally:
+        db.close()
+
+def plan_tasks(questions: list, providers: dict) -> list:
+    """Returns the (question, llm_name) tasks to query this run: the due ones under adaptive sampling, else all."""
+    if not sampling.ADAPTIVE_SAMPLING:
+        return build_tasks(questions, providers, SAMPLES_PER_RUN)
     db = SessionLocal()
+    try:
+        due = sampling.select_due_tasks(db, questions, providers, calls_per_pair=SAMPLES_PER_RUN)
+    finally:
+        db.close()
+    return [task for task in due for _ in range(SAMPLES_PER_RUN)]
+
+def fetch_and_store_responses():
+    """Fetches responses from all LLMs for all questions on worker threads and stores them."""
+    ensure_tables()
     questions = load_questions()
     if not questions:
         print("No questions to process.")
         return
 
-    try:
-        print("--- Starting scheduled LLM query job ---")
-        for question in questions:
-            print(f"Processing question: {question}")
-            for llm_name, query_func in llm_client.LLM_PROVIDERS.items():
-                print(f"  Querying {llm_name}...")
-                response_text = query_func(question)
-
-                # Find the last response to calculate similarity
-                last_response = db.query(models.Response).filter(
-                    models.Response.llm_name == llm_name,
-                    models.Response.question == question
-                ).order_by(models.Response.timestamp.desc()).first()
-
-                similarity_score = None
-                if last_response:
-                    print(f"  Calculating similarity with previous response...")
-                    similarity_score = calculate_similarity(last_response.response, response_text)
-                    print(f"  Similarity score: {similarity_score}")
-
-                crud.create_response(
-                    db=db, 
-                    llm_name=llm_name, 
-                    question=question, 
-                    response=response_text,
-                    similarity_score=similarity_score
-                )
-                print(f"  Stored response from {llm_name}.")
-        print("--- Finished scheduled LLM query job ---")
-    finally:
-        db.close()
+    tasks = plan_tasks(questions, llm_client.LLM_PROVIDERS)
+    if not tasks:
+        print("No (model, question) pairs are due.")
+        return
+
+    print("--- Starting scheduled LLM query job ---")
+    trace = RunTrace("scheduler")
+    with metrics.JOB_SECONDS.time():
+        print(f"Making {len(tasks)} provider calls across {len(llm_client.LLM_PROVIDERS)} providers "
+              f"and {len(questions)} questions...")
+        with trace.span("fan_out", count=len(tasks)):
+            results = fan_out(tasks, llm_client.LLM_PROVIDERS)
+        trace_provider_calls(trace, results)
+        store_results(results, trace)
+    trace_path = trace.finish()
+    if trace_path:
+        print(f"Run trace written to {trace_path}")
+    print("--- Finished scheduled LLM query job ---")
+
+async def fetch_and_store_responses_async():
+    """Fetches responses from all LLMs on the running event loop and stores them."""
+    # Waits for the startup rebuild, if it's still running.
+    await asyncio.to_thread(ensure_tables)
+    questions = load_questions()
+    if not questions:
+        print("No questions to process.")
+        return
+
+    tasks = await asyncio.to_thread(plan_tasks, questions, llm_client.ASYNC_LLM_PROVIDERS)
+    if not tasks:
+        print("No (model, question) pairs are due.")
+        return
+
+    print("--- Starting scheduled LLM query job ---")
+    trace = RunTrace("scheduler")
+    with metrics.JOB_SECONDS.time():
+        print(f"Making {len(tasks)} provider calls across {len(llm_client.ASYNC_LLM_PROVIDERS)} providers "
+              f"and {len(questions)} questions...")
+        with trace.span("fan_out", count=len(tasks)):
+            results = await fan_out_async(tasks, llm_client.ASYNC_LLM_PROVIDERS)
+        trace_provider_calls(trace, results)
+        # Embedding and DB writes are blocking, so keep them off the event loop.
+        await asyncio.to_thread(store_results, results, trace)
+    trace_path = trace.finish()
+    if trace_path:
+        print(f"Run trace written to {trace_path}")
+    print("--- Finished scheduled LLM query job ---")
 
-scheduler = BackgroundScheduler()
-# Schedule the job to run every 6 hours
-scheduler.add_job(fetch_and_store_responses, 'interval', hours=6)
+# Runs on the API's event loop, so provider calls don't tie up threads.
+scheduler = AsyncIOScheduler()
+if sampling.ADAPTIVE_SAMPLING:
+    # Tick often; each run only queries the pairs whose own interval has elapsed
+    scheduler.add_job(fetch_and_store_responses_async, 'interval', minutes=sampling.SAMPLING_TICK_MINUTES)
+else:
+    # Schedule the job to run every 6 hours
+    scheduler.add_job(fetch_and_store_responses_async, 'interval', hours=6)
 
 # Run once on startup for immediate data
-scheduler.add_job(fetch_and_store_responses, 'date')
+scheduler.add_job(fetch_and_store_responses_async, 'date')
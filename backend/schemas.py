@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 class ResponseBase(BaseModel):
     llm_name: str
@@ -14,6 +14,75 @@ class Response(ResponseBase):
     id: int
     timestamp: datetime.datetime
     similarity_score: Optional[float]
+    baseline_similarity: Optional[float] = None
+    lexical_similarity: Optional[float] = None
 
     class Config:
         from_attributes = True
+
+class ResponseFilters(BaseModel):
+    llm_name: Optional[str] = None
+    question: Optional[str] = None
+    since: Optional[datetime.datetime] = None
+    until: Optional[datetime.datetime] = None
+    min_similarity: Optional[float] = None
+    max_similarity: Optional[float] = None
+
+class DriftPoint(BaseModel):
+    period_start: datetime.date
+    llm_name: str
+    question: str
+    response_count: int
+    mean_similarity: Optional[float]
+    min_similarity: Optional[float]
+    p10_similarity: Optional[float]
+    mean_response_length: float
+
+class ProviderFailure(BaseModel):
+    id: int
+    timestamp: datetime.datetime
+    llm_name: str
+    question: str
+    error_kind: str
+    error: Optional[str]
+    attempts: int
+    latency: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+class DriftEvent(BaseModel):
+    id: int
+    timestamp: datetime.datetime
+    llm_name: str
+    question: str
+    response_id: Optional[int]
+    magnitude: float
+    statistic: float
+
+    class Config:
+        from_attributes = True
+
+class SampleSet(BaseModel):
+    id: int
+    timestamp: datetime.datetime
+    llm_name: str
+    question: str
+    sample_count: int
+    dispersion: Optional[float]
+    centroid_similarity: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+class SimilarResponse(BaseModel):
+    score: float  # Cosine similarity to the query
+    response: Response
+
+class AgreementMatrix(BaseModel):
+    id: int
+    timestamp: datetime.datetime
+    question: str
+    llm_names: List[str]  # Row and column order of `matrix`
+    matrix: List[List[float]]  # Cosine similarity between every pair of models' answers
+    mean_agreement: Dict[str, float]  # Each model's mean similarity to the other models
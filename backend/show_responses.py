@@ -1,24 +1,46 @@
 import sqlite3
 
+from compression import decompress, has_dictionary, register_dictionary
+
+def _response_text(conn, text, codec, data, dictionary_id):
+    """Return the plain text of a row, decompressing it if it lives in a blob."""
+    if codec is None:
+        return text
+    if dictionary_id is not None and not has_dictionary(dictionary_id):
+        (dictionary,) = conn.execute(
+            'SELECT data FROM compression_dictionaries WHERE id = ?', (dictionary_id,)
+        ).fetchone()
+        register_dictionary(dictionary_id, dictionary)
+    return decompress(codec, data, dictionary_id)
+
 def show_responses():
     try:
         conn = sqlite3.connect('llm_responses.db')
         cursor = conn.cursor()
-        
-        cursor.execute('SELECT llm_name, question, response FROM responses')
-        rows = cursor.fetchall()
-        
-        if not rows:
-            print("No responses found in the database.")
-            return
 
-        for row in rows:
-            llm_name, question, response = row
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(responses)')]
+        if 'content_hash' in columns:
+            cursor.execute('''
+                SELECT r.llm_name, r.question, r.response, b.codec, b.data, b.dictionary_id
+                FROM responses r
+                LEFT JOIN response_blobs b ON b.content_hash = r.content_hash
+            ''')
+        else:
+            cursor.execute('SELECT llm_name, question, response, NULL, NULL, NULL FROM responses')
+
+        found = False
+        for row in cursor:
+            found = True
+            llm_name, question, response, codec, data, dictionary_id = row
+            response = _response_text(conn, response, codec, data, dictionary_id)
             print(f"--- LLM: {llm_name} ---")
             print(f"Question: {question}")
             print(f"Response: {response}")
             print("-" * 20)
-            
+
+        if not found:
+            print("No responses found in the database.")
+
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     finally:
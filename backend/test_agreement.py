@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from backend import crud, models
+
+
+def test_agreement_matrices_round_trip_through_the_database(db):
+    matrix = np.array([[1.0, 0.9, 0.2], [0.9, 1.0, 0.3], [0.2, 0.3, 1.0]], dtype=np.float32)
+    crud.create_agreement_matrices(db, [{"question": "question", "llm_names": ["a", "b", "c"], "matrix": matrix}])
+    db.commit()
+
+    (stored,) = crud.get_agreement_matrices(db)
+    assert stored.llm_names == ["a", "b", "c"]
+    assert np.array(stored.matrix) == pytest.approx(matrix, abs=1e-3)
+    assert stored.mean_agreement == pytest.approx({"a": 0.55, "b": 0.6, "c": 0.25}, abs=1e-3)
+    assert len(crud.get_agreement_matrices(db, llm_name="b")) == 1
+    assert crud.get_agreement_matrices(db, llm_name="d") == []
+
+
+def test_agreement_matrices_are_not_committed_on_their_own(db):
+    crud.create_agreement_matrices(db, [{"question": "question", "llm_names": ["a", "b"],
+                                         "matrix": np.eye(2, dtype=np.float32)}])
+    db.rollback()
+    assert db.query(models.AgreementMatrix).count() == 0
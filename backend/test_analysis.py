@@ -0,0 +1,78 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from backend.analysis import agreement_matrices, matrix_from_bytes, matrix_to_bytes, sample_statistics
+
+
+def random_unit_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_sample_statistics_match_pairwise_computation():
+    sizes = [3, 1, 5, 2]
+    embeddings = random_unit_vectors(sum(sizes))
+    previous = random_unit_vectors(len(sizes), seed=1)
+    previous[1] = np.nan  # A group with no previous run
+
+    centroids, dispersion, centroid_similarity = sample_statistics(embeddings, sizes, previous)
+
+    start = 0
+    for group, size in enumerate(sizes):
+        samples = embeddings[start:start + size]
+        start += size
+        mean = samples.mean(axis=0)
+        assert centroids[group] == pytest.approx(mean / np.linalg.norm(mean), abs=1e-5)
+        if size > 1:
+            pairwise = [a @ b for a, b in itertools.combinations(samples, 2)]
+            assert dispersion[group] == pytest.approx(1 - np.mean(pairwise), abs=1e-5)
+        else:
+            assert np.isnan(dispersion[group])
+        if np.isnan(previous[group]).any():
+            assert np.isnan(centroid_similarity[group])
+        else:
+            assert centroid_similarity[group] == pytest.approx(centroids[group] @ previous[group], abs=1e-5)
+
+
+def test_identical_samples_have_no_dispersion():
+    sample = random_unit_vectors(1)
+    _, dispersion, centroid_similarity = sample_statistics(np.repeat(sample, 4, axis=0), [4], sample)
+    assert dispersion[0] == pytest.approx(0.0, abs=1e-6)
+    assert centroid_similarity[0] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_agreement_matrices_match_per_question_cosines():
+    embeddings = random_unit_vectors(6)
+    # Question 0: models 0, 1, 2. Question 1: model 0 twice, model 2 once. Question 2: nobody.
+    questions = [0, 0, 0, 1, 1, 1]
+    models = [0, 1, 2, 0, 0, 2]
+
+    matrices = agreement_matrices(embeddings, questions, models, 3, 3)
+    assert matrices.shape == (3, 3, 3)
+
+    assert matrices[0] == pytest.approx(embeddings[:3] @ embeddings[:3].T, abs=1e-5)
+    centroid = embeddings[3] + embeddings[4]
+    centroid /= np.linalg.norm(centroid)
+    assert matrices[1, 0, 2] == pytest.approx(centroid @ embeddings[5], abs=1e-5)
+    assert np.isnan(matrices[1, 1]).all() and np.isnan(matrices[1, :, 1]).all()
+    assert np.isnan(matrices[2]).all()
+
+    for matrix in matrices[:2]:
+        answered = ~np.isnan(matrix.diagonal())
+        present = matrix[np.ix_(answered, answered)]
+        assert present == pytest.approx(present.T)
+        assert present.diagonal() == pytest.approx(1.0, abs=1e-5)
+
+
+def test_matrix_bytes_round_trip():
+    embeddings = random_unit_vectors(5)
+    matrix = embeddings @ embeddings.T
+    data = matrix_to_bytes(matrix)
+    assert len(data) == 10 * 2  # Upper triangle only, in float16
+
+    restored = matrix_from_bytes(data, 5)
+    assert restored == pytest.approx(matrix, abs=1e-3)
+    assert (restored == restored.T).all()
+    assert (restored.diagonal() == 1.0).all()
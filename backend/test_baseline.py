@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from backend import baseline, models
+
+MODEL = "embedding-model"
+
+
+def random_unit_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def feed(state, embeddings, embedding_model=MODEL):
+    return [baseline.score_and_update(state, embedding, embedding_model) for embedding in embeddings]
+
+
+@pytest.fixture
+def alpha(monkeypatch):
+    # Equal weights for the first four responses, then exponential weighting.
+    monkeypatch.setattr(baseline, "BASELINE_ALPHA", 0.25)
+    return 0.25
+
+
+def test_first_responses_are_averaged_equally(alpha):
+    embeddings = random_unit_vectors(4)
+    state = models.DriftBaseline(count=0)
+    similarities = feed(state, embeddings)
+
+    assert similarities[0] is None
+    for n in range(1, 4):
+        mean = embeddings[:n].mean(axis=0)
+        assert similarities[n] == pytest.approx(mean @ embeddings[n] / np.linalg.norm(mean), abs=1e-5)
+    assert np.frombuffer(state.mean, dtype=np.float32) == pytest.approx(embeddings.mean(axis=0), abs=1e-6)
+    assert state.similarity_mean == pytest.approx(np.mean(similarities[1:]))
+    assert state.similarity_variance == pytest.approx(np.var(similarities[1:]))
+
+
+def test_later_responses_are_weighted_exponentially(alpha):
+    embeddings = random_unit_vectors(12)
+    state = models.DriftBaseline(count=0)
+    similarities = feed(state, embeddings)
+
+    # After the first four, each response moves the mean a quarter of the way towards it.
+    expected = embeddings[:4].mean(axis=0)
+    for embedding in embeddings[4:]:
+        expected = (1 - alpha) * expected + alpha * embedding
+    assert np.frombuffer(state.mean, dtype=np.float32) == pytest.approx(expected, abs=1e-6)
+
+    # Similarities get equal weights for their first four values, then alpha.
+    mean, variance = np.mean(similarities[1:5]), np.var(similarities[1:5])
+    for similarity in similarities[5:]:
+        difference = similarity - mean
+        mean += alpha * difference
+        variance = (1 - alpha) * (variance + alpha * difference ** 2)
+    assert state.similarity_mean == pytest.approx(mean)
+    assert state.similarity_variance == pytest.approx(variance)
+    assert state.count == 12
+
+
+def test_changing_embedding_model_resets_the_baseline(alpha):
+    embeddings = random_unit_vectors(6)
+    state = models.DriftBaseline(count=0)
+    feed(state, embeddings[:5])
+
+    assert feed(state, embeddings[5:], embedding_model="another-model") == [None]
+    assert state.count == 1
+    assert state.embedding_model == "another-model"
+    assert np.frombuffer(state.mean, dtype=np.float32) == pytest.approx(embeddings[5], abs=1e-6)
+    assert state.similarity_mean is None and state.similarity_variance is None
+
+
+def test_baselines_persist_per_pair(db):
+    embeddings = random_unit_vectors(3)
+    items = [("a", "question", embeddings[0]), ("b", "question", embeddings[1]), ("a", "question", embeddings[2])]
+    similarities = baseline.score_against_baselines(db, items, MODEL)
+    db.commit()
+
+    assert similarities[:2] == [None, None]
+    assert similarities[2] == pytest.approx(embeddings[0] @ embeddings[2], abs=1e-5)
+    assert {(state.llm_name, state.count) for state in db.query(models.DriftBaseline)} == {("a", 2), ("b", 1)}
+
+    (similarity,) = baseline.score_against_baselines(db, [("b", "question", embeddings[0])], MODEL)
+    assert similarity == pytest.approx(embeddings[1] @ embeddings[0], abs=1e-5)
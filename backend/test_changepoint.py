@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from backend import changepoint, crud, models
+
+
+def new_state():
+    state = models.DetectorState(llm_name="model", question="question")
+    changepoint.reset(state)
+    return state
+
+
+def detections(series):
+    state = new_state()
+    return [(i, change) for i, value in enumerate(series)
+            if (change := changepoint.update(state, float(value))) is not None]
+
+
+def test_step_drop_is_reported_once():
+    rng = np.random.default_rng(0)
+    series = np.r_[0.95 + 0.01 * rng.normal(size=50), 0.80 + 0.01 * rng.normal(size=50)]
+
+    ((position, (magnitude, statistic)),) = detections(series)
+    assert 50 <= position < 55
+    assert magnitude == pytest.approx(0.15, abs=0.05)
+    assert statistic > changepoint.PH_THRESHOLD
+
+
+@pytest.mark.parametrize("noise", ["normal", "uniform"])
+def test_stable_series_reports_nothing(noise):
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 0.05, size=5000) if noise == "normal" else rng.uniform(-0.05, 0.05, size=5000)
+    assert detections(0.85 + values) == []
+
+
+def test_false_alarm_rate_is_low():
+    # The documented rate is under one per 100,000 responses; allow some slack.
+    rng = np.random.default_rng(2)
+    alarms = sum(len(detections(0.85 + 0.05 * rng.normal(size=5000))) for _ in range(20))
+    assert alarms <= 2
+
+
+def test_drop_after_a_short_history_is_reported():
+    # The drop itself must not inflate the deviation it is measured in.
+    ((position, (magnitude, _)),) = detections([0.95, 0.94, 0.96, 0.95, 0.95, 0.94] + [0.5] * 10)
+    assert position == 6
+    assert magnitude > 0.2
+
+
+def test_identical_answers_with_one_outlier_report_nothing():
+    series = np.ones(200)
+    series[100] = 0.95
+    assert detections(series) == []
+
+
+def test_detector_restarts_after_a_detection():
+    state = new_state()
+    for value in [0.95] * 10 + [0.95, 0.94, 0.96, 0.95, 0.95]:
+        assert changepoint.update(state, value) is None
+    change = None
+    while change is None:
+        change = changepoint.update(state, 0.5)
+
+    assert state.count == 0
+    assert state.mean == 0.0
+    assert state.sum_squares == 0.0
+    assert state.scale == changepoint.PH_MIN_STD
+    assert state.cumulative == state.peak == 0.0
+    assert state.since_peak_count == 0
+
+
+def test_detect_changes_records_events_without_committing(db):
+    items = [("model", "question", value, i + 1)
+             for i, value in enumerate([0.95, 0.94, 0.96, 0.95, 0.95, 0.94, None] + [0.5] * 5)]
+    events = changepoint.detect_changes(db, items)
+
+    assert len(events) == 1
+    assert events[0]["response_id"] > 7
+    assert db.query(models.DriftEvent).count() == 1
+    db.rollback()
+    assert db.query(models.DriftEvent).count() == 0
+    assert db.query(models.DetectorState).count() == 0
+
+
+def test_detector_state_persists_between_runs(db):
+    values = [0.95, 0.94, 0.96, 0.95, 0.95, 0.94] + [0.5] * 5
+    events = []
+    for i, value in enumerate(values):
+        events += changepoint.detect_changes(db, [("model", "question", value, i + 1)])
+        db.commit()
+    assert len(events) == 1
+    assert db.query(models.DetectorState).one().count < len(values)
+
+
+def test_detector_state_rolls_back_with_a_failed_response_write(db, monkeypatch):
+    def detect(chunk_rows, chunk_responses):
+        changepoint.detect_changes(db, [
+            (row["llm_name"], row["question"], row["similarity_score"], db_response.id)
+            for row, db_response in zip(chunk_rows, chunk_responses)
+        ])
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        crud.create_responses(db, [{"llm_name": "model", "question": "question", "response": "answer",
+                                    "similarity_score": 0.9}], on_chunk=detect)
+    assert db.query(models.DetectorState).count() == 0
+    assert db.query(models.Response).count() == 0
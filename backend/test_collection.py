@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+# collection imports every provider SDK through llm_client.
+for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+    pytest.importorskip(sdk)
+
+from backend import collection  # noqa: E402
+from backend.llm_client import ProviderResult  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def one_call_at_a_time(monkeypatch):
+    monkeypatch.setenv("PROVIDER_CONCURRENCY_SLOW", "1")
+
+
+def tasks(count):
+    return [(f"q{i}", "slow") for i in range(count)]
+
+
+def test_queued_sync_calls_get_their_own_timeout():
+    def slow(question):
+        time.sleep(0.1)
+        return f"answer to {question}"
+
+    # Four calls in a row take longer than the timeout, but none does alone.
+    results = collection.fan_out(tasks(4), {"slow": slow}, timeout=0.3)
+    assert [result.text for _, _, result in results] == [f"answer to q{i}" for i in range(4)]
+    assert all(result.ok and result.latency < 0.3 for _, _, result in results)
+
+
+def test_hung_sync_call_times_out_without_blocking_the_next():
+    release = threading.Event()
+
+    def hangs_once(question):
+        if question == "q0":
+            release.wait(5)
+        return question
+
+    started = time.perf_counter()
+    results = collection.fan_out(tasks(2), {"slow": hangs_once}, timeout=0.2)
+    release.set()
+    assert time.perf_counter() - started < 1
+    (_, _, hung), (_, _, done) = results
+    assert (hung.error_kind, hung.timed_out, hung.latency) == ("timeout", True, 0.2)
+    assert done.ok and done.text == "q1"
+
+
+def test_queued_async_calls_get_their_own_timeout():
+    async def slow(question):
+        await asyncio.sleep(0.1)
+        return ProviderResult(text=f"answer to {question}")
+
+    results = asyncio.run(collection.fan_out_async(tasks(4), {"slow": slow}, timeout=0.3))
+    assert [result.text for _, _, result in results] == [f"answer to q{i}" for i in range(4)]
+    assert all(result.latency < 0.3 for _, _, result in results)
+
+
+def test_hung_async_call_is_cancelled_at_its_timeout():
+    cancelled = []
+
+    async def hangs_once(question):
+        if question == "q0":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(question)
+                raise
+        return ProviderResult(text=question)
+
+    results = asyncio.run(collection.fan_out_async(tasks(2), {"slow": hangs_once}, timeout=0.2))
+    (_, _, hung), (_, _, done) = results
+    assert (hung.error_kind, hung.timed_out, hung.latency) == ("timeout", True, 0.2)
+    assert cancelled == ["q0"]
+    assert done.ok and done.text == "q1"
+
+
+def test_empty_sync_answer_is_an_error():
+    results = collection.fan_out(tasks(2), {"slow": lambda question: "" if question == "q0" else " \n"})
+    assert [result.error_kind for _, _, result in results] == ["empty_response", "empty_response"]
+    assert not any(result.ok for _, _, result in results)
@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+from backend import compact_responses, compression, crud, models
+
+WORDS = ("the model answered that drift between versions depends on training data, "
+         "temperature, prompt wording and the date of the snapshot being queried").split()
+
+
+def sample_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def fresh_codecs(monkeypatch):
+    # Dictionary ids restart with each in-memory database.
+    monkeypatch.setattr(compression, "_dictionaries", {})
+    monkeypatch.setattr(compression._local, "codecs", {}, raising=False)
+
+
+@pytest.fixture
+def no_zstd(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+
+
+def store(db, texts):
+    return crud.create_responses(db, [
+        {"llm_name": "model", "question": f"question {i}", "response": text, "similarity_score": None}
+        for i, text in enumerate(texts)
+    ])
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    text = "Ünïcode and plain text " * 20
+    codec, data = compression.compress(text)
+    assert codec == "zstd"
+    assert len(data) < len(text)
+    assert compression.decompress(codec, data) == text
+
+
+def test_zstd_round_trip_with_dictionary():
+    pytest.importorskip("zstandard")
+    texts = sample_texts(300)
+    compression.register_dictionary(1, compression.train_dictionary(texts[:200], size=4096))
+    for text in texts[200:]:
+        codec, data = compression.compress(text, 1)
+        assert codec == "zstd"
+        assert compression.decompress(codec, data, 1) == text
+    # Without the dictionary the frame can't be read back.
+    codec, data = compression.compress(texts[-1], 1)
+    with pytest.raises(Exception):
+        compression.decompress(codec, data)
+
+
+def test_zlib_fallback_round_trip(no_zstd):
+    text = "Ünïcode and plain text " * 20
+    codec, data = compression.compress(text, dictionary_id=1)
+    assert codec == "zlib"
+    assert compression.decompress(codec, data) == text
+    with pytest.raises(RuntimeError):
+        compression.decompress("zstd", data)
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        compression.decompress("lz4", b"")
+
+
+def test_stored_texts_round_trip_through_response(db):
+    texts = sample_texts(5)
+    rows = store(db, texts)
+    assert [row.response for row in rows] == texts
+    assert all(row.response_text is None and row.content_hash for row in rows)
+    blob = db.get(models.ResponseBlob, rows[0].content_hash)
+    assert blob.size == len(texts[0])
+    assert blob.codec == ("zstd" if compression.zstd_available() else "zlib")
+
+
+def test_zlib_fallback_through_crud(db, no_zstd):
+    texts = sample_texts(3)
+    rows = store(db, texts)
+    assert [row.response for row in rows] == texts
+    assert {blob.codec for blob in db.query(models.ResponseBlob)} == {"zlib"}
+    assert {blob.dictionary_id for blob in db.query(models.ResponseBlob)} == {None}
+
+
+def test_identical_texts_share_one_blob(db):
+    text = sample_texts(1)[0]
+    rows = store(db, [text, text])
+    rows += store(db, [text, "something else"])
+    assert len({row.content_hash for row in rows}) == 2
+    assert db.query(models.ResponseBlob).count() == 2
+    assert [row.response for row in rows] == [text, text, text, "something else"]
+    assert rows[0].content_hash == compression.content_hash(text)
+
+
+def test_new_texts_use_the_active_dictionary(db):
+    pytest.importorskip("zstandard")
+    store(db, sample_texts(200))
+    dictionary_id = compact_responses.train_dictionary(db, dict_size=4096)
+    assert compact_responses.recompress_blobs(db, dictionary_id) == 200
+
+    text = sample_texts(1, seed=1)[0]
+    [row] = store(db, [text])
+    assert row.blob.dictionary_id == dictionary_id
+    # A fresh process has to load the dictionary from the database to read it.
+    compression._dictionaries.clear()
+    compression._local.codecs.clear()
+    db.expire_all()
+    assert db.get(models.Response, row.id).response == text
+    assert all(blob.dictionary_id == dictionary_id for blob in db.query(models.ResponseBlob))
+
+
+def test_legacy_plain_text_rows(db):
+    texts = ["written before compression", "also legacy", "also legacy"]
+    db.add_all([models.Response(llm_name="model", question=f"question {i}", response_text=text)
+                for i, text in enumerate(texts)])
+    db.commit()
+    rows = db.query(models.Response).order_by(models.Response.id).all()
+    assert [row.response for row in rows] == texts
+    assert all(row.content_hash is None for row in rows)
+
+    assert compact_responses.migrate_plain_responses(db) == 3
+    db.expire_all()
+    rows = db.query(models.Response).order_by(models.Response.id).all()
+    assert [row.response for row in rows] == texts
+    assert all(row.response_text is None for row in rows)
+    assert db.query(models.ResponseBlob).count() == 2
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import event
+
+from backend import crud, models
+
+
+def rows(count, llm_name="gpt"):
+    return [{"llm_name": llm_name, "question": f"q{i % 3}", "response": f"answer {i}", "similarity_score": 0.5}
+            for i in range(count)]
+
+
+@pytest.fixture
+def commits(db):
+    """Counts the commits made on the test session."""
+    counted = []
+    event.listen(db, "after_commit", lambda session: counted.append(session))
+    return counted
+
+
+def test_a_run_is_written_in_one_commit(db, commits):
+    stored = crud.create_responses(db, rows(7))
+    assert len(commits) == 1
+    assert db.query(models.Response).count() == 7
+    assert [row.id for row in stored] == sorted(row.id for row in stored)
+    # The newest row of each pair in the batch becomes its latest response.
+    latest = crud.get_latest_responses(db, [("gpt", "q0"), ("gpt", "q1"), ("gpt", "q2")])
+    assert {pair: row.id for pair, row in latest.items()} == {
+        ("gpt", "q0"): stored[6].id, ("gpt", "q1"): stored[4].id, ("gpt", "q2"): stored[5].id
+    }
+
+
+def test_chunks_are_committed_separately(db, commits):
+    crud.create_responses(db, rows(7), chunk_size=3)
+    assert len(commits) == 3
+    assert db.query(models.Response).count() == 7
+
+
+def test_empty_run_writes_nothing(db, commits):
+    assert crud.create_responses(db, []) == []
+    assert db.query(models.Response).count() == 0
+
+
+@pytest.mark.parametrize("chunk_size, kept", [(None, 0), (4, 4)])
+def test_failure_rolls_back_the_chunk_being_written(db, monkeypatch, chunk_size, kept):
+    crud.create_responses(db, rows(2, llm_name="claude"))
+    calls = []
+    original = crud.set_latest_responses
+
+    def fail_on_second_chunk(db, chunk):
+        calls.append(chunk)
+        if len(calls) == 2 or chunk_size is None:
+            raise RuntimeError("disk full")
+        original(db, chunk)
+
+    monkeypatch.setattr(crud, "set_latest_responses", fail_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        crud.create_responses(db, rows(7), chunk_size=chunk_size)
+
+    assert db.query(models.Response).filter(models.Response.llm_name == "gpt").count() == kept
+    assert db.query(models.Response).filter(models.Response.llm_name == "claude").count() == 2
+    assert db.query(models.LatestResponse).filter(models.LatestResponse.llm_name == "gpt").count() == min(kept, 3)
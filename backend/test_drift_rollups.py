@@ -0,0 +1,82 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from backend import crud, models
+
+MONDAY = datetime.datetime(2024, 5, 6, 12, 0)
+TUESDAY = MONDAY + datetime.timedelta(days=1)
+
+
+def response(similarity_score, timestamp=MONDAY, text="abcd", question="question"):
+    row = {"llm_name": "model", "question": question, "response": text, "similarity_score": similarity_score}
+    if timestamp is not None:
+        row["timestamp"] = timestamp
+    return row
+
+
+def test_timeseries_reports_mean_min_and_p10(db):
+    scores = [0.9, 0.8, 0.7, 0.6]
+    crud.update_drift_rollups(db, [response(score) for score in scores] + [response(None, text="abcdefgh")])
+    db.commit()
+
+    (point,) = crud.get_drift_timeseries(db, period="day")
+    assert point.period_start == MONDAY.date()
+    assert point.response_count == 5
+    assert point.mean_similarity == pytest.approx(np.mean(scores))
+    assert point.min_similarity == pytest.approx(0.6)
+    assert point.p10_similarity == pytest.approx(np.percentile(scores, 10))
+    assert point.mean_response_length == pytest.approx((4 * 4 + 8) / 5)
+
+
+def test_rollups_accumulate_across_calls_and_weeks(db):
+    crud.update_drift_rollups(db, [response(0.9), response(0.5)])
+    crud.update_drift_rollups(db, [response(0.1, timestamp=TUESDAY)])
+    db.commit()
+
+    days = crud.get_drift_timeseries(db, period="day")
+    assert [point.period_start for point in days] == [MONDAY.date(), TUESDAY.date()]
+    assert days[0].mean_similarity == pytest.approx(0.7)
+
+    (week,) = crud.get_drift_timeseries(db, period="week")
+    assert week.period_start == MONDAY.date()
+    assert week.response_count == 3
+    assert week.mean_similarity == pytest.approx(0.5)
+    assert week.p10_similarity == pytest.approx(np.percentile([0.9, 0.5, 0.1], 10))
+
+
+def test_rollups_are_written_with_their_responses(db, monkeypatch):
+    rows = [response(0.5, timestamp=None, question=f"question {i}") for i in range(4)]
+    written = []
+    original = crud.set_latest_responses
+
+    def fail_on_second_chunk(db, chunk):
+        written.append(chunk)
+        if len(written) == 2:
+            raise RuntimeError("disk full")
+        original(db, chunk)
+
+    monkeypatch.setattr(crud, "set_latest_responses", fail_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        crud.create_responses(db, rows, chunk_size=2)
+
+    assert db.query(models.Response).count() == 2
+    assert sum(point.response_count for point in crud.get_drift_timeseries(db, period="day")) == 2
+    assert not crud.drift_rollups_missing(db)
+
+
+def test_missing_rollups_are_detected_and_rebuilt(db):
+    crud.create_responses(db, [response(0.5, timestamp=None), response(0.7, timestamp=None)])
+    assert not crud.drift_rollups_missing(db)
+
+    # A response stored without its rollup, as older versions could leave behind.
+    db.add(models.Response(llm_name="model", question="question", response="late", similarity_score=0.3))
+    db.commit()
+    assert crud.drift_rollups_missing(db)
+
+    crud.rebuild_drift_rollups(db)
+    assert not crud.drift_rollups_missing(db)
+    (point,) = crud.get_drift_timeseries(db, period="day")
+    assert point.response_count == 3
+    assert point.mean_similarity == pytest.approx(0.5)
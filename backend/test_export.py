@@ -0,0 +1,127 @@
+import csv
+import datetime
+import io
+import json
+import sys
+
+import pytest
+
+from backend import compact_responses, compression, crud, export, models, schemas
+
+BASE_TIME = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def fresh_codecs(monkeypatch):
+    # Dictionary ids restart with each in-memory database.
+    monkeypatch.setattr(compression, "_dictionaries", {})
+    monkeypatch.setattr(compression._local, "codecs", {}, raising=False)
+
+
+@pytest.fixture
+def session_local(monkeypatch, session_factory):
+    """Points the export's own sessions at the test database."""
+    monkeypatch.setattr(export, "SessionLocal", session_factory)
+    return session_factory
+
+
+def store(db, rows):
+    created = crud.create_responses(db, [dict(row, similarity_score=row.get("similarity_score")) for row in rows])
+    for i, row in enumerate(created):
+        row.timestamp = BASE_TIME + datetime.timedelta(minutes=i)
+    db.commit()
+    return created
+
+
+def sample_rows(count, llm_name="model"):
+    return [{"llm_name": llm_name, "question": f"question {i % 3}",
+             "response": f"answer {i} " + "with some repeated wording " * (i % 4),
+             "similarity_score": i / count}
+            for i in range(count)]
+
+
+def exported(db, **kwargs):
+    return list(export.iter_rows(db, **kwargs))
+
+
+def test_rows_are_exported_oldest_first_with_plain_text(db):
+    rows = sample_rows(7)
+    stored = store(db, rows)
+    result = exported(db, fetch_size=2)
+    assert [row["id"] for row in result] == [row.id for row in stored]
+    assert [row["response"] for row in result] == [row["response"] for row in rows]
+    assert set(result[0]) == set(export.EXPORT_FIELDS)
+    assert result[0]["timestamp"] == BASE_TIME
+
+
+def test_legacy_and_deduplicated_rows(db):
+    db.add(models.Response(llm_name="model", question="old", response_text="written before compression",
+                           timestamp=BASE_TIME - datetime.timedelta(days=1)))
+    db.commit()
+    store(db, [{"llm_name": "model", "question": "q", "response": "same text"},
+               {"llm_name": "other", "question": "q", "response": "same text"}])
+    assert db.query(models.ResponseBlob).count() == 1
+    assert [row["response"] for row in exported(db)] == [
+        "written before compression", "same text", "same text",
+    ]
+
+
+def test_texts_compressed_with_a_dictionary(db):
+    pytest.importorskip("zstandard")
+    rows = sample_rows(200)
+    store(db, rows)
+    dictionary_id = compact_responses.train_dictionary(db, dict_size=4096)
+    compact_responses.recompress_blobs(db, dictionary_id)
+    # A fresh process has to load the dictionary from the database.
+    compression._dictionaries.clear()
+    compression._local.codecs.clear()
+    assert [row["response"] for row in exported(db, fetch_size=50)] == [row["response"] for row in rows]
+
+
+def test_filters(db):
+    store(db, sample_rows(6) + sample_rows(3, llm_name="other"))
+    result = exported(db, filters=schemas.ResponseFilters(llm_name="other", question="question 1"))
+    assert [(row["llm_name"], row["question"]) for row in result] == [("other", "question 1")]
+    result = exported(db, filters=schemas.ResponseFilters(since=BASE_TIME + datetime.timedelta(minutes=7)))
+    assert len(result) == 2
+
+
+def test_ndjson_and_csv(db, session_local):
+    rows = sample_rows(4)
+    store(db, rows)
+    lines = b"".join(export.stream_export("ndjson")).decode().splitlines()
+    assert [json.loads(line)["response"] for line in lines] == [row["response"] for row in rows]
+    assert json.loads(lines[0])["timestamp"] == BASE_TIME.isoformat()
+
+    reader = csv.DictReader(io.StringIO(b"".join(export.stream_export("csv")).decode()))
+    assert reader.fieldnames == export.EXPORT_FIELDS
+    assert [row["response"] for row in reader] == [row["response"] for row in rows]
+
+
+def test_parquet(db, session_local):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = sample_rows(5)
+    store(db, rows)
+    table = pq.read_table(io.BytesIO(b"".join(export.stream_export("parquet"))))
+    assert table.column("response").to_pylist() == [row["response"] for row in rows]
+    assert table.column("timestamp").to_pylist()[0] == BASE_TIME
+
+
+def test_cli_writes_the_filtered_export(db, session_local, monkeypatch, tmp_path):
+    store(db, sample_rows(3) + sample_rows(2, llm_name="other"))
+    output = tmp_path / "export.ndjson"
+    monkeypatch.setattr(sys, "argv", ["export", "--format", "ndjson", "--output", str(output),
+                                      "--llm-name", "other"])
+    export.main()
+    lines = output.read_text().splitlines()
+    assert [json.loads(line)["llm_name"] for line in lines] == ["other", "other"]
+
+
+def test_export_endpoint(client, db, session_local):
+    rows = sample_rows(3)
+    store(db, rows)
+    response = client.get("/api/responses/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert [json.loads(line)["response"] for line in response.text.splitlines()] == [
+        row["response"] for row in rows
+    ]
@@ -0,0 +1,49 @@
+from backend import crud, models
+
+
+def store(db, llm_name, question, text):
+    return crud.create_response(db, llm_name, question, text, similarity_score=None)
+
+
+def test_latest_response_follows_each_insert(db):
+    store(db, "gpt", "q1", "first")
+    store(db, "gpt", "q1", "second")
+    newest = store(db, "gpt", "q1", "third")
+    other = store(db, "claude", "q1", "other")
+
+    latest = crud.get_latest_responses(db, [("gpt", "q1"), ("claude", "q1")])
+    assert {pair: row.id for pair, row in latest.items()} == {("gpt", "q1"): newest.id, ("claude", "q1"): other.id}
+    assert latest[("gpt", "q1")].response == "third"
+    assert db.query(models.LatestResponse).count() == 2
+
+
+def test_only_requested_pairs_are_returned(db):
+    for llm_name in ("gpt", "claude"):
+        for question in ("q1", "q2"):
+            store(db, llm_name, question, f"{llm_name} {question}")
+
+    # Both names and both questions are asked for, but not every combination.
+    latest = crud.get_latest_responses(db, [("gpt", "q1"), ("claude", "q2"), ("gemini", "q1")])
+    assert sorted(latest) == [("claude", "q2"), ("gpt", "q1")]
+    assert crud.get_latest_responses(db, []) == {}
+
+
+def test_missing_index_is_detected_and_rebuilt(db):
+    # Responses stored before the latest-response table existed.
+    db.add_all([
+        models.Response(llm_name="gpt", question="q1", response="old"),
+        models.Response(llm_name="gpt", question="q1", response="new"),
+        models.Response(llm_name="claude", question="q1", response="only"),
+    ])
+    db.commit()
+    assert crud.latest_responses_missing(db)
+    assert crud.get_latest_responses(db, [("gpt", "q1")]) == {}
+
+    crud.rebuild_latest_responses(db)
+    assert not crud.latest_responses_missing(db)
+    latest = crud.get_latest_responses(db, [("gpt", "q1"), ("claude", "q1")])
+    assert {pair: row.response for pair, row in latest.items()} == {("gpt", "q1"): "new", ("claude", "q1"): "only"}
+
+
+def test_empty_database_needs_no_rebuild(db):
+    assert not crud.latest_responses_missing(db)
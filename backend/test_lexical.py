@@ -0,0 +1,32 @@
+from backend.lexical import lexical_similarity, shingles, simhash
+
+TEXT = ("The war began in February 2022 when Russian forces invaded Ukraine from the north, "
+        "east and south, following months of military build-up along the border.")
+
+
+def test_identical_texts_are_fully_similar():
+    assert lexical_similarity(simhash(TEXT), simhash(TEXT)) == 1.0
+
+
+def test_case_and_punctuation_are_ignored():
+    assert simhash(TEXT) == simhash(TEXT.upper().replace(",", ""))
+
+
+def test_small_edits_score_between_unrelated_and_identical():
+    edited = lexical_similarity(simhash(TEXT), simhash(TEXT.replace("north", "west")))
+    unrelated = lexical_similarity(simhash(TEXT), simhash(
+        "Photosynthesis converts light energy into chemical energy stored in glucose inside plant cells."
+    ))
+    assert unrelated < edited < 1.0
+
+
+def test_fingerprints_fit_a_signed_64_bit_column():
+    fingerprint = simhash(TEXT)
+    assert -2 ** 63 <= fingerprint < 2 ** 63
+    assert lexical_similarity(fingerprint, ~fingerprint) == 0.0
+
+
+def test_short_and_empty_texts():
+    assert shingles("Yes.") == ["yes"]
+    assert shingles("") == []
+    assert simhash("") == 0
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+# llm_client imports every provider SDK.
+for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+    pytest.importorskip(sdk)
+
+from backend import llm_client, transport  # noqa: E402
+
+
+def returns(value):
+    async def create(**kwargs):
+        return value
+    return create
+
+
+def openai_like(content, choices=True):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message)] if choices else [],
+        usage=SimpleNamespace(prompt_tokens=5, completion_tokens=0),
+        model="served-model",
+    )
+
+
+def openai_client(completion):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=returns(completion))))
+
+
+class BlockedGeminiResponse:
+    usage_metadata = None
+
+    @property
+    def text(self):
+        raise ValueError("The response has no parts; it was blocked.")
+
+
+def grok_client(body):
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=body)))
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Swaps in fake clients that return whatever a test gives them."""
+    def configure(provider, reply):
+        if provider == "chatgpt":
+            monkeypatch.setattr(llm_client, "async_openai_client", openai_client(reply))
+        elif provider == "deepseek":
+            monkeypatch.setattr(llm_client, "async_deepseek_client", openai_client(reply))
+        elif provider == "claude":
+            monkeypatch.setattr(llm_client, "async_anthropic_client",
+                                SimpleNamespace(messages=SimpleNamespace(create=returns(reply))))
+        elif provider == "mistral":
+            monkeypatch.setattr(llm_client, "async_mistral_client", SimpleNamespace(chat=returns(reply)))
+        elif provider == "gemini":
+            async def generate(question, **kwargs):
+                return reply
+            monkeypatch.setattr(llm_client, "gemini_model", SimpleNamespace(generate_content_async=generate))
+        elif provider == "grok":
+            monkeypatch.setattr(llm_client, "GROK_API_KEY", "test-key")
+            monkeypatch.setattr(transport, "async_http_client", grok_client(reply))
+    return configure
+
+
+def query(provider):
+    return asyncio.run(llm_client.ASYNC_LLM_PROVIDERS[provider]("question"))
+
+
+CLAUDE_USAGE = SimpleNamespace(input_tokens=5, output_tokens=0)
+
+EMPTY_REPLIES = [
+    ("chatgpt", openai_like(None)),
+    ("chatgpt", openai_like("", choices=False)),
+    ("deepseek", openai_like("  \n")),
+    ("claude", SimpleNamespace(content=[], usage=CLAUDE_USAGE, model="served-model")),
+    ("claude", SimpleNamespace(content=[SimpleNamespace(text="")], usage=CLAUDE_USAGE, model="served-model")),
+    ("mistral", openai_like(None)),
+    ("gemini", BlockedGeminiResponse()),
+    ("grok", {"choices": [{"message": {"content": None}}]}),
+    ("grok", {"choices": []}),
+]
+
+
+@pytest.mark.parametrize("provider,reply", EMPTY_REPLIES)
+def test_empty_replies_are_errors(configure, provider, reply):
+    configure(provider, reply)
+    result = query(provider)
+    assert not result.ok
+    assert result.text is None
+    assert result.error_kind == "empty_response"
+    assert "empty response" in result.error
+    assert result.latency > 0
+
+
+def test_empty_reply_keeps_its_token_usage(configure):
+    configure("chatgpt", openai_like(""))
+    result = query("chatgpt")
+    assert (result.model, result.prompt_tokens, result.completion_tokens) == ("served-model", 5, 0)
+
+
+@pytest.mark.parametrize("provider,reply", [
+    ("chatgpt", openai_like("An answer.")),
+    ("claude", SimpleNamespace(content=[SimpleNamespace(text="An answer.")], usage=CLAUDE_USAGE, model="m")),
+    ("grok", {"choices": [{"message": {"content": "An answer."}}]}),
+])
+def test_answers_are_returned(configure, provider, reply):
+    configure(provider, reply)
+    result = query(provider)
+    assert result.ok and result.text == "An answer."
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from backend import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def result(ok=True, latency=2.0, prompt_tokens=None, completion_tokens=None, error_kind=None):
+    return SimpleNamespace(ok=ok, latency=latency, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           error_kind=error_kind, timed_out=error_kind == "timeout")
+
+
+def test_successful_calls_record_latency_and_tokens():
+    metrics.record_provider_result("metrics-ok", result(latency=2.0, prompt_tokens=10, completion_tokens=50))
+    metrics.record_provider_result("metrics-ok", result(latency=0.5))
+
+    assert sample("llm_provider_request_seconds_count", provider="metrics-ok") == 2
+    assert sample("llm_provider_request_seconds_sum", provider="metrics-ok") == pytest.approx(2.5)
+    assert sample("llm_provider_tokens_total", provider="metrics-ok", direction="prompt") == 10
+    assert sample("llm_provider_tokens_total", provider="metrics-ok", direction="completion") == 50
+    assert sample("llm_provider_completion_tokens_per_second_sum", provider="metrics-ok") == pytest.approx(25)
+    assert sample("llm_provider_errors_total", provider="metrics-ok", kind="timeout") == 0
+
+
+def test_failed_calls_are_counted_by_kind():
+    metrics.record_provider_result("metrics-failed", result(ok=False, latency=120.0, error_kind="timeout"))
+    metrics.record_provider_result("metrics-failed", result(ok=False, latency=120.0, error_kind="timeout"))
+
+    assert sample("llm_provider_errors_total", provider="metrics-failed", kind="timeout") == 2
+    assert sample("llm_provider_request_seconds_count", provider="metrics-failed") == 2
+    assert sample("llm_provider_tokens_total", provider="metrics-failed", direction="completion") == 0
+
+
+def test_render_exposes_every_metric():
+    metrics.STAGE_SECONDS.labels("embedding").observe(1.5)
+    metrics.JOB_SECONDS.observe(42)
+    metrics.PROVIDER_QUEUE_DEPTH.labels("metrics-queue").set(3)
+    content, content_type = metrics.render()
+    text = content.decode()
+
+    assert content_type.startswith("text/plain")
+    assert 'llm_pipeline_stage_seconds_count{stage="embedding"}' in text
+    assert 'llm_provider_queue_depth{provider="metrics-queue"} 3.0' in text
+    assert "llm_collection_job_seconds_count" in text
+
+
+def test_metrics_endpoint(client):
+    metrics.PROVIDER_IN_FLIGHT.labels("metrics-endpoint").set(2)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'llm_provider_in_flight{provider="metrics-endpoint"} 2.0' in response.text
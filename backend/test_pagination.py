@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+
+from backend import crud, models, schemas
+
+SHARED = datetime.datetime(2024, 5, 6, 12, 0, 0)
+
+
+@pytest.fixture
+def responses(db):
+    """25 responses, 10 of them sharing one timestamp, returned newest first."""
+    timestamps = [SHARED - datetime.timedelta(minutes=i) for i in range(1, 8)] + [SHARED] * 10 + \
+                 [SHARED + datetime.timedelta(minutes=i) for i in range(1, 9)]
+    crud.create_responses(db, [
+        {"llm_name": "a" if i % 2 else "b", "question": "question", "response": f"answer {i}",
+         "similarity_score": i / 25, "timestamp": timestamp}
+        for i, timestamp in enumerate(timestamps)
+    ])
+    rows = db.query(models.Response).order_by(models.Response.timestamp.desc(), models.Response.id.desc()).all()
+    return [row.id for row in rows]
+
+
+def page_through(db, limit, filters=None):
+    ids, cursor = [], None
+    while True:
+        page = crud.get_responses(db, limit=limit, cursor=cursor, filters=filters)
+        ids += [row.id for row in page]
+        if len(page) < limit:
+            return ids
+        cursor = crud.encode_cursor(page[-1])
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 10, 25, 100])
+def test_cursor_pages_have_no_duplicates_or_gaps(db, responses, limit):
+    assert page_through(db, limit) == responses
+
+
+def test_cursor_pages_respect_filters(db, responses):
+    filters = schemas.ResponseFilters(llm_name="a", min_similarity=0.2)
+    expected = [row.id for row in crud.get_responses(db, limit=100, filters=filters)]
+    assert expected and len(expected) < len(responses)
+    assert page_through(db, 2, filters) == expected
+
+
+def test_cursor_round_trips_the_row_position(db, responses):
+    row = db.get(models.Response, responses[12])
+    assert crud.decode_cursor(crud.encode_cursor(row)) == (row.timestamp, row.id)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm9waXBl", "MjAyNC0wNS0wNnxub3QtYW4taWQ="])
+def test_malformed_cursor_raises_value_error(db, cursor):
+    with pytest.raises(ValueError):
+        crud.get_responses(db, cursor=cursor)
+
+
+def test_api_pages_through_with_next_cursor_header(client, responses):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/responses/", params=params)
+        assert response.status_code == 200
+        ids += [row["id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert ids == responses
+
+
+def test_api_rejects_malformed_cursor_with_400(client):
+    response = client.get("/api/responses/", params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,115 @@
+import pytest
+
+from backend import rate_limit
+from backend.rate_limit import RateLimiter, TokenBucket, estimate_tokens
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def test_bucket_allows_a_full_burst_then_makes_callers_wait(clock):
+    bucket = TokenBucket(60)  # One token a second.
+    assert [bucket.reserve(1) for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    # Each reservation queues behind the ones already waiting.
+    assert bucket.reserve(1) == pytest.approx(2.0)
+
+
+def test_bucket_refills_over_time_up_to_capacity(clock):
+    bucket = TokenBucket(60, capacity=10)
+    assert bucket.reserve(10) == 0.0
+    clock.advance(4)
+    assert bucket.reserve(4) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    clock.advance(3600)
+    assert bucket.reserve(0) == 0.0
+    assert bucket.tokens == 10
+
+
+def test_oversized_reservations_are_capped_at_capacity(clock):
+    bucket = TokenBucket(600)
+    assert bucket.reserve(10_000) == 0.0
+    assert bucket.tokens == 0
+
+
+def test_adjust_charges_and_refunds(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(30)
+    bucket.adjust(-50)  # Refunds never overfill the bucket.
+    assert bucket.tokens == 60
+    bucket.adjust(90)
+    assert bucket.reserve(1) == pytest.approx(31.0)
+
+
+def test_requests_per_minute_blocks_until_refilled(clock):
+    limiter = RateLimiter({"gpt": {"requests_per_minute": 3}})
+    assert [limiter.acquire("gpt") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("gpt") == pytest.approx(20.0)
+    assert clock.sleeps == [pytest.approx(20.0)]
+    # The wait paid for that request; the next one waits for its own token.
+    assert limiter.acquire("gpt") == pytest.approx(20.0)
+    clock.advance(60)
+    assert limiter.acquire("gpt") == 0.0
+
+
+def test_tokens_per_minute_blocks_until_refilled(clock):
+    limiter = RateLimiter({"claude": {"tokens_per_minute": 1200}})
+    assert limiter.acquire("claude", estimated_tokens=1000) == 0.0
+    # 800 more tokens than remain, at 20 a second.
+    assert limiter.acquire("claude", estimated_tokens=1000) == pytest.approx(40.0)
+    clock.advance(60)
+    assert limiter.acquire("claude", estimated_tokens=1200) == 0.0
+    # Calls without an estimate aren't held back by the token budget.
+    assert limiter.acquire("claude") == 0.0
+
+
+def test_the_tighter_of_both_limits_wins(clock):
+    limiter = RateLimiter({"gpt": {"requests_per_minute": 60, "tokens_per_minute": 600}})
+    assert limiter.acquire("gpt", estimated_tokens=600) == 0.0
+    assert limiter.acquire("gpt", estimated_tokens=100) == pytest.approx(10.0)
+    limiter = RateLimiter({"gpt": {"requests_per_minute": 1, "tokens_per_minute": 600}})
+    limiter.acquire("gpt", estimated_tokens=10)
+    assert limiter.acquire("gpt", estimated_tokens=10) == pytest.approx(60.0)
+
+
+def test_record_usage_refunds_unused_tokens(clock):
+    limiter = RateLimiter({"claude": {"tokens_per_minute": 1000}})
+    limiter.acquire("claude", estimated_tokens=1000)
+    limiter.record_usage("claude", 1000, 200)
+    assert limiter.acquire("claude", estimated_tokens=800) == 0.0
+    # Unknown usage and unbudgeted providers change nothing.
+    limiter.record_usage("claude", 1000, None)
+    limiter.record_usage("gpt", 1000, 5000)
+    assert limiter.acquire("claude", estimated_tokens=100) == pytest.approx(6.0)
+
+
+def test_unbudgeted_providers_are_not_limited(clock):
+    limiter = RateLimiter({"gpt": {}, "claude": {"requests_per_minute": None}})
+    assert all(limiter.acquire(name, estimated_tokens=10 ** 6) == 0.0 for name in ("gpt", "claude", "grok") * 100)
+    assert clock.sleeps == []
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("a" * 400, 500) == 601
@@ -0,0 +1,140 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend import retry
+from backend.retry import CircuitBreaker, ProviderNotConfigured, RetryError, call_with_retry, error_kind
+
+
+class APIError(Exception):
+    def __init__(self, status=None, headers=None):
+        super().__init__(f"status {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    """Named like the openai / anthropic connection error."""
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry.time, "sleep", delays.append)
+    return delays
+
+
+def failing(*errors, result="ok"):
+    errors = list(errors)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    call.calls = calls
+    return call
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (ProviderNotConfigured("no key"), "not_configured"),
+    (APIError(429), "rate_limited"),
+    (APIError(503), "server_error"),
+    (APIError(400), "client_error"),
+    (APIError(401), "client_error"),
+    (APIConnectionError(), "connection"),
+    (TimeoutError(), "connection"),
+    (ValueError("bad"), "error"),
+])
+def test_error_kind(exc, kind):
+    assert error_kind(exc) == kind
+
+
+@pytest.mark.parametrize("exc, retryable", [
+    (APIError(408), True), (APIError(429), True), (APIError(500), True),
+    (APIError(400), False), (APIError(404), False),
+    (APIConnectionError(), True), (ProviderNotConfigured(), False), (ValueError(), False),
+])
+def test_is_retryable(exc, retryable):
+    assert retry.is_retryable(exc) == retryable
+
+
+def test_transient_errors_are_retried(sleeps):
+    call = failing(APIError(500), APIConnectionError())
+    assert call_with_retry(call, max_attempts=3) == "ok"
+    assert len(call.calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    call = failing(APIError(400))
+    with pytest.raises(RetryError) as raised:
+        call_with_retry(call, max_attempts=3)
+    assert len(call.calls) == 1
+    assert sleeps == []
+    assert raised.value.attempts == 1
+    assert raised.value.kind == "client_error"
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    call = failing(*[APIError(503)] * 5)
+    with pytest.raises(RetryError) as raised:
+        call_with_retry(call, max_attempts=3)
+    assert len(call.calls) == 3
+    assert raised.value.attempts == 3
+    assert raised.value.kind == "server_error"
+
+
+def test_retry_after_is_a_lower_bound(sleeps, monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BASE_DELAY", 0.1)
+    monkeypatch.setattr(retry, "RETRY_MAX_DELAY", 8)
+    call_with_retry(failing(APIError(429, {"retry-after": "3"})), max_attempts=2)
+    assert 3 <= sleeps[0] <= 8
+
+
+def test_retry_after_is_capped_and_bad_values_ignored(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BASE_DELAY", 0.1)
+    monkeypatch.setattr(retry, "RETRY_MAX_DELAY", 8)
+    assert retry.backoff_delay(1, APIError(429, {"retry-after": "600"})) == 8
+    assert retry.backoff_delay(1, APIError(429, {"retry-after": "soon"})) <= 0.1
+
+
+def test_backoff_grows_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BASE_DELAY", 1)
+    monkeypatch.setattr(retry, "RETRY_MAX_DELAY", 4)
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    assert [retry.backoff_delay(attempt) for attempt in (1, 2, 3, 4)] == [1, 2, 4, 4]
+
+
+def test_async_retry_honours_retry_after(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+    call = failing(APIError(429, {"retry-after": "2"}))
+
+    async def call_async():
+        return call()
+    assert asyncio.run(retry.call_with_retry_async(call_async, max_attempts=2)) == "ok"
+    assert delays and delays[0] >= 2
+
+
+def test_circuit_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3)
+    for _ in range(2):
+        breaker.record("claude", ok=False)
+    assert not breaker.is_open("claude")
+    breaker.record("claude", ok=False)
+    assert breaker.is_open("claude")
+    assert not breaker.is_open("chatgpt")
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record("claude", ok=False)
+    breaker.record("claude", ok=True)
+    breaker.record("claude", ok=False)
+    assert not breaker.is_open("claude")
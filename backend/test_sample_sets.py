@@ -0,0 +1,43 @@
+import pytest
+
+from backend import crud, models
+
+
+def add_sample_set(db):
+    (sample_set,) = crud.create_sample_sets(db, [{
+        "llm_name": "model", "question": "question", "sample_count": 2,
+        "dispersion": 0.1, "centroid_similarity": None, "centroid": b"\0" * 16,
+    }])
+    return sample_set
+
+
+def store_sample(db, sample_set):
+    return crud.create_responses(db, [
+        {"llm_name": "model", "question": "question", "response": "answer",
+         "similarity_score": None, "sample_set_id": sample_set.id}
+    ])
+
+
+def test_sample_sets_are_committed_with_their_responses(db):
+    sample_set = add_sample_set(db)
+    store_sample(db, sample_set)
+    db.rollback()
+
+    (stored,) = crud.get_sample_sets(db)
+    assert stored.id == sample_set.id
+    assert db.query(models.Response).one().sample_set_id == sample_set.id
+
+
+def test_sample_sets_roll_back_with_failed_responses(db, monkeypatch):
+    sample_set = add_sample_set(db)
+    assert sample_set.id is not None
+
+    def fail(db, chunk):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(crud, "set_latest_responses", fail)
+    with pytest.raises(RuntimeError):
+        store_sample(db, sample_set)
+
+    assert db.query(models.SampleSet).count() == 0
+    assert crud.get_sample_sets(db) == []
@@ -0,0 +1,154 @@
+import datetime
+
+import pytest
+
+# sampling imports every provider SDK through collection and llm_client.
+for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+    pytest.importorskip(sdk)
+
+from backend import crud, models, sampling  # noqa: E402
+from backend.llm_client import ProviderResult  # noqa: E402
+
+HOUR = 3600
+NOW = datetime.datetime(2024, 5, 6, 12, 0, 0)
+MIN, MAX = sampling.MIN_INTERVAL_SECONDS, sampling.MAX_INTERVAL_SECONDS
+PROVIDERS = {"gpt": None, "claude": None}
+
+
+def test_stable_pairs_back_off_up_to_the_maximum():
+    interval, intervals = MIN, []
+    for _ in range(8):
+        interval = sampling.next_interval(interval, 0.99, version_changed=False)
+        intervals.append(interval)
+    assert intervals[:4] == [MIN * sampling.SAMPLING_BACKOFF ** n for n in range(1, 5)]
+    assert intervals[-1] == MAX
+    assert intervals == sorted(intervals)
+
+
+def test_drop_or_new_version_resets_the_interval():
+    assert sampling.next_interval(MAX, sampling.DRIFT_SIMILARITY - 0.01, version_changed=False) == MIN
+    assert sampling.next_interval(MAX, 0.99, version_changed=True) == MIN
+    assert sampling.next_interval(MAX, None, version_changed=True) == MIN
+
+
+def test_in_between_or_unscored_keeps_the_interval():
+    between = (sampling.DRIFT_SIMILARITY + sampling.STABLE_SIMILARITY) / 2
+    assert sampling.next_interval(48 * HOUR, between, version_changed=False) == 48 * HOUR
+    assert sampling.next_interval(48 * HOUR, None, version_changed=False) == 48 * HOUR
+    # Intervals outside the configured range are pulled back into it.
+    assert sampling.next_interval(MIN / 2, None, version_changed=False) == MIN
+    assert sampling.next_interval(MAX * 2, between, version_changed=False) == MAX
+
+
+def state(db, llm_name="gpt", question="q1"):
+    return db.get(models.SamplingState, (llm_name, question))
+
+
+def record(db, similarity, now, model="gpt-4-0613", ok=True, llm_name="gpt", question="q1"):
+    result = ProviderResult(text="answer", model=model) if ok else ProviderResult(error="HTTP 503", error_kind="server_error")
+    sampling.record_results(db, [(question, llm_name, result)], {(llm_name, question): similarity}, now=now)
+    return state(db, llm_name, question)
+
+
+def test_record_results_backs_off_and_resets(db):
+    now, intervals = NOW, []
+    for _ in range(4):
+        current = record(db, 0.99, now)
+        intervals.append(current.interval_seconds)
+        assert current.next_due == now + datetime.timedelta(seconds=current.interval_seconds)
+        now = current.next_due
+    # The first sample starts at the minimum; each stable one after doubles it.
+    assert intervals == [MIN, 2 * MIN, 4 * MIN, 8 * MIN]
+
+    assert record(db, 0.5, now).interval_seconds == MIN
+    record(db, 0.99, now)
+    assert record(db, 0.99, now, model="gpt-4-1106").interval_seconds == MIN
+    assert state(db).model_version == "gpt-4-1106"
+
+
+def test_failed_calls_retry_after_the_minimum_without_changing_the_interval(db):
+    record(db, 0.99, NOW)
+    before = record(db, 0.99, NOW).interval_seconds
+    failed = record(db, None, NOW, ok=False)
+    assert failed.interval_seconds == before
+    assert failed.next_due == NOW + datetime.timedelta(seconds=MIN)
+    assert failed.last_similarity == 0.99
+
+
+def test_a_pair_sampled_several_times_is_rescheduled_once(db):
+    record(db, 0.99, NOW)
+    samples = [ProviderResult(error="HTTP 503", error_kind="server_error"), ProviderResult(text="answer", model="gpt-4-0613")]
+    sampling.record_results(db, [("q1", "gpt", result) for result in samples], {("gpt", "q1"): 0.99}, now=NOW)
+    # One success among the samples counts as a stable sample of the pair.
+    assert state(db).interval_seconds == 2 * MIN
+    assert state(db).last_sampled_at == NOW
+
+
+def schedule(db, llm_name, question, hours_overdue, interval_hours=6):
+    db.add(models.SamplingState(
+        llm_name=llm_name, question=question, interval_seconds=interval_hours * HOUR,
+        next_due=NOW - datetime.timedelta(hours=hours_overdue)
+    ))
+    db.commit()
+
+
+def test_due_pairs_are_selected_in_task_order(db):
+    schedule(db, "gpt", "q1", hours_overdue=-1)  # Not due for another hour.
+    schedule(db, "claude", "q1", hours_overdue=0)
+    schedule(db, "gpt", "q2", hours_overdue=3)
+    # claude/q2 has never been sampled.
+    assert sampling.select_due_tasks(db, ["q1", "q2"], PROVIDERS, now=NOW) == [
+        ("q1", "claude"), ("q2", "gpt"), ("q2", "claude")
+    ]
+
+
+def spend_calls(db, count, hours_ago, error_kind=None):
+    timestamp = NOW - datetime.timedelta(hours=hours_ago)
+    if error_kind is None:
+        crud.create_responses(db, [
+            {"llm_name": "gpt", "question": f"spent {i}", "response": "answer", "similarity_score": None,
+             "timestamp": timestamp} for i in range(count)
+        ])
+    else:
+        db.add_all([models.ProviderFailure(llm_name="gpt", question="spent", error_kind=error_kind, timestamp=timestamp)
+                    for _ in range(count)])
+        db.commit()
+
+
+def test_call_allowance_is_unlimited_without_a_budget(db, monkeypatch):
+    monkeypatch.setattr(sampling, "DAILY_CALL_BUDGET", 0)
+    assert sampling.call_allowance(db, NOW) is None
+
+
+def test_call_allowance_paces_and_caps_the_budget(db, monkeypatch):
+    monkeypatch.setattr(sampling, "DAILY_CALL_BUDGET", 48)
+    monkeypatch.setattr(sampling, "SAMPLING_TICK_MINUTES", 60)
+    # 48 calls a day over 24 hourly ticks.
+    assert sampling.call_allowance(db, NOW) == 2
+
+    spend_calls(db, 40, hours_ago=2)
+    spend_calls(db, 5, hours_ago=3, error_kind="server_error")
+    # Calls that never reached a provider, or made over a day ago, cost nothing.
+    spend_calls(db, 10, hours_ago=1, error_kind="not_configured")
+    spend_calls(db, 10, hours_ago=25)
+    assert sampling.calls_since(db, NOW - datetime.timedelta(days=1)) == 45
+    assert sampling.call_allowance(db, NOW) == 2
+    spend_calls(db, 2, hours_ago=1)
+    assert sampling.call_allowance(db, NOW) == 1
+    spend_calls(db, 5, hours_ago=1, error_kind="timeout")
+    assert sampling.call_allowance(db, NOW) == 0
+
+
+def test_budget_picks_the_most_overdue_pairs(db, monkeypatch):
+    monkeypatch.setattr(sampling, "DAILY_CALL_BUDGET", 48)
+    monkeypatch.setattr(sampling, "SAMPLING_TICK_MINUTES", 60)
+    schedule(db, "gpt", "q1", hours_overdue=1)
+    schedule(db, "claude", "q1", hours_overdue=2, interval_hours=48)  # Late by 1/24 of its interval.
+    schedule(db, "gpt", "q2", hours_overdue=3)
+    # claude/q2 has never been sampled, so it goes first.
+    assert sampling.select_due_tasks(db, ["q1", "q2"], PROVIDERS, now=NOW) == [("q2", "gpt"), ("q2", "claude")]
+    # Each pair sampled twice costs two calls, so only one fits.
+    assert sampling.select_due_tasks(db, ["q1", "q2"], PROVIDERS, now=NOW, calls_per_pair=2) == [("q2", "claude")]
+
+    spend_calls(db, 48, hours_ago=1)
+    assert sampling.select_due_tasks(db, ["q1", "q2"], PROVIDERS, now=NOW) == []
@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+
+# The scheduler imports every provider SDK through llm_client.
+for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+    pytest.importorskip(sdk)
+
+from backend import compression, models, scheduler, vector_index  # noqa: E402
+from backend.analysis import EMBEDDING_MODEL_NAME, embedding_to_bytes  # noqa: E402
+from backend.llm_client import ProviderResult, empty_response  # noqa: E402
+from backend.vector_index import VectorIndex  # noqa: E402
+
+
+@pytest.fixture
+def store(session_factory, tmp_path, monkeypatch):
+    """Runs store_results against an in-memory database and a scratch vector index."""
+    monkeypatch.setattr(scheduler, "SessionLocal", session_factory)
+    monkeypatch.setattr(vector_index, "_index", VectorIndex(str(tmp_path / "index")))
+    return scheduler.store_results
+
+
+def test_skipped_calls_are_not_stored_as_failures(store, db):
+    store([
+        ("q1", "mistral", ProviderResult(error="Mistral API key not configured.", error_kind="not_configured")),
+        ("q2", "mistral", ProviderResult(error="Mistral API key not configured.", error_kind="not_configured")),
+        ("q1", "claude", ProviderResult(error="Skipped", error_kind="circuit_open")),
+        ("q2", "claude", ProviderResult(error="HTTP 503", error_kind="server_error", attempts=3)),
+    ])
+
+    (failure,) = db.query(models.ProviderFailure).all()
+    assert (failure.llm_name, failure.question, failure.error_kind, failure.attempts) == ("claude", "q2", "server_error", 3)
+
+
+
+def test_empty_responses_are_stored_as_failures(store, db):
+    store([("q1", "gemini", empty_response("gemini-1.5-pro"))])
+
+    assert db.query(models.Response).count() == 0
+    (failure,) = db.query(models.ProviderFailure).all()
+    assert (failure.llm_name, failure.error_kind) == ("gemini", "empty_response")
+
+def fake_embedding(text, dim=8):
+    vector = np.random.default_rng(abs(hash(text)) % 2 ** 32).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """Replaces the embedding model, recording the texts of every call."""
+    calls = []
+
+    def encode_texts(texts):
+        calls.append(list(texts))
+        return np.stack([fake_embedding(text) for text in texts])
+    monkeypatch.setattr(scheduler, "encode_texts", encode_texts)
+    return calls
+
+
+def previous(text, stored_as_blob=True, embedded=True):
+    response = models.Response(llm_name="model", question="question", response=text)
+    if stored_as_blob:
+        response.content_hash = compression.content_hash(text)
+        response.response_text = None
+    if embedded:
+        response.embedding = embedding_to_bytes(fake_embedding(text))
+        response.embedding_model = EMBEDDING_MODEL_NAME
+    return response
+
+
+def test_unchanged_text_scores_one_without_encoding(encoded):
+    scored = scheduler.embed_and_score([
+        ("q1", "a", "same answer", previous("same answer")),
+        ("q2", "a", "legacy answer", previous("legacy answer", stored_as_blob=False)),
+        ("q3", "a", "new answer", previous("old answer")),
+    ])
+
+    assert encoded == [["new answer"]]
+    assert [similarity for _, similarity in scored[:2]] == [1.0, 1.0]
+    assert scored[0][0] == pytest.approx(fake_embedding("same answer"), abs=1e-3)
+    assert scored[2][1] == pytest.approx(fake_embedding("old answer") @ fake_embedding("new answer"), abs=1e-3)
+
+
+def test_unchanged_text_without_stored_embedding_is_encoded_once_for_both(encoded):
+    last = previous("same answer", embedded=False)
+    ((embedding, similarity),) = scheduler.embed_and_score([("q1", "a", "same answer", last)])
+
+    assert encoded == [["same answer"]]
+    assert similarity == 1.0
+    assert last.embedding == embedding_to_bytes(embedding)
+
+
+def test_duplicate_texts_in_a_run_are_encoded_once(encoded):
+    scored = scheduler.embed_and_score([
+        ("q1", "a", "shared answer", None),
+        ("q1", "b", "shared answer", None),
+        ("q2", "a", "other answer", previous("older answer")),
+    ])
+
+    assert encoded == [["shared answer", "other answer"]]
+    assert scored[0][0] == pytest.approx(scored[1][0])
+    assert scored[0][1] is None
+
+
+def test_lexical_scores_compare_with_the_previous_response():
+    last = previous("the quick brown fox jumps over the lazy dog", stored_as_blob=False)
+    scores = scheduler.lexical_scores([
+        ("q1", "a", "the quick brown fox jumps over the lazy dog", last),
+        ("q2", "a", "first answer", None),
+    ])
+
+    assert scores[0][1] == 1.0
+    assert last.simhash == scores[0][0]
+    assert scores[1][1] is None
+
+
+def sampled_run(samples=2):
+    return [(question, llm_name, ProviderResult(text=f"{llm_name} on {question}, sample {sample}"))
+            for question in ("q1", "q2") for llm_name in ("a", "b") for sample in range(samples)]
+
+
+@pytest.fixture
+def chunked(monkeypatch):
+    monkeypatch.setattr(scheduler, "SAMPLES_PER_RUN", 2)
+    monkeypatch.setattr(scheduler, "DB_WRITE_CHUNK_SIZE", 3)
+
+
+def test_chunked_run_writes_each_record_with_its_responses(store, db, encoded, chunked):
+    store(sampled_run())
+
+    responses = db.query(models.Response).order_by(models.Response.id).all()
+    sample_sets = {(s.llm_name, s.question): s.id for s in db.query(models.SampleSet)}
+    assert len(sample_sets) == 4
+    assert [r.sample_set_id for r in responses] == [sample_sets[(r.llm_name, r.question)] for r in responses]
+    assert {m.question for m in db.query(models.AgreementMatrix)} == {"q1", "q2"}
+    assert {(b.llm_name, b.question, b.count) for b in db.query(models.DriftBaseline)} == {
+        ("a", "q1", 2), ("b", "q1", 2), ("a", "q2", 2), ("b", "q2", 2),
+    }
+    # Each pair's second sample is scored against the baseline its first started.
+    assert [r.baseline_similarity is None for r in responses] == [True, False] * 4
+
+
+def test_failed_chunk_leaves_no_records_for_its_responses(store, db, encoded, chunked, monkeypatch):
+    set_latest_responses = scheduler.crud.set_latest_responses
+    chunks = []
+
+    def fail_third_chunk(db, chunk):
+        chunks.append(chunk)
+        if len(chunks) == 3:
+            raise RuntimeError("disk full")
+        set_latest_responses(db, chunk)
+    monkeypatch.setattr(scheduler.crud, "set_latest_responses", fail_third_chunk)
+
+    with pytest.raises(RuntimeError):
+        store(sampled_run())
+
+    # Rows 0-5 were committed in two chunks; (b, q2) was in the chunk that failed.
+    stored = {(r.llm_name, r.question) for r in db.query(models.Response)}
+    assert stored == {("a", "q1"), ("b", "q1"), ("a", "q2")}
+    assert {(s.llm_name, s.question) for s in db.query(models.SampleSet)} == stored
+    assert all(r.sample_set_id is not None for r in db.query(models.Response))
+    # q2 was only half answered, so only q1 has a matrix.
+    assert [m.question for m in db.query(models.AgreementMatrix)] == ["q1"]
+    assert {(b.llm_name, b.question, b.count) for b in db.query(models.DriftBaseline)} == {
+        ("a", "q1", 2), ("b", "q1", 2), ("a", "q2", 2),
+    }
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+
+from backend.sqlite_pool import SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "collector.db"), size=2, timeout=1.0)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE responses (id INTEGER PRIMARY KEY, text TEXT)")
+    yield pool
+    pool.close()
+
+
+def test_connections_use_wal_and_are_reused(pool):
+    with pool.connection() as conn:
+        first = conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    with pool.connection() as conn:
+        assert conn is first
+
+
+def test_pool_never_opens_more_than_its_size(pool):
+    first, second = pool._acquire(), pool._acquire()
+    assert first is not second
+    borrowed = []
+    # Both connections are out, so a third caller waits for one to come back.
+    waiting = threading.Thread(target=lambda: borrowed.append(pool._acquire()), daemon=True)
+    waiting.start()
+    waiting.join(0.1)
+    assert waiting.is_alive()
+    pool._idle.put(first)
+    waiting.join(1)
+    assert borrowed == [first]
+    assert pool._created == 2
+    pool._idle.put(first)
+    pool._idle.put(second)
+
+
+def test_commits_on_success_and_rolls_back_on_error(pool):
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO responses (text) VALUES ('kept')")
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO responses (text) VALUES ('lost')")
+            raise RuntimeError("failed mid-write")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT text FROM responses").fetchall() == [("kept",)]
+
+
+def test_an_open_reader_does_not_block_a_write(pool):
+    with pool.connection() as writer:
+        writer.execute("INSERT INTO responses (text) VALUES ('before')")
+    # A reader in the middle of a query, like show_responses.py or the API.
+    reader = sqlite3.connect(pool.path, timeout=0, isolation_level=None)
+    try:
+        reader.execute("BEGIN")
+        assert reader.execute("SELECT text FROM responses").fetchall() == [("before",)]
+        # Outside WAL mode this commit would fail with "database is locked".
+        with pool.connection() as writer:
+            writer.execute("INSERT INTO responses (text) VALUES ('after')")
+        assert reader.execute("SELECT text FROM responses").fetchall() == [("before",)]
+        reader.execute("COMMIT")
+        assert reader.execute("SELECT text FROM responses").fetchall() == [("before",), ("after",)]
+    finally:
+        reader.close()
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+# main imports every provider SDK through the scheduler.
+for sdk in ("openai", "anthropic", "mistralai", "google.generativeai"):
+    pytest.importorskip(sdk)
+
+from backend import crud, main, models, scheduler  # noqa: E402
+
+
+@pytest.fixture
+def stale_db(session_factory, db, monkeypatch):
+    """A database written by an older version: responses without their index or rollups."""
+    monkeypatch.setattr(scheduler, "SessionLocal", session_factory)
+    monkeypatch.setattr(scheduler, "_tables_ready", threading.Event())
+    db.add_all([models.Response(llm_name="model", question=f"q{i % 2}", response_text=f"answer {i}")
+                for i in range(4)])
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Runs the startup hook with the model, vector index and scheduler stubbed out."""
+    monkeypatch.setattr(main, "start_warm_up", lambda: None)
+    monkeypatch.setattr(main.vector_index, "start_sync", lambda: None)
+    monkeypatch.setattr(main.scheduler, "start", lambda: None)
+    monkeypatch.setattr(main, "is_model_ready", lambda: True)
+    threads = []
+    monkeypatch.setattr(main, "start_table_rebuild", lambda: threads.append(scheduler.start_table_rebuild()))
+
+    def start():
+        main.startup_event()
+        return threads[0]
+    return start
+
+
+def test_ensure_tables_rebuilds_what_is_missing(stale_db):
+    assert crud.latest_responses_missing(stale_db) and crud.drift_rollups_missing(stale_db)
+    scheduler.ensure_tables()
+    assert scheduler.tables_ready()
+    assert not crud.latest_responses_missing(stale_db)
+    assert not crud.drift_rollups_missing(stale_db)
+    assert stale_db.query(models.LatestResponse).count() == 2
+
+
+def test_startup_does_not_wait_for_the_rebuild(stale_db, started, client, monkeypatch):
+    release = threading.Event()
+    rebuild = crud.rebuild_latest_responses
+
+    def slow_rebuild(db):
+        release.wait(5)
+        rebuild(db)
+    monkeypatch.setattr(crud, "rebuild_latest_responses", slow_rebuild)
+
+    thread = started()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "warming_up", "model_ready": True, "tables_ready": False}
+
+    release.set()
+    thread.join(5)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["tables_ready"] is True
+    assert not crud.drift_rollups_missing(stale_db)
+
+
+def test_failed_rebuild_is_reported_not_raised(stale_db, started, client, monkeypatch):
+    def broken(db):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(crud, "rebuild_latest_responses", broken)
+
+    started().join(5)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["tables_ready"] is False
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from backend import tracing
+from backend.tracing import RunTrace, load_traces, summarize
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path / "traces"))
+    return tmp_path / "traces"
+
+
+def test_disabled_trace_records_nothing(trace_dir):
+    trace = RunTrace("scheduler", enabled=False)
+    with trace.span("embedding"):
+        pass
+    trace.add_span("provider_call", 1.0, question="q1", provider="gpt")
+    assert trace.spans == []
+    assert trace.finish() is None
+    assert not trace_dir.exists()
+
+
+def test_enabled_trace_is_written_as_json(trace_dir):
+    trace = RunTrace("scheduler", enabled=True)
+    with trace.span("db_write", rows=3):
+        pass
+    trace.add_span("provider_call", 1.5, question="q1", provider="gpt", error="timeout")
+    path = trace.finish()
+
+    with open(path) as f:
+        written = json.load(f)
+    assert path.startswith(str(trace_dir))
+    assert written["name"] == "scheduler"
+    assert written["run_id"] == trace.run_id
+    assert written["duration"] >= 0
+    db_write, call = written["spans"]
+    assert (db_write["stage"], db_write["rows"]) == ("db_write", 3)
+    assert db_write["offset"] >= 0
+    assert call == {"stage": "provider_call", "duration": 1.5, "question": "q1", "provider": "gpt", "error": "timeout"}
+
+
+def test_span_is_recorded_when_the_block_raises():
+    trace = RunTrace("collector", enabled=True)
+    with pytest.raises(ValueError):
+        with trace.span("similarity"):
+            raise ValueError("bad embedding")
+    assert [span["stage"] for span in trace.spans] == ["similarity"]
+
+
+def fake_trace(run_id, duration, spans):
+    return {"run_id": run_id, "name": "scheduler", "duration": duration,
+            "spans": [{"stage": stage, "duration": seconds, "question": "q1", "provider": "gpt"}
+                      for stage, seconds in spans]}
+
+
+def test_summary_reports_stage_shares_and_slowest_spans():
+    traces = [
+        fake_trace("run-a", 10.0, [("provider_call", 6.0), ("embedding", 2.0)]),
+        fake_trace("run-b", 10.0, [("provider_call", 4.0), ("db_write", 1.0)]),
+    ]
+    lines = summarize(traces, top=2).splitlines()
+
+    assert lines[0] == "2 runs, 20.0s total wall-clock time"
+    stages = [line.split()[0] for line in lines[3:6]]
+    assert stages == ["provider_call", "embedding", "db_write"]
+    assert lines[3].split()[1:] == ["2", "10.00", "5.000", "50.0%"]
+    slowest = lines[lines.index("Slowest 2 spans:") + 1:]
+    assert [line.split()[0] for line in slowest] == ["6.000s", "4.000s"]
+    assert "[run-a]" in slowest[0]
+
+
+def test_load_traces_expands_directories(trace_dir):
+    for _ in range(2):
+        RunTrace("scheduler", enabled=True).finish()
+    (trace_dir / "notes.txt").write_text("not a trace")
+    single = RunTrace("collector", enabled=True).finish()
+
+    assert len(load_traces([str(trace_dir)])) == 3
+    assert [trace["name"] for trace in load_traces([single])] == ["collector"]
@@ -0,0 +1,78 @@
+import importlib
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from backend import transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests.
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def silent_server():
+    """Accepts connections and never answers, like a hung provider."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    yield listener
+    listener.close()
+
+
+@pytest.fixture
+def configured(monkeypatch):
+    """Reloads the transport with settings from the environment, restoring it afterwards."""
+    def configure(**settings):
+        for name, value in settings.items():
+            monkeypatch.setenv(name, str(value))
+        transport.close()
+        return importlib.reload(transport)
+
+    yield configure
+    monkeypatch.undo()
+    transport.close()
+    importlib.reload(transport)
+
+
+def test_requests_share_one_keep_alive_connection(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    for _ in range(5):
+        assert transport.http_client.get(url).text == "ok"
+    assert len(server.connections) == 1
+
+
+def test_timeouts_come_from_the_environment(configured):
+    module = configured(HTTP_CONNECT_TIMEOUT=3, HTTP_READ_TIMEOUT=45, HTTP_MAX_CONNECTIONS=8)
+    timeout = module.http_client.timeout
+    assert (timeout.connect, timeout.read, timeout.write, timeout.pool) == (3, 45, 45, 45)
+    assert module.LIMITS.max_connections == 8
+
+
+def test_hung_provider_times_out(configured, silent_server):
+    module = configured(HTTP_READ_TIMEOUT=0.2)
+    with pytest.raises(httpx.ReadTimeout):
+        module.http_client.get(f"http://127.0.0.1:{silent_server.getsockname()[1]}/")
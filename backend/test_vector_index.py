@@ -0,0 +1,92 @@
+import numpy as np
+
+from backend import crud, vector_index
+from backend.analysis import EMBEDDING_MODEL_NAME, embedding_to_bytes
+from backend.vector_index import VectorIndex
+
+
+def random_unit_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def store_responses(db, embeddings):
+    rows = [
+        {
+            "llm_name": "model",
+            "question": f"question {i}",
+            "response": f"answer {i}",
+            "similarity_score": None,
+            "embedding": None if embedding is None else embedding_to_bytes(embedding),
+            "embedding_model": None if embedding is None else EMBEDDING_MODEL_NAME,
+        }
+        for i, embedding in enumerate(embeddings)
+    ]
+    return [row.id for row in crud.create_responses(db, rows)]
+
+
+def test_sync_indexes_ids_below_one_added_first(db, tmp_path):
+    embeddings = random_unit_vectors(50)
+    ids = store_responses(db, embeddings)
+    index = VectorIndex(str(tmp_path))
+
+    # A run's add landing before the startup sync has worked through history.
+    assert index.add([ids[-1]], embeddings[-1:]) == 1
+    assert index.sync(db) == len(ids) - 1
+    assert index.contains(ids).all()
+    assert len(index) == len(ids)
+    assert index.sync(db) == 0
+
+
+def test_sync_picks_up_embeddings_filled_in_later(db, tmp_path):
+    embeddings = random_unit_vectors(10)
+    ids = store_responses(db, [None] * 5 + list(embeddings[5:]))
+    index = VectorIndex(str(tmp_path))
+    assert index.sync(db) == 5
+
+    for response_id, embedding in zip(ids[:5], embeddings[:5]):
+        db.get(vector_index.models.Response, response_id).embedding = embedding_to_bytes(embedding)
+        db.get(vector_index.models.Response, response_id).embedding_model = EMBEDDING_MODEL_NAME
+    db.commit()
+    assert index.sync(db) == 5
+    assert index.contains(ids).all()
+
+
+def test_add_skips_indexed_and_repeated_ids(tmp_path):
+    embeddings = random_unit_vectors(3)
+    index = VectorIndex(str(tmp_path))
+    assert index.add([5, 5, 7], embeddings) == 2
+    assert index.add([7, 3], embeddings[:2]) == 1
+    assert sorted(index.ids.tolist()) == [3, 5, 7]
+
+
+def test_search_returns_nearest_first(tmp_path):
+    embeddings = random_unit_vectors(200)
+    index = VectorIndex(str(tmp_path))
+    index.add(np.arange(1, 201), embeddings)
+
+    results = index.search(embeddings[41], k=3)
+    assert results[0][0] == 42
+    assert results[0][1] > 0.99
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert 42 not in [response_id for response_id, _ in index.search(embeddings[41], k=3, exclude_ids=[42])]
+
+
+def test_index_persists_across_instances(tmp_path):
+    embeddings = random_unit_vectors(4)
+    VectorIndex(str(tmp_path)).add([1, 2, 3, 4], embeddings)
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened) == 4
+    assert reopened.contains([1, 4, 5]).tolist() == [True, True, False]
+
+
+def test_trained_index_keeps_finding_exact_matches(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "MIN_TRAIN_SIZE", 64)
+    embeddings = random_unit_vectors(400, dim=16)
+    index = VectorIndex(str(tmp_path))
+    for start in range(0, 400, 50):
+        index.add(np.arange(start, start + 50) + 1, embeddings[start:start + 50])
+
+    assert index.centroids is not None
+    for row in (0, 123, 399):
+        assert index.search(embeddings[row], k=1, nprobe=len(index.centroids))[0][0] == row + 1
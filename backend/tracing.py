@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing traces for collection runs.
+
+Set TRACE_RUNS=1 to have every scheduler and collector run write a JSON trace
+to TRACE_DIR (default: traces/). Summarise them with:
+
+    python backend/tracing.py [trace files or directories] [--top N]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+TRACE_RUNS = os.getenv("TRACE_RUNS", "").lower() in ("1", "true", "yes")
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+
+
+class RunTrace:
+    """
+    Collects timed spans for one run and writes them out as JSON.
+
+    Each span has a stage (e.g. provider_call, embedding, db_write), a
+    duration and, where it applies, the question and provider it belongs to.
+    When tracing is disabled every method is a cheap no-op.
+    """
+
+    def __init__(self, name: str, enabled: Optional[bool] = None):
+        self.name = name
+        self.enabled = TRACE_RUNS if enabled is None else enabled
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, duration: float, question: str = None, provider: str = None, **attributes):
+        """Records a span whose duration was measured elsewhere."""
+        if not self.enabled:
+            return
+        span = {"stage": stage, "duration": duration, "question": question, "provider": provider}
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, stage: str, question: str = None, provider: str = None, **attributes):
+        """Times the enclosed block as one span."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(stage, time.perf_counter() - started, question, provider,
+                          offset=started - self._started, **attributes)
+
+    def finish(self) -> Optional[str]:
+        """Writes the trace to TRACE_DIR and returns its path, if tracing is enabled."""
+        if not self.enabled:
+            return None
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{self.name}-{self.run_id}.json")
+        with open(path, "w") as f:
+            json.dump({
+                "run_id": self.run_id,
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "duration": time.perf_counter() - self._started,
+                "spans": self.spans,
+            }, f, indent=1)
+        return path
+
+
+def load_traces(paths: List[str]) -> List[Dict]:
+    """Loads trace files, expanding directories to the JSON files they contain."""
+    traces = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+        else:
+            files = [path]
+        for file in files:
+            with open(file) as f:
+                traces.append(json.load(f))
+    return traces
+
+
+def summarize(traces: List[Dict], top: int = 10) -> str:
+    """Reports the share of run time spent per stage and the slowest individual spans."""
+    lines = []
+    run_time = sum(trace["duration"] for trace in traces)
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+    for trace in traces:
+        for span in trace["spans"]:
+            totals[span["stage"]] += span["duration"]
+            counts[span["stage"]] += 1
+
+    lines.append(f"{len(traces)} runs, {run_time:.1f}s total wall-clock time")
+    lines.append("")
+    lines.append(f"{'stage':<16}{'spans':>8}{'total s':>10}{'mean s':>10}{'% of run':>10}")
+    for stage, total in sorted(totals.items(), key=lambda item: -item[1]):
+        share = 100 * total / run_time if run_time else 0.0
+        lines.append(f"{stage:<16}{counts[stage]:>8}{total:>10.2f}{total / counts[stage]:>10.3f}{share:>9.1f}%")
+    lines.append("(Provider calls overlap, so their share can exceed 100%.)")
+
+    spans = [(trace["run_id"], span) for trace in traces for span in trace["spans"]]
+    spans.sort(key=lambda item: -item[1]["duration"])
+    lines.append("")
+    lines.append(f"Slowest {min(top, len(spans))} spans:")
+    for run_id, span in spans[:top]:
+        where = " / ".join(part for part in (span.get("provider"), (span.get("question") or "")[:50]) if part)
+        lines.append(f"  {span['duration']:8.3f}s  {span['stage']:<14} {where}  [{run_id}]")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=[TRACE_DIR], help="Trace files or directories.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest spans to list.")
+    args = parser.parse_args()
+
+    traces = load_traces(args.paths)
+    if not traces:
+        print("No traces found.")
+        return
+    print(summarize(traces, top=args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+
+import httpx
+
+# Explicit timeouts so a hung provider socket can never stall a run.
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install 'httpx[http2]')."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+TIMEOUT = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+    keepalive_expiry=60,
+)
+
+# One keep-alive pool shared by every provider, so repeated calls to the same
+# host reuse connections instead of paying for DNS and a TLS handshake each time.
+http_client = httpx.Client(http2=http2_available(), timeout=TIMEOUT, limits=LIMITS)
+
+# The async counterpart, used by the async providers on the API's event loop.
+async_http_client = httpx.AsyncClient(http2=http2_available(), timeout=TIMEOUT, limits=LIMITS)
+
+def close():
+    """Closes all pooled connections."""
+    http_client.close()
+
+async def aclose():
+    """Closes all pooled async connections."""
+    await async_http_client.aclose()
@@ -0,0 +1,335 @@
+"""
+Approximate nearest-neighbour index over stored response embeddings.
+
+An IVF (inverted file) index: embeddings are appended to a memory-mapped
+float16 matrix on disk, clustered by spherical k-means, and a query only scores
+the rows in the few clusters whose centroids are closest to it. New responses
+are appended after every run; the clustering is retrained once the index has
+grown well past the size it was trained on.
+
+Usage:
+    python -m backend.vector_index [--rebuild]
+"""
+import argparse
+import json
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+from .analysis import EMBEDDING_MODEL_NAME, EMBEDDING_STORAGE_DTYPE, embedding_from_bytes
+from .database import SessionLocal
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+# Clusters scored per query; higher is more accurate and slower.
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+
+# Below this many vectors everything lives in a single list, i.e. exact search.
+MIN_TRAIN_SIZE = 1024
+# Retrain once the index holds this many times the vectors it was trained on.
+RETRAIN_GROWTH = 4
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 65536
+CHUNK_SIZE = 65536
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Clusters unit vectors with spherical k-means and returns unit centroids of shape (nlist, dim)."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_SAMPLE_SIZE:
+        vectors = vectors[np.sort(rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # Reseed empty clusters with random points so every list gets used.
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalise(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    An IVF index stored as flat files in `path`:
+
+        vectors.f16      float16 rows, memory-mapped
+        ids.i64          the response id of each row
+        assignments.i32  the cluster of each row
+        centroids.npy    unit cluster centroids
+        meta.json        dimension, row count, trained size and embedding model
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or VECTOR_INDEX_DIR
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._load()
+        if self.meta["embedding_model"] != EMBEDDING_MODEL_NAME:
+            print(f"Vector index was built with {self.meta['embedding_model']}; discarding it.")
+            self.clear()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            self._meta_mtime = os.path.getmtime(meta_path)
+        else:
+            self.meta = {"dim": None, "count": 0, "trained_count": 0, "embedding_model": EMBEDDING_MODEL_NAME}
+        self.centroids = np.load(self._file("centroids.npy")) if self.meta["trained_count"] else None
+        self._map_files()
+
+    def _map_files(self):
+        count, dim = self.meta["count"], self.meta["dim"]
+        if not count:
+            self.vectors = np.zeros((0, dim or 0), dtype=EMBEDDING_STORAGE_DTYPE)
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.assignments = np.zeros(0, dtype=np.int32)
+        else:
+            self.vectors = np.memmap(self._file("vectors.f16"), dtype=EMBEDDING_STORAGE_DTYPE, mode="r",
+                                     shape=(count, dim))
+            self.ids = np.memmap(self._file("ids.i64"), dtype=np.int64, mode="r", shape=(count,))
+            self.assignments = np.memmap(self._file("assignments.i32"), dtype=np.int32, mode="r", shape=(count,))
+        # Sorted copy of the indexed ids, for membership checks.
+        self._indexed_ids = np.sort(np.asarray(self.ids))
+        # Inverted lists: the rows of each cluster.
+        order = np.argsort(self.assignments, kind="stable")
+        nlist = len(self.centroids) if self.centroids is not None else 1
+        bounds = np.searchsorted(self.assignments[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    def _save_meta(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_mtime = os.path.getmtime(self._file("meta.json"))
+
+    def reload_if_changed(self):
+        """Picks up changes written by another process, such as a CLI rebuild."""
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path) and os.path.getmtime(meta_path) != self._meta_mtime:
+            with self._lock:
+                self._load()
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Returns the nearest centroid of each vector, reading large inputs in chunks."""
+        assignments = np.zeros(len(vectors), dtype=np.int32)
+        if self.centroids is None:
+            return assignments
+        for start in range(0, len(vectors), CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + CHUNK_SIZE], dtype=np.float32)
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def contains(self, response_ids: Sequence[int]) -> np.ndarray:
+        """Returns whether each response id is already in the index."""
+        response_ids = np.asarray(response_ids, dtype=np.int64)
+        positions = np.searchsorted(self._indexed_ids, response_ids)
+        found = positions < len(self._indexed_ids)
+        found[found] = self._indexed_ids[positions[found]] == response_ids[found]
+        return found
+
+    def add(self, response_ids: Sequence[int], embeddings: np.ndarray) -> int:
+        """
+        Appends embeddings for responses not yet indexed and returns how many were added.
+
+        Responses already in the index are skipped, whatever order ids arrive
+        in, so repeated or overlapping calls are harmless.
+        """
+        with self._lock:
+            response_ids = np.asarray(response_ids, dtype=np.int64)
+            embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(response_ids), -1)
+            _, first = np.unique(response_ids, return_index=True)
+            keep = np.zeros(len(response_ids), dtype=bool)
+            keep[first] = True
+            keep &= ~self.contains(response_ids)
+            response_ids, embeddings = response_ids[keep], embeddings[keep]
+            if not len(response_ids):
+                return 0
+            if self.meta["dim"] is None:
+                self.meta["dim"] = embeddings.shape[1]
+
+            os.makedirs(self.path, exist_ok=True)
+            self._truncate_to_count()
+            with open(self._file("vectors.f16"), "ab") as f:
+                f.write(np.ascontiguousarray(embeddings, dtype=EMBEDDING_STORAGE_DTYPE).tobytes())
+            with open(self._file("ids.i64"), "ab") as f:
+                f.write(response_ids.tobytes())
+            with open(self._file("assignments.i32"), "ab") as f:
+                f.write(self._assign(embeddings).tobytes())
+            self.meta["count"] += len(response_ids)
+
+            if self._needs_training():
+                self._train()
+            self._save_meta()
+            self._map_files()
+            return len(response_ids)
+
+    def _truncate_to_count(self):
+        """Drops rows appended by an add that was interrupted before meta.json was written."""
+        count, dim = self.meta["count"], self.meta["dim"]
+        for name, row_bytes in (("vectors.f16", dim * np.dtype(EMBEDDING_STORAGE_DTYPE).itemsize),
+                                ("ids.i64", 8), ("assignments.i32", 4)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > count * row_bytes:
+                os.truncate(path, count * row_bytes)
+
+    def _needs_training(self) -> bool:
+        count, trained = self.meta["count"], self.meta["trained_count"]
+        return count >= MIN_TRAIN_SIZE and (not trained or count >= RETRAIN_GROWTH * trained)
+
+    def _train(self):
+        """Reclusters every stored vector and rewrites the assignments."""
+        count, dim = self.meta["count"], self.meta["dim"]
+        vectors = np.memmap(self._file("vectors.f16"), dtype=EMBEDDING_STORAGE_DTYPE, mode="r", shape=(count, dim))
+        self.centroids = train_centroids(vectors, nlist=max(1, int(np.sqrt(count))))
+        np.save(self._file("centroids.npy"), self.centroids)
+        # The current assignments file is memory-mapped, so replace it rather than overwrite it.
+        tmp = self._file("assignments.i32.tmp")
+        with open(tmp, "wb") as f:
+            f.write(self._assign(vectors).tobytes())
+        os.replace(tmp, self._file("assignments.i32"))
+        self.meta["trained_count"] = count
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = None,
+               exclude_ids: Sequence[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (response_id, cosine similarity) pairs, most similar first.
+
+        Only the rows in the `nprobe` clusters nearest to the query are scored,
+        and only those rows are read from the memory-mapped matrix.
+        """
+        with self._lock:
+            if not self.meta["count"]:
+                return []
+            query = np.asarray(query, dtype=np.float32).ravel()
+            query = query / max(np.linalg.norm(query), 1e-12)
+            if self.centroids is None:
+                probe = [0]
+            else:
+                nprobe = min(nprobe or VECTOR_INDEX_NPROBE, len(self.centroids))
+                probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.sort(np.concatenate([self._lists[c] for c in probe]))
+            if not len(rows):
+                return []
+
+            scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+            ids = np.asarray(self.ids[rows])
+            if len(exclude_ids):
+                keep = ~np.isin(ids, exclude_ids)
+                scores, ids = scores[keep], ids[keep]
+            k = min(k, len(scores))
+            if not k:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            # float16 storage can put a vector a hair off unit length.
+            return [(int(ids[i]), min(1.0, float(scores[i]))) for i in top]
+
+    def sync(self, db: Session, chunk_size: int = 1000) -> int:
+        """
+        Adds every stored response with a current embedding that isn't indexed yet.
+
+        Only ids are read to find what is missing, so responses embedded after
+        newer ones were indexed (by backfill_embeddings, or a previous
+        response embedded during a run) are picked up too.
+        """
+        stored = np.fromiter(
+            (response_id for (response_id,) in db.query(models.Response.id).filter(
+                models.Response.embedding.isnot(None),
+                models.Response.embedding_model == EMBEDDING_MODEL_NAME
+            )),
+            dtype=np.int64,
+        )
+        with self._lock:
+            missing = stored[~self.contains(stored)]
+
+        added = 0
+        for start in range(0, len(missing), chunk_size):
+            rows = db.query(models.Response.id, models.Response.embedding).filter(
+                models.Response.id.in_(missing[start:start + chunk_size].tolist())
+            ).all()
+            if rows:
+                added += self.add([row.id for row in rows],
+                                  np.stack([embedding_from_bytes(row.embedding) for row in rows]))
+        return added
+
+    def clear(self):
+        """Deletes the index files."""
+        with self._lock:
+            for name in ("vectors.f16", "ids.i64", "assignments.i32", "centroids.npy", "meta.json"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._load()
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> VectorIndex:
+    """Returns the process-wide index, loading it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex()
+    _index.reload_if_changed()
+    return _index
+
+
+def start_sync() -> threading.Thread:
+    """Catches the index up with the database on a background thread."""
+    def sync():
+        db = SessionLocal()
+        try:
+            added = get_index().sync(db)
+            if added:
+                print(f"Added {added} responses to the vector index.")
+        except Exception as e:
+            print(f"Error syncing vector index: {e}")
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=sync, name="vector-index-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Discard the index and build it from scratch.")
+    args = parser.parse_args()
+
+    index = VectorIndex()
+    if args.rebuild:
+        index.clear()
+    db = SessionLocal()
+    try:
+        added = index.sync(db)
+    finally:
+        db.close()
+    print(f"Indexed {added} new responses; {len(index)} in total, "
+          f"{len(index.centroids) if index.centroids is not None else 1} lists.")
+
+
+if __name__ == "__main__":
+    main()